@@ -1,4 +1,6 @@
+import os
 import pandas
+import shutil
 import time
 import numpy as np
 from tkinter import messagebox, simpledialog
@@ -27,14 +29,47 @@ class UDPreceiveDS(tu.UDPreceiveProto):
         :param console: tkInter text to be used as "console"
         :param portN: port number for receiving
         """
-        super(UDPreceiveDS, self).__init__(console, portN, bufferedData, maxQSize=maxQSize)
+        super(UDPreceiveDS, self).__init__(console, portN, bufferedData, maxQSize=maxQSize, batchMode=True,
+                                           rcvBufSize=1 << 20)
         self.leftShoe = leftShoe
         self.rightShoe = rightShoe
         self.startTime = startTime
         self.th = [threading.Thread() for _ in range(2)]
         # self.maxQSize = maxQSize
+        names = ['o1', 'o2', 'o3', 'timestamp'] + rightShoe.names + ['sync', 'side', 'c1', 'c2', 'c3']
+        self.decoder = tu.StructDecoder(rightShoe.fmt, names, header=bytes([0x1, 0x2, 0x3]),
+                                        footer=bytes([0xA, 0xB, 0xC]))
+        self.timeDtype = tu.structDtype('2I h')
 
-    def _parseData(self, unparsed, qSize=1):
+    def _parseBatch(self, batch):
+        """
+        Decodes all the shoe packets of the batch at once, any other packet goes through _parseData
+        :param batch: packets received
+        :type batch: tu.PacketBatch
+        """
+        t0 = self.stats.tic()
+        records, others = self.decoder.splitBatch(batch)
+        self.stats.toc('decode', t0, records.size)
+        if records.size > 0:
+            t0 = self.stats.tic()
+            now = int((time.time() - self.startTime[0]) * 1000)
+            isLeft = records['side'] == b'l'
+            for shoe, mask in zip([self.leftShoe, self.rightShoe], [isLeft, ~isLeft]):
+                if not mask.any():
+                    continue
+                shoeRecords = records[mask]
+                msg = np.zeros(shoeRecords.size, dtype=self.timeDtype)
+                msg['f0'] = now
+                msg['f1'] = shoeRecords['timestamp']
+                msg['f2'] = shoeRecords['sync']
+                shoe.recorder.writeBatch(shoeRecords.tobytes(), shoeRecords.dtype.itemsize)
+                shoe.recorder2.writeBatch(msg.tobytes(), msg.dtype.itemsize)
+                shoe.extendData(shoeRecords, shoeRecords['timestamp'], shoeRecords['sync'], batch.stamp)
+            self.stats.toc('append', t0, records.size)
+        for packet in others:
+            self._parseData(bytes(packet))
+
+    def _parseData(self, unparsed):
         """
         Parses network data and process it accordingly
         :param unparsed:
@@ -43,20 +78,17 @@ class UDPreceiveDS(tu.UDPreceiveProto):
         if unparsed[0] == 1 and unparsed[1] == 2 and unparsed[2] == 3:
             # 3 char for open, uint64 for timestamp, 24 short for values and 3 char for close
             # fmt = '=3c I 13H 4c'
-            if qSize > self.maxQSize:
-                # print('Q too big')
-                return
             fmt = self.rightShoe.fmt
             now = int((time.time() - self.startTime[0]) * 1000)
             p = struct.unpack(fmt, unparsed)
             msg = struct.pack('2I h', now, p[3], p[16])
             if p[17].decode() is 'l':
-                self.leftShoe.binaryFile += unparsed
-                self.leftShoe.binaryFile2 += msg
+                self.leftShoe.recorder.write(unparsed)
+                self.leftShoe.recorder2.write(msg)
                 self.leftShoe.appendData(p[4:16], p[3], p[16])
             else:
-                self.rightShoe.binaryFile += unparsed
-                self.rightShoe.binaryFile2 += msg
+                self.rightShoe.recorder.write(unparsed)
+                self.rightShoe.recorder2.write(msg)
                 self.rightShoe.appendData(p[4:16], p[3], p[16])
         elif unparsed[0] == 0xF and unparsed[1] == 0xF and unparsed[2] == 0xA:
             # 3 char for open, uint64 for timestamp, 24 short for values and 3 char for close
@@ -79,7 +111,9 @@ class smartShoe(object):
         self.keepAll = keepAll
         self.sizeBuf = sizeBuf
         self.binaryFile = bytes(0)
-        self.binaryFile2 = bytes(0)
+        # packets and host times are streamed to disk while recording
+        self.recorder = tu.PacketRecorder()
+        self.recorder2 = tu.PacketRecorder()
         self.fmt = '<3c I 13h 4c'
         self.isLeft = isLeft
         self.pressDisplay = None
@@ -126,6 +160,10 @@ class smartShoe(object):
         self.namesWrong = ['pToe', 'pBall', 'pHeel', 'ax', 'ay', 'az', 'gx', 'gy', 'gz', 'EUx', 'EUy', 'EUz']
         self.normalValues = [[None, None] for _ in self.names]
         self.dataFrame = pandas.DataFrame(columns=self.names + ['sync'] + ['timestamp'])
+        # live data, the plots read directly from this store
+        self.store = guT.RingBuffer(self.names + ['sync'], sizeBuf)
+        self._scale = np.array([1.0 if na in ['pToe', 'pBall', 'pHeel'] else 1.0 / 8000.0 for na in self.names])
+        self._row = np.zeros(len(self.names) + 1)
         self.syncFound = None
         self.appendCounter = 0
 
@@ -171,9 +209,9 @@ class smartShoe(object):
 
         self.normalValues = [[None, None] for _ in self.names]
         self.dataFrame.drop(self.dataFrame.index, inplace=True)
+        self.store.clear()
         self.appendCounter = 0
         self.syncFound = None
-        self.binaryFile2 = bytes(0)
 
     def updateVars(self):
         self.pToe = self.all[0]
@@ -189,20 +227,45 @@ class smartShoe(object):
         self.my = self.all[10]
         self.mz = self.all[11]
 
-    def saveBinaryFile(self, fileN):
+    def _binaryFileNames(self, fileN):
         if self.isLeft:
             fileN += '_L.bin'
             fileN2 = fileN + '_t_L.bin'
         else:
             fileN += '_R.bin'
             fileN2 = fileN + '_t_R.bin'
+        return fileN, fileN2
+
+    def startRecording(self, fileN):
+        fileN, fileN2 = self._binaryFileNames(fileN)
+        self.recorder.open(fileN)
+        self.recorder2.open(fileN2)
+
+    def stopRecording(self):
+        self.recorder.close()
+        self.recorder2.close()
+
+    def saveBinaryFile(self, fileN):
+        fileN, fileN2 = self._binaryFileNames(fileN)
+        if self.recorder.isOpen:
+            warnings.warn('The recording is still running, call stopRecording before saving it')
+            return
+        if self.recorder.fileN is not None:
+            # the recording is already on disk, only rename it
+            for rec, newN in zip([self.recorder, self.recorder2], [fileN, fileN2]):
+                if os.path.abspath(rec.fileN) != os.path.abspath(newN):
+                    shutil.move(rec.fileN, newN)
+                    shutil.move(rec.fileN + '.idx', newN + '.idx')
+                    rec.fileN = newN
+            return
 
+        if len(self.binaryFile) == 0:
+            warnings.warn('Nothing to save, the packets are only kept by startRecording/stopRecording')
+            return
+        # packets rebuilt by makeBinaryFileAgain
         with open(fileN, 'wb') as f:
             f.write(self.binaryFile)
 
-        with open(fileN2, 'wb') as f:
-            f.write(self.binaryFile2)
-
     def makeBinaryFileAgain(self):
         fmt = self.fmt
         fmt2 = fmt[1:] + ' '
@@ -240,18 +303,31 @@ class smartShoe(object):
         if not append2list:
             if np.isnan(t):
                 return
-            self.dataFrame.loc[t, 'sync'] = sync
-            self.dataFrame.loc[t, self.names] = data
-            self.dataFrame.loc[t, ['ax', 'ay', 'az', 'gx', 'gy', 'gz', 'EUx', 'EUy', 'EUz']] *= 1.0 / 8000.0
-            self.dataFrame.loc[t, 'timestamp'] = t
-            if not self.keepAll and self.dataFrame.shape[0] > self.sizeBuf:
-                self.dataFrame.drop(index=self.dataFrame.index[0], inplace=True)
+            self._row[:-1] = data
+            self._row[:-1] *= self._scale
+            self._row[-1] = sync
+            self.store.append(t, self._row)
         else:
             if self.keepAll:
                 self._appendDataAll(data, t, sync)
             else:
                 self._appendDataBuff(data, t, sync)
 
+    def extendData(self, data, t, sync, stamp=None):
+        """
+        :param data: structured array with a field for each name in self.names
+        :param t: timestamps when data was collected
+        :param sync: 0 or 1 if a signal was received
+        :param stamp: host time when data was received, see tu.PacketBatch.stamp
+        :return: nothing
+        """
+        values = np.empty((t.shape[0], len(self.names) + 1))
+        for j, na in enumerate(self.names):
+            values[:, j] = data[na]
+        values[:, :-1] *= self._scale
+        values[:, -1] = sync
+        self.store.extend(t, values, stamp)
+
     def _appendDataAll(self, data, t, sync):
         """
         :param data: list of values to append, they need to be in the same order as self.all
@@ -613,8 +689,8 @@ class ControlFunctionsContainer(object):
         if self.isRecord:
             n = 2
             self.buttons['Start Recording']["text"] = "Stop recording"
-            self.main.leftShoe.binaryFile = bytes(0)
-            self.main.rightShoe.binaryFile = bytes(0)
+            self.main.leftShoe.startRecording(self.fileName)
+            self.main.rightShoe.startRecording(self.fileName)
             self.buttons['Start Recording'].config(bg='green')
             cmd = guT.createCMD(n)
             self.theSend.send(cmd, addr=(self.STREAM_IP_ADDRESS, 12354))
@@ -624,6 +700,8 @@ class ControlFunctionsContainer(object):
             self.buttons['Start Recording'].config(bg='yellow')
             cmd = guT.createCMD(n)
             self.theSend.send(cmd, addr=(self.STREAM_IP_ADDRESS, 12354))
+            self.main.leftShoe.stopRecording()
+            self.main.rightShoe.stopRecording()
             self.saveDataCmd()
         self.isRecord = not self.isRecord
 
@@ -728,7 +806,7 @@ class realTimeApp(object):
         self.root.iconbitmap(r'./GUI/deepsole.ico')
         # objects
         self.theSend = tu.UDPsend()
-        self.refreshTime = 10  # ms
+        self.plotFps = 30.0
         self.visualizeTime = 8  # s
         self.rightShoe = smartShoe(False, keepAll=False)
         self.leftShoe = smartShoe(True, keepAll=False)
@@ -751,6 +829,8 @@ class realTimeApp(object):
         self.timestampR = [self.rightShoe.timestamp for _ in self.rightShoe.all]
         self.timestampL = [self.leftShoe.timestamp for _ in self.leftShoe.all]
         self.scalePlots = True
+        # age of the newest sample on screen, saved when the app is closed
+        self.latency = tu.LatencyHistogram()
         topFrame = tk.Frame(self.root)
         topFrame.pack(fill=tk.BOTH, expand=tk.YES)
         topFrameL = tk.Frame(topFrame)
@@ -758,18 +838,18 @@ class realTimeApp(object):
         topFrameR.pack(side=tk.RIGHT, expand=tk.YES, fill=tk.BOTH)
         topFrameL.pack(side=tk.LEFT, expand=tk.YES, fill=tk.BOTH)
         self.rPlot = guT.PlotPanelPandas(topFrameL, 'R', titles, names, plotColor, self.timestampR,
-                                         self.rightShoe.dataFrame, color='red', number2Plot=500, showTime=True,
-                                         useScale=self.scalePlots)
+                                         self.rightShoe.store, color='red', number2Plot=500, showTime=True,
+                                         useScale=self.scalePlots, multiplier=0, latency=self.latency)
         self.rPlot.pack(fill=tk.BOTH, expand=tk.YES)
         self.lPlot = guT.PlotPanelPandas(topFrameL, 'L', titles, names, plotColor, self.timestampL,
-                                         self.leftShoe.dataFrame, color='blue', number2Plot=500, showTime=True,
-                                         useScale=self.scalePlots)
+                                         self.leftShoe.store, color='blue', number2Plot=500, showTime=True,
+                                         useScale=self.scalePlots, multiplier=0, latency=self.latency)
         self.lPlot.pack(fill=tk.BOTH, expand=tk.YES)
         self.filesFrame = tk.Frame(topFrameL)
         # 3d plots of orientation
         self.plot3DPanel = guT.PlotPanel3DPandas(topFrameR, 'Side', ['Left', 'Right'], [['Plot'], ['Plot']],
                                                  [['red'], ['blue']],
-                                                 [self.leftShoe.dataFrame, self.rightShoe.dataFrame],
+                                                 [self.leftShoe.store, self.rightShoe.store],
                                                  [['EUy', 'EUz', 'EUx'], ['EUy', 'EUz', 'EUx']],
                                                  figsize=(5, 5))
         self.plot3DPanel.pack(fill=tk.BOTH, expand=tk.YES)
@@ -799,26 +879,30 @@ class realTimeApp(object):
         self.console.grid(row=0, column=2)
         self.oldTimeR = 0
         self.oldTimeL = 0
+        # the scheduler owns the refresh loop, the 3D view and the pressure display are less important
+        self.scheduler = guT.FrameScheduler(self.root)
+        self.scheduler.register(lambda: self.updateSignals(self.rPlot), fps=self.plotFps, priority=2, name='R')
+        self.scheduler.register(lambda: self.updateSignals(self.lPlot), fps=self.plotFps, priority=2, name='L')
+        self.scheduler.register(self.plot3DPanel.plotControlFromChecks, fps=self.plotFps / 2, priority=1, name='3D')
+        self.scheduler.register(self.updatePlots, fps=10.0, priority=0, name='Press')
+
+    def updateSignals(self, pPlot):
+        fn = lambda x: wrap(x/8000)
+        # the shoe timestamps are in ms
+        pPlot.plotControlFromChecksTime(self.visualizeTime, extraT=1.0, preprocess=[['EUy', 'EUz', 'EUx'], [fn]],
+                                        t_in_ms=True)
 
     def updatePlots(self):
-        fn = lambda x: wrap(x/8000)
-        self.rPlot.plotControlFromChecksTime(self.visualizeTime, extraT=1.0, preprocess=[['EUy', 'EUz', 'EUx'],
-                                                                                         [fn]])
-        self.lPlot.plotControlFromChecksTime(self.visualizeTime, extraT=1.0, preprocess=[['EUy', 'EUz', 'EUx'],
-                                                                                         [fn]])
-        self.plot3DPanel.plotControlFromChecks()
         for pPlot, isL in zip([self.rPlot, self.lPlot], [False, True]):
-            if pPlot.maxValsAux is None:
+            if pPlot.maxValsAux is None or len(pPlot.all) == 0:
                 continue
-            windowVals = pPlot.all.iloc[-2:, :].copy()
             divAux = pPlot.maxValsAux - pPlot.minValsAux
             divAux[divAux == 0] = 1
-            windowVals = (windowVals-pPlot.minValsAux) / (divAux)
             # 'pToe', 'pBall', 'pHeel'
-            self.pressDisp.updatePlot(toe=np.clip(windowVals['pToe'].values[-1], 0, 1),
-                                      ball=np.clip(windowVals['pBall'].values[-1], 0, 1),
-                                      heel=np.clip(windowVals['pHeel'].values, 0, 1)
-                                      [-1], axLeft=isL)
+            press = [(pPlot.all.column(na, 1)[-1] - pPlot.minValsAux[na]) / divAux[na]
+                     for na in ['pToe', 'pBall', 'pHeel']]
+            toe, ball, heel = np.clip(press, 0, 1)
+            self.pressDisp.updatePlot(toe=toe, ball=ball, heel=heel, axLeft=isL)
 
 
         if not self.theCom.isRecord:
@@ -858,18 +942,23 @@ class realTimeApp(object):
         control = guT.ButtonPanel(root, labels, buttonsCMDs)
         control.pack()
 
-    def loopFunctions(self):
-        self.updatePlots()
-        self.root.after(self.refreshTime, self.loopFunctions)
-
     def startApp(self):
         self.startReceive()
-        self.loopFunctions()
+        self.scheduler.start()
         self.root.protocol("WM_DELETE_WINDOW", self.stopApp)
         self.root.mainloop()
 
     def stopApp(self):
+        self.scheduler.stop()
+        self.theRec.stopThread()
+        # write the tail and the index of a recording in progress
+        self.leftShoe.stopRecording()
+        self.rightShoe.stopRecording()
         self.root.destroy()
+        lat = self.latency.dump('latency.json')
+        if lat['count'] > 0:
+            print('Latency p50: %.1fms p99: %.1fms max: %.1fms' % (1000 * lat['p50'], 1000 * lat['p99'],
+                                                                   1000 * lat['max']))
 
     def startReceive(self):
         self.theRec.startThread()
@@ -1,14 +1,25 @@
+import collections
+import queue
 import struct
+import threading
+import time
 import tkinter as tk
 import warnings
+from multiprocessing import shared_memory
 from tkinter import ttk
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas
 from scipy.spatial.transform import Rotation as rot
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.figure import Figure
+from matplotlib.gridspec import GridSpec
 from mpl_toolkits.mplot3d import Axes3D  # <-- Note the capitalization!
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+
+from rtgui.communication import HotPathStats, LatencyHistogram
 
 
 class CheckControl(tk.Frame):
@@ -81,60 +92,83 @@ class CheckControl(tk.Frame):
 
 
 class ConsoleFrame(tk.Frame):
-    def __init__(self, parent, nLines=5, parseCMD=None, **kwargs):
+    def __init__(self, parent, nLines=5, parseCMD=None, maxRate=10.0, **kwargs):
         """
-        Creates a console to print strings
+        Creates a console to print strings. Text can be appended from any thread, it is queued and shown by the Tk
+        thread at most maxRate times per second
         :param parent: tk.Frame to use as parent
         :type parent: tk.Frame
         :param nLines: Max number of lines to display on the console
         :type nLines: int
-        :param parseCMD: Function to use to parse the message
+        :param parseCMD: Function to use to parse the message, it is called on the Tk thread
         :type parseCMD: function
+        :param maxRate: max number of refreshes of the console per second
+        :type maxRate: float
         """
         super(ConsoleFrame, self).__init__(parent, **kwargs)
         self.parseCMD = parseCMD
         self.nLines = nLines
         self.consoleVar = tk.StringVar()
-        self.consoleList = []
+        self.consoleList = collections.deque(maxlen=max(nLines - 1, 1))
+        self._pending = queue.SimpleQueue()
+        self._period = max(int(1000.0 / maxRate), 1)
         tk.Label(self, text='Console').pack(side=tk.TOP)
         self.console = tk.Message(self, textvariable=self.consoleVar, relief=tk.SUNKEN)
         self.console.pack(expand=tk.YES, side=tk.TOP)
         tk.Button(self, text='Clear', command=self.clearConsole).pack(expand=tk.YES, side=tk.TOP)
-
-    def __append2console(self, text):
-        self.consoleList.append(text)
-        if len(self.consoleList) >= self.nLines:
-            self.consoleList.pop(0)
-        console = ''
-        for t in self.consoleList:
-            console += t + '\n'
-        self.consoleVar.set(console)
+        self._flushId = self.after(self._period, self._flushLoop)
 
     def append(self, text, clear_console=False):
         """
-        Add text to console
+        Add text to console. It is safe to call from any thread
         :param text: text to append
         :type text: str
         :param clear_console: flag to clear console before appending
         :type clear_console: bool
         """
-        if clear_console:
-            self.clearConsole()
-        self.__append2console(text)
-        if self.parseCMD is not None:
-            self.parseCMD(text)
+        self._pending.put((text, clear_console))
 
     def clearConsole(self):
         """
-        Clears console
+        Clears console. It is safe to call from any thread
+        """
+        self._pending.put((None, True))
+
+    def flush(self):
+        """
+        Shows the queued text and parses it, it has to be called from the Tk thread
         """
-        self.consoleVar.set('')
-        self.consoleList = []
+        changed = False
+        while True:
+            try:
+                text, clear = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            if clear:
+                self.consoleList.clear()
+            if text is None:
+                continue
+            self.consoleList.append(text)
+            if self.parseCMD is not None:
+                self.parseCMD(text)
+        if changed:
+            self.consoleVar.set(''.join(t + '\n' for t in self.consoleList))
+
+    def _flushLoop(self):
+        self.flush()
+        self._flushId = self.after(self._period, self._flushLoop)
+
+    def destroy(self):
+        self.after_cancel(self._flushId)
+        super(ConsoleFrame, self).destroy()
 
 
 class PlotPanel(tk.Frame):
     def __init__(self, parent, title, titles, names, plotColor, timestamp, allValsList, color=None, number2Plot=500,
-                 shareAxis=None, showTime=False, useScale=True, figsize=(5, 2), useCheckFn=False, **kwargs):
+                 shareAxis=None, showTime=False, useScale=True, figsize=(5, 2), useCheckFn=False, renderMode='draw',
+                 decimation='minmax', renderThread=None, dashboard=None, stats=None, showStats=False, latency=None,
+                 **kwargs):
         """
         This widget has checkboxes with variables and a matplot figure the label goes to the left
         :param parent: parent frame
@@ -149,8 +183,8 @@ class PlotPanel(tk.Frame):
         :type plotColor: list
         :param timestamp: timestamps list
         :type timestamp: list
-        :param allValsList: List with the values of the signals to plot
-        :type allValsList: list
+        :param allValsList: List with the values of the signals to plot or a RingBuffer with a column for each name
+        :type allValsList: list, RingBuffer
         :param color: Color to use for the widget
         :type color: str
         :param number2Plot: How many data points to plot from the list. The widget will plot the last n values
@@ -165,17 +199,35 @@ class PlotPanel(tk.Frame):
         :type figsize: tuple
         :param useCheckFn: Function for the check control
         :type useCheckFn: function
+        :param renderMode: 'draw' clears the axis and redraws the whole figure on every refresh. 'blit' keeps one line
+        per signal, updates its data and only redraws the lines over a cached background. The full figure is only
+        drawn when it is resized or the axis limits change. 'thread' renders the figure with Agg on a RenderThread and
+        shows the image in a PhotoImage, the Tk thread only collects the data. There is no navigation toolbar in this
+        mode
+        :type renderMode: str
+        :param decimation: how traces longer than the axis are reduced before drawing. 'minmax' keeps the min and max
+        of each pixel column, 'lttb' keeps the most significant points (Largest Triangle Three Buckets) and None plots
+        every sample
+        :type decimation: str
+        :param renderThread: thread used with renderMode 'thread'. If None, RenderThread.default() is used
+        :type renderThread: RenderThread
+        :param dashboard: If given, the panel plots on an axis of the dashboard figure instead of creating its own
+        figure, canvas and toolbar. The dashboard renderMode is used. See PlotDashboard.addPanel
+        :type dashboard: PlotDashboard
+        :param stats: timers of the plot stages ('frame', 'preprocess', 'window', 'normalize', 'decimate', 'plot' and
+        'draw'). If None, the panel has its own HotPathStats, enabled when showStats is True
+        :type stats: HotPathStats
+        :param showStats: Flag to show the recent time of the main stages under the title
+        :type showStats: bool
+        :param latency: If given, the age of the newest sample on screen is added to it every time the panel finishes
+        drawing. The age is measured from the host time the sample was received (see RingBuffer.stamps), so it only
+        works with RingBuffer sources. Many panels can share one histogram
+        :type latency: LatencyHistogram
         """
         super(PlotPanel, self).__init__(parent, **kwargs)
-        self.title = title
-        self.useScale = useScale
-        self.showTime = showTime
-        self.s = number2Plot
-        self.count = 0
+        self._initPlotState(title, names, plotColor, timestamp, allValsList, number2Plot, showTime, useScale,
+                            renderMode, decimation, dashboard, stats, showStats, latency)
         self.parent = parent
-        self.timestamp = timestamp
-        self.all = allValsList
-        self.names = names
         # titleLabelFrame = tk.Frame(self,background=color)
         # self.titleLabel = ttk.Label(self, text=title, background=color)
         self.consoleVar = tk.StringVar()
@@ -191,13 +243,24 @@ class PlotPanel(tk.Frame):
         self.checkFrame.pack(side=tk.LEFT)
         # self.checkFrame.grid(row=0,column=1)
         self.checks = []
-        self.f = plt.figure(figsize=figsize, dpi=100)
-        # self.f = plt.figure(figsize=(5, 5), dpi=100)
-        self.axis = self.f.add_subplot(111, sharex=shareAxis, sharey=shareAxis)
-        self.canvas = FigureCanvasTkAgg(self.f, self)
-        self.canvas.draw()
+        if dashboard is not None:
+            self.f = dashboard.f
+            self.axis = dashboard.addAxis(shareAxis)
+            self.canvas = dashboard.canvas
+        else:
+            if self.renderMode == 'thread':
+                # the figure is owned by the render thread, it is not registered with pyplot
+                self.f = Figure(figsize=figsize, dpi=100)
+            else:
+                self.f = plt.figure(figsize=figsize, dpi=100)
+            # self.f = plt.figure(figsize=(5, 5), dpi=100)
+            self.axis = self.f.add_subplot(111, sharex=shareAxis, sharey=shareAxis)
+            if self.renderMode == 'thread':
+                self.canvas = FigureCanvasAgg(self.f)
+            else:
+                self.canvas = FigureCanvasTkAgg(self.f, self)
+            self.canvas.draw()
         # self.axis = self.f.gca(projection='3d')
-        self.plotColor = plotColor
         for t, n, c in zip(titles, names, self.plotColor):
             if useCheckFn:
                 self.checks.append(
@@ -209,66 +272,495 @@ class PlotPanel(tk.Frame):
 
         # self.axis.plot([1,2,3,4,5,6,7,8],[5,6,1,3,8,9,3,5])
 
+        if dashboard is not None:
+            self.toolbar = None
+            if self.renderMode == 'blit':
+                self.blitManager = dashboard.blitManager
+                self.plotter = TracePlotter(self.axis, self.blitManager)
+            return
+        if self.renderMode == 'thread':
+            self.toolbar = None
+            # the figure is only read on the render thread, its size comes back with each frame
+            self._axisWidth = self.axis.bbox.width
+            self.renderThread = renderThread if renderThread is not None else RenderThread.default()
+            self.renderThread.start()
+            self._frame = None
+            self._frameLock = threading.Lock()
+            self._photo = tk.PhotoImage(master=self)
+            self.imageLabel = tk.Label(self, image=self._photo, borderwidth=0)
+            self.imageLabel.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            self._pollId = self.after(10, self._pollFrame)
+            return
         self.canvas.get_tk_widget().pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         # self.canvas.get_tk_widget().grid(row=0,column=2)
         self.toolbar = NavigationToolbar2Tk(self.canvas, self)
         self.toolbar.update()
         # self.canvas._tkcanvas.grid()
         self.canvas._tkcanvas.pack(side=tk.BOTTOM, fill=tk.BOTH, expand=True)
+        if self.renderMode == 'blit':
+            self.blitManager = BlitManager(self.canvas)
+            self.plotter = TracePlotter(self.axis, self.blitManager)
+
+    def _initPlotState(self, title, names, plotColor, timestamp, allValsList, number2Plot, showTime, useScale,
+                       renderMode, decimation, dashboard, stats, showStats, latency):
+        """
+        Sets the state used by the plot code that does not depend on Tk. The parameters are the ones of __init__
+        """
+        self.stats = stats if stats is not None else HotPathStats(enabled=showStats)
+        self.showStats = showStats
+        self.latency = latency
+        self._pendingStamp = None
+        self.dashboard = dashboard
+        if dashboard is not None:
+            renderMode = dashboard.renderMode
+        if renderMode not in ['draw', 'blit', 'thread']:
+            raise ValueError('renderMode should be draw, blit or thread, received: %s' % renderMode)
+        if decimation not in decimators:
+            raise ValueError('decimation should be one of %s, received: %s' % (list(decimators), decimation))
+        self.renderMode = renderMode
+        self.decimation = decimation
+        self.title = title
+        self.useScale = useScale
+        self.showTime = showTime
+        self.s = number2Plot
+        self.count = 0
+        self.timestamp = timestamp
+        self.all = allValsList
+        self.names = names
+        self.plotColor = plotColor
+        self._lastKey = None
+        self._rateEstimators = {}
+        self._fedTotal = None
+        self._listFed = {}
+        capacity = self.all.capacity if isinstance(self.all, RingBuffer) else None
+        self.normalizer = StreamNormalizer('window', capacity=capacity)
+        self.toolbar = None
+        self.blitManager = None
+        self.plotter = None
+        self.renderThread = None
+        self._axisWidth = None
+
+    def _pollFrame(self, period=10):
+        """
+        Shows the last image rendered by the render thread, runs on the Tk thread
+        """
+        with self._frameLock:
+            frame = self._frame
+            self._frame = None
+        if frame is not None:
+            frame, stamp, self._axisWidth = frame
+            self._photo.configure(data=frame, format='PPM')
+            self._recordLatency(stamp)
+        self._pollId = self.after(period, self._pollFrame)
+
+    def _renderFrame(self, traces, ylim, extraT, size, stamp=None):
+        """
+        Draws the traces with Agg and stores the image as PPM with the width of the axis, runs on the render thread
+        """
+        w, h = size
+        dpi = self.f.get_dpi()
+        if w > 1 and h > 1 and tuple(np.round(self.f.get_size_inches() * dpi)) != (w, h):
+            # follow the size of the label
+            self.f.set_size_inches(w / dpi, h / dpi, forward=False)
+        t0 = self.stats.tic()
+        self._drawTraces(traces, ylim, extraT)
+        t1 = self.stats.tic()
+        self.stats.toc('plot', t0, len(traces))
+        self.canvas.draw()
+        rgba = np.asarray(self.canvas.buffer_rgba())
+        frame = b'P6 %d %d 255\n' % (rgba.shape[1], rgba.shape[0]) + rgba[:, :, :3].tobytes()
+        width = self.axis.bbox.width
+        with self._frameLock:
+            self._frame = frame, stamp, width
+        self.stats.toc('draw', t1)
+
+    def destroy(self):
+        if self.renderThread is not None:
+            self.after_cancel(self._pollId)
+            self.renderThread.cancel(self)
+        super(PlotPanel, self).destroy()
+
+    def invalidate(self):
+        """
+        Forces a redraw on the next call even if the data and the checkboxes did not change
+        """
+        self._lastKey = None
+
+    def _checkState(self):
+        return tuple(tuple(ch.getAllValues()) for ch in self.checks)
+
+    def _setTitle(self, text):
+        """
+        Sets the text next to the plot, the stage times (and the median latency) are added when showStats is True
+        """
+        if self.showStats:
+            text = text + '\n' + self.stats.summary(['frame', 'plot', 'draw'])
+            if self.latency is not None and self.latency.count > 0:
+                text += '\nlatency %.1fms' % (1000 * self.latency.percentile(50))
+        self.consoleVar.set(text)
+
+    def _newestStamp(self):
+        """
+        Host time when the newest sample of the source was received, None if the latency is not traced. It is read
+        before the window, so the sample shown is this one or a newer one
+        """
+        if self.latency is None or not isinstance(self.all, RingBuffer) or len(self.all) == 0:
+            return None
+        return float(self.all.stamps(1)[-1])
+
+    def _recordLatency(self, stamp):
+        """
+        Adds the age of the sample received at stamp to the latency histogram, call it when the frame is drawn
+        """
+        if stamp is not None:
+            self.latency.add(time.monotonic() - stamp)
+
+    def getStats(self):
+        """
+        Times of the plot stages, see HotPathStats.getStats
+        :rtype: dict
+        """
+        return self.stats.getStats()
+
+    def _axisPixels(self):
+        """
+        Width of the axis in pixels. With renderMode 'thread' the figure belongs to the render thread, the width of the
+        last frame shown is used
+        :rtype: int
+        """
+        if self._axisWidth is not None:
+            return max(int(self._axisWidth), 1)
+        return max(int(self.axis.bbox.width), 1)
+
+    def _isDirty(self, *args):
+        """
+        Compares the data version, the checkboxes and args with the last render. If something changed, the new state is
+        stored and True is returned
+        :rtype: bool
+        """
+        key = (dataVersion(self.all), dataVersion(self.timestamp), self._checkState(), self.useScale) + args
+        if key == self._lastKey:
+            return False
+        self._lastKey = key
+        return True
+
+    def _render(self, traces, ylim=None, extraT=None, stamp=None):
+        """
+        Draws the traces on the axis
+        :param traces: list of (name, t, y, color)
+        :type traces: list
+        :param ylim: limits of the y axis, if None the axis is scaled to the data
+        :type ylim: tuple
+        :param extraT: extra time (empty) to show after the last sample
+        :type extraT: float
+        :param stamp: host time when the newest sample was received, see _newestStamp
+        :type stamp: float
+        """
+        stats = self.stats
+        fn = decimators[self.decimation]
+        if fn is not None:
+            t0 = stats.tic()
+            nPixels = self._axisPixels()
+            traces = [(na,) + fn(t, y, nPixels) + (c,) for na, t, y, c in traces]
+            stats.toc('decimate', t0, len(traces))
+        if self.dashboard is not None:
+            # the dashboard renders all its panels at once
+            t0 = stats.tic()
+            if self.renderMode == 'blit':
+                self.plotter.update(traces, ylim=ylim, extraT=extraT)
+            else:
+                self._drawTraces(traces, ylim, extraT)
+            stats.toc('plot', t0, len(traces))
+            # recorded when the dashboard renders
+            self._pendingStamp = stamp
+            self.dashboard.markDirty()
+            return
+        if self.renderMode == 'blit':
+            t0 = stats.tic()
+            self.plotter.update(traces, ylim=ylim, extraT=extraT)
+            t1 = stats.tic()
+            stats.toc('plot', t0, len(traces))
+            self.blitManager.render()
+            stats.toc('draw', t1)
+            self._recordLatency(stamp)
+            return
+        if self.renderMode == 'thread':
+            # the data is copied, the source keeps changing while the frame is rendered
+            t0 = stats.tic()
+            traces = [(na, np.array(t), np.array(y), c) for na, t, y, c in traces]
+            size = (self.imageLabel.winfo_width(), self.imageLabel.winfo_height())
+            self.renderThread.submit(self, lambda: self._renderFrame(traces, ylim, extraT, size, stamp))
+            stats.toc('submit', t0, len(traces))
+            return
+        t0 = stats.tic()
+        self._drawTraces(traces, ylim, extraT)
+        t1 = stats.tic()
+        stats.toc('plot', t0, len(traces))
+        self.canvas.draw()
+        stats.toc('draw', t1)
+        self._recordLatency(stamp)
+
+    def _drawTraces(self, traces, ylim, extraT):
+        self.axis.clear()
+        for na, t, y, c in traces:
+            try:
+                self.axis.plot(t, y, color=c)
+            except ValueError:
+                a = 1
+        if ylim is not None:
+            self.axis.set_ylim(*ylim)
+        if extraT is not None:
+            x_lim = self.axis.get_xlim()
+            self.axis.set_xlim(x_lim[0], x_lim[1] + extraT)
+
+    def _nSamples(self):
+        """
+        Number of samples available in the data source
+        """
+        if isinstance(self.all, RingBuffer):
+            return len(self.all)
+        return len(self.all[0])
+
+    def _plotSource(self):
+        """
+        Store that the panel plots from
+        """
+        return self.all
+
+    def _since(self, total, n=None):
+        """
+        Returns the values written to the data source after total. For a RingBuffer total is a number of samples, for
+        a DataFrame it is the last index value read, so rows dropped from the start do not hide the new ones
+        :param total: value returned by the last call, if None the last n samples are returned
+        :param n: number of samples returned when total is None
+        :type n: int
+        :return: dict with the new values of each column and the total to use in the next call
+        :rtype: tuple
+        """
+        src = self._plotSource()
+        if isinstance(src, RingBuffer):
+            if total is None:
+                total = max(src.total - n, 0)
+            _, cols, newTotal = src.since(total, copy=True)
+            return cols, newTotal
+        if total is None:
+            newVals = src.iloc[src.shape[0] - min(n, src.shape[0]):, :]
+        else:
+            newVals = src.iloc[src.index.searchsorted(total, side='right'):, :]
+        return {na: newVals[na].values for na in newVals.columns}, src.index[-1]
+
+    def _sourceTotal(self):
+        """
+        Position of the newest sample of the source, see _since. None if the new samples of the source cannot be told
+        apart from the old ones (a DataFrame with an index that is not increasing)
+        """
+        src = self._plotSource()
+        if isinstance(src, RingBuffer):
+            return src.total
+        if src.shape[0] == 0 or not src.index.is_monotonic_increasing:
+            return None
+        return src.index[-1]
+
+    def _feedNormalizer(self, n, preprocess=None):
+        """
+        Feeds the normalizer with the samples that arrived since the last call. After a reset (or when the source was
+        cleared or its time went back), it is seeded with the last n samples. If the new samples cannot be found (see
+        _sourceTotal), it is seeded on every call, so the scale is the min and max of the window
+        :param n: number of samples used to seed the normalizer
+        :type n: int
+        :param preprocess: function applied to the new samples of each column, see preprocessFunctions
+        :type preprocess: dict
+        """
+        total = self._sourceTotal()
+        if total is None or self._fedTotal is None or total < self._fedTotal:
+            self.normalizer.reset()
+            cols, self._fedTotal = self._since(None, n)
+        else:
+            cols, self._fedTotal = self._since(self._fedTotal)
+        if preprocess is not None:
+            for k, fn in preprocess.items():
+                if k in cols:
+                    cols[k] = fn(cols[k])
+        self.normalizer.update(cols)
+
+    def _yRange(self, i, name, n):
+        """
+        Min and max used to scale a signal. With a RingBuffer source, of its last n samples (the normalizer has to be
+        fed first). With lists, of all the values in the list
+        :param i: index of the signal in allValsList
+        :type i: int
+        :param name: name of the signal
+        :type name: str
+        :param n: number of samples on screen
+        :type n: int
+        :rtype: tuple
+        """
+        if isinstance(self.all, RingBuffer):
+            return self.normalizer.minMax(name, n)
+        self._feedList(i)
+        return self.normalizer.minMax(i, len(self.all[i]))
+
+    def _feedList(self, i):
+        """
+        Feeds the normalizer with the values added to the i-th list since the last call. They are found walking back
+        the timestamps, so lists that drop their first values are followed too
+        """
+        t = self.timestamp[i] if type(self.timestamp[0]) is list else self.timestamp
+        vals = self.all[i]
+        if len(t) == 0 or len(vals) == 0:
+            return
+        last = self._listFed.get(i)
+        if last is None or t[-1] < last:
+            # first call or the clock restarted
+            self.normalizer.reset([i])
+            k = len(vals)
+        else:
+            k = 0
+            while k < len(t) and t[-1 - k] > last:
+                k += 1
+        if k > 0:
+            self.normalizer.update({i: np.asarray(vals[-k:], dtype=np.float64)})
+        self._listFed[i] = t[-1]
+
+    def _lastTime(self):
+        """
+        Latest timestamp of the data source
+        """
+        if isinstance(self.all, RingBuffer):
+            return self.all.timestamps(1)[-1]
+        if type(self.timestamp[0]) is list:
+            return self.timestamp[0][-1]
+        return self.timestamp[-1]
+
+    def _signal(self, i, s=None):
+        """
+        Returns the timestamps and values of a signal of a list source
+        :param i: index of the signal in allValsList
+        :type i: int
+        :param s: number of samples to return, if None all the samples are returned
+        :type s: int
+        :return: timestamps and values
+        :rtype: tuple
+        """
+        if type(self.timestamp[0]) is list:
+            t = self.timestamp[i]
+        else:
+            t = self.timestamp
+        if s is None:
+            return np.array(t), np.array(self.all[i])
+        return np.array(t[-s:]), np.array(self.all[i][-s:])
+
+    def _checked(self):
+        """
+        Signals with an active checkbox
+        :return: list with the index in allValsList, the name and the color of each signal
+        :rtype: list
+        """
+        checked = []
+        i = 0
+        for ch, col, colNames in zip(self.checks, self.plotColor, self.names):
+            for v, c1, na in zip(ch.getAllValues(), col, colNames):
+                if v == 1:
+                    checked.append((i, na, c1))
+                i = i + 1
+        return checked
+
+    def _signals(self, checked, sizes):
+        """
+        Returns the timestamps and values of the checked signals. If the data source is a RingBuffer, all of them come
+        from one consistent snapshot, so the traces of a frame end at the same sample
+        :param checked: signals, as returned by _checked
+        :type checked: list
+        :param sizes: number of samples of each signal (None for all the samples). With a RingBuffer they are equal
+        :type sizes: list
+        :return: list with the timestamps and values of each signal
+        :rtype: list
+        """
+        if not isinstance(self.all, RingBuffer):
+            return [self._signal(i, s) for (i, _, _), s in zip(checked, sizes)]
+        if len(checked) == 0:
+            return []
+        t, cols = self.all.snapshot(sizes[0], [na for _, na, _ in checked])
+        return [(t, cols[na]) for _, na, _ in checked]
+
+    def _rate(self, i):
+        """
+        Sample rate (samples per time unit) of the i-th signal. RingBuffers estimate it on append, for lists only the
+        timestamps added since the last call are read
+        """
+        if isinstance(self.all, RingBuffer):
+            return self.all.rate
+        if type(self.timestamp[0]) is list:
+            t = self.timestamp[i]
+        else:
+            t, i = self.timestamp, 0
+        est = self._rateEstimators.get(i)
+        if est is None:
+            est = self._rateEstimators[i] = [RateEstimator(), None]
+        if len(t) == 0:
+            return 0.0
+        last = est[1]
+        n = 0
+        if last is not None and t[-1] < last:
+            # the clock restarted, the estimator resets itself
+            n, last = 1, t[-1]
+        # walk back to the last timestamp seen
+        while n < len(t) and (last is None or t[-1 - n] > last):
+            n += 1
+            if last is None and n >= 2:
+                break
+        if n > 0:
+            est[0].update(t[-1], n)
+            est[1] = t[-1]
+        return est[0].rate
 
     def plotControlFromChecks(self, t_in_ms=False):
         """
         This function plots all the values that have an active checkbox
         """
         #
-        self.axis.clear()
+        if not self._isDirty(self.s, t_in_ms):
+            self.stats.count('skipped')
+            return
+        tFrame = self.stats.tic()
+        stamp = self._newestStamp()
         useScale = self.useScale
         s = self.s
-        i = 0
+        traces = []
+        if t_in_ms:
+            ms_scale = 1000.0
+        else:
+            ms_scale = 1.0
         if self.showTime:
-            if t_in_ms:
-                ms_scale = 1000.0
-            else:
-                ms_scale = 1.0
-            if type(self.timestamp[0]) is list:
-                t = self.timestamp[0][-1] / ms_scale
+            t = self._lastTime() / ms_scale
+            self._setTitle(self.title + '\n %.1fs' % t)
+        elif self.showStats:
+            self._setTitle(self.title)
+        if useScale and isinstance(self.all, RingBuffer):
+            t0 = self.stats.tic()
+            self._feedNormalizer(s)
+            self.stats.toc('normalize', t0)
+        checked = self._checked()
+        for (i, na, c1), (t, y) in zip(checked, self._signals(checked, [s] * len(checked))):
+            t = t / ms_scale
+            if y.size > t.size:
+                y = y[:t.size]
+            if y.size < t.size:
+                t = t[:y.size]
+            # divAux = FACTOR
+            # ymin = SCALE_MIN
+            if useScale:
+                ymin, ymax = self._yRange(i, na, s)
+                divAux = ymax - ymin
             else:
-                t = self.timestamp[-1] / ms_scale
-            self.consoleVar.set(self.title + '\n %.1fs' % t)
-        for ch, col in zip(self.checks, self.plotColor):
-            vals = ch.getAllValues()
-            for v, c1 in zip(vals, col):
-                if v == 1:
-                    if type(self.timestamp[0]) is list:
-
-                        t = np.array(self.timestamp[i][-s:]) / ms_scale
-                        # print(t.shape)
-                    else:
-                        t = np.array(self.timestamp[-s:]) / ms_scale
-                    y = np.array(self.all[i])
-                    if y.size > t.size:
-                        y = y[:t.size]
-                    if y.size < t.size:
-                        t = t[:y.size]
-                    # divAux = FACTOR
-                    # ymin = SCALE_MIN
-                    if useScale:
-                        ymin = y.min()
-                        divAux = y.max() - y.min()
-                    else:
-                        ymin = 0.0
-                        divAux = 1.0
-                    # divAux = 0
-                    if divAux == 0:
-                        divAux = 1
-                    try:
-                        self.axis.plot(t, (y[-s:] - ymin) / divAux, color=c1)
-                    except ValueError:
-                        a = 1
-                i = i + 1
-        if useScale:
-            self.axis.set_ylim(-0.1, 1.1)
-        self.canvas.draw()
+                ymin = 0.0
+                divAux = 1.0
+            # divAux = 0
+            if divAux == 0:
+                divAux = 1
+            traces.append((na, t, (y[-s:] - ymin) / divAux, c1))
+        self._render(traces, ylim=(-0.1, 1.1) if useScale else None, stamp=stamp)
+        self.stats.toc('frame', tFrame)
 
     def plotControlFromChecksTime(self, tV, extraT=2, t_in_ms=False):
         """
@@ -278,64 +770,55 @@ class PlotPanel(tk.Frame):
         :param extraT: extra time (empty) to show for visualization
         :type float
         """
-        if len(self.all[0]) < 2:
+        if self._nSamples() < 2:
             return
+        if not self._isDirty(tV, extraT, t_in_ms):
+            self.stats.count('skipped')
+            return
+        tFrame = self.stats.tic()
+        stamp = self._newestStamp()
         useScale = self.useScale
-        self.axis.clear()
-        i = 0
+        traces = []
         if self.showTime:
             if t_in_ms:
                 ms_scale = 1000.0
             else:
                 ms_scale = 1.0
-            if type(self.timestamp[0]) is list:
-                t = self.timestamp[0][-1] / ms_scale
-                # print(t.shape)
-            else:
-                t = self.timestamp[-1] / ms_scale
-            self.consoleVar.set(self.title + '\n %.1fs' % t)
+            t = self._lastTime() / ms_scale
+            self._setTitle(self.title + '\n %.1fs' % t)
+        elif self.showStats:
+            self._setTitle(self.title)
+        checked = []
+        sizes = []
+        for i, na, c1 in self._checked():
+            rate = self._rate(i)
+            if rate > 0:
+                checked.append((i, na, c1))
+                sizes.append(int(tV * 1000 * rate))
+        if useScale and isinstance(self.all, RingBuffer) and len(checked) > 0:
+            t0 = self.stats.tic()
+            self._feedNormalizer(sizes[0])
+            self.stats.toc('normalize', t0)
         # t = np.array(t1) / 1000
-        for ch, col in zip(self.checks, self.plotColor):
-            vals = ch.getAllValues()
-            for v, c1 in zip(vals, col):
-                if v == 1:
-                    # plot that var
-                    if len(self.all[i]) < 2:
-                        continue
-                    if type(self.timestamp[0]) is list:
-                        dt = self.timestamp[i][-1] - self.timestamp[i][-2]
-                        s = int(tV * 1000 // dt)
-                        t = np.array(self.timestamp[i][-s:]) / 1000
-                        # print(s)
-                    else:
-                        dt = self.timestamp[-1] - self.timestamp[-2]
-                        s = int(tV * 1000 // dt)
-                        t = np.array(self.timestamp[-s:]) / 1000
-                    y = np.array(self.all[i])
-                    if y.size > t.size:
-                        y = y[:t.size]
-                    if y.size < t.size:
-                        t = t[:y.size]
-                    if useScale:
-                        ymin = y.min()
-                        divAux = y.max() - y.min()
-                    else:
-                        ymin = 0.0
-                        divAux = 8000.0
-                    # divAux = 0
-                    if divAux == 0:
-                        divAux = 1
-                    try:
-                        self.axis.plot(t, (y[-s:] - ymin) / divAux, color=c1)
-                    except ValueError:
-                        a = 1
-                i = i + 1
-        if useScale:
-            self.axis.set_ylim(-0.1, 1.1)
-        x_lim = self.axis.get_xlim()
-        self.axis.set_xlim(x_lim[0], x_lim[1] + extraT)
+        for (i, na, c1), s, (t, y) in zip(checked, sizes, self._signals(checked, sizes)):
+            t = t / 1000
+            if y.size > t.size:
+                y = y[:t.size]
+            if y.size < t.size:
+                t = t[:y.size]
+            if useScale:
+                ymin, ymax = self._yRange(i, na, s)
+                divAux = ymax - ymin
+            else:
+                ymin = 0.0
+                divAux = 8000.0
+            # divAux = 0
+            if divAux == 0:
+                divAux = 1
+            traces.append((na, t, (y[-s:] - ymin) / divAux, c1))
         # self.axis.set_ylim(-200, 2200)
-        self.canvas.draw()
+        self._render(traces, ylim=(-0.1, 1.1) if useScale else None, extraT=extraT, stamp=stamp)
+        self.stats.toc('frame', tFrame)
 
 
 class PlotPanelTimer(tk.Frame):
@@ -366,7 +849,7 @@ class PlotPanelTimer(tk.Frame):
 class PlotPanelPandas(PlotPanel):
     def __init__(self, parent, title, titles, names, plotColor, timestamp, allValsPandas, color=None,
                  number2Plot=500, shareAxis=None, showTime=False, useScale=True, multiplier=10,
-                 timerFrame=None, **kwargs):
+                 timerFrame=None, scaleMode='running', **kwargs):
         """
         This widget has checkboxes with variables and a matplot figure the label goes to the left
         :param parent: parent frome
@@ -381,8 +864,8 @@ class PlotPanelPandas(PlotPanel):
         :type plotColor: list
         :param timestamp: timestamps list
         :type timestamp: list
-        :param allValsPandas: Pandas DataFrame containing the values
-        :type allValsPandas: pandas.DataFrame
+        :param allValsPandas: Pandas DataFrame or RingBuffer containing the values
+        :type allValsPandas: pandas.DataFrame, RingBuffer
         :param color: Color to use for the widget
         :type color: str
         :param number2Plot: How many data points to plot from the list. The widget will plot the last n values
@@ -393,10 +876,14 @@ class PlotPanelPandas(PlotPanel):
         :type showTime: bool
         :param useScale: Flag to normalize all the values between the min and max value. This flag will ignore all units
         :type useScale: bool
-        :param multiplier: To improve performance, use this value to only refresh the plot every multiplier times
+        :param multiplier: To improve performance, use this value to only refresh the plot every multiplier times. Use 0
+        when the panel is driven by a FrameScheduler
         :type multiplier: int
         :param timerFrame: timerFrame to use to display the time
         :type timerFrame: PlotPanelTimer
+        :param scaleMode: 'running' normalizes with the min and max since the last Reset Scale, 'window' with the min
+        and max of the samples on screen
+        :type scaleMode: str
         """
         super(PlotPanelPandas, self).__init__(parent, title, titles, names, plotColor, timestamp, allValsPandas,
                                               color=color, number2Plot=number2Plot, shareAxis=shareAxis,
@@ -409,15 +896,25 @@ class PlotPanelPandas(PlotPanel):
         self._check_normal = CheckControl(scale_frame, "", ['Normalize'], self._normalize_option, color=['white'],
                                           defaultVal=[useScale])
         self._check_normal.pack(side=tk.LEFT)
+        self._initPandasState(scaleMode, multiplier, timerFrame)
+        self._normalize_option()
+
+    def _initPandasState(self, scaleMode, multiplier, timerFrame):
+        """
+        Sets the state of PlotPanelPandas that does not depend on Tk, see _initPlotState
+        """
         self.maxValsAux = None
         self.minValsAux = None
+        capacity = self.all.capacity if isinstance(self.all, RingBuffer) else None
+        self.normalizer = StreamNormalizer(scaleMode, capacity=capacity)
+        self.pipeline = None
         self.dt = 0
         self.multiplier = multiplier
         self.counter = multiplier
         self.timerFrame = timerFrame
-        self._normalize_option()
 
     def _normalize_option(self):
+        self.invalidate()
         self.useScale = self._check_normal.getAllValues()[0]
         if self.useScale:
             self.button.configure(state='normal')
@@ -433,6 +930,65 @@ class PlotPanelPandas(PlotPanel):
         Resets the scale of the plot
         """
         self.maxValsAux = None
+        self._fedTotal = None
+        self.invalidate()
+
+    def _nSamples(self):
+        if isinstance(self.all, RingBuffer):
+            return len(self.all)
+        return self.all.shape[0]
+
+    def _plotSource(self):
+        if self.pipeline is not None:
+            return self.pipeline
+        return self.all
+
+    def _updatePipeline(self, preprocess):
+        """
+        Applies preprocess to the new samples only. The results are kept in a DerivedRingBuffer that the panel plots
+        from. The buffer is rebuilt when the preprocessed columns change
+        :param preprocess: function of each column, see preprocessFunctions
+        :type preprocess: dict
+        """
+        functions = preprocess
+        if self.pipeline is None or set(self.pipeline.functions) != set(functions):
+            self.pipeline = DerivedRingBuffer(self.all, functions)
+            self._fedTotal = None
+        self.pipeline.update(functions)
+
+    def _window(self, n):
+        """
+        Returns the timestamps and the values of the last n samples. If the data source is a RingBuffer, this is a
+        consistent snapshot of the window
+        :param n: number of samples
+        :type n: int
+        :return: timestamps and a dict with the values of each column, None if the window has less than one sample
+        :rtype: tuple
+        """
+        if n <= 0:
+            # usually the timestamps are in ms and t_in_ms is False, so the rate is 1000 times too small
+            warnings.warn('The window of panel %s has %d samples, check t_in_ms' % (self.title, n))
+            return None
+        src = self._plotSource()
+        if isinstance(src, RingBuffer):
+            return src.snapshot(n)
+        windowVals = self.all.iloc[-n:, :]
+        return windowVals.index.values, {na: windowVals[na].values for na in windowVals.columns}
+
+    def _timestamps(self):
+        if isinstance(self.all, RingBuffer):
+            return self.all.timestamps()
+        return self.all.index.values
+
+    def _lastTime(self):
+        if isinstance(self.all, RingBuffer):
+            return self.all.timestamps(1)[-1]
+        return self.all.index.values[-1]
+
+    def _lastSync(self):
+        if isinstance(self.all, RingBuffer):
+            return self.all.column('sync', 1)[-1] == 1
+        return self.all['sync'].values[-1] == 1
 
     def plotControlFromChecksTime(self, tV, extraT=2.0, preprocess=None, t_in_ms=False):
         """
@@ -441,17 +997,26 @@ class PlotPanelPandas(PlotPanel):
         :type tV: float
         :param extraT: extra time (empty) to show for visualization
         :type float
-        :param preprocess: Function to use to preprocess the signals
-        :type preprocess: function
+        :param preprocess: [column names, functions] used to preprocess the signals, one function per column or a
+        single function for all the columns. With a RingBuffer source each sample is processed once and kept in a derived store, the functions have to work on numpy arrays and should
+        not change between calls. Changing them does not trigger a redraw, call invalidate if needed
+        :type preprocess: list
         """
         # this function will plot all the values from all
-        if self.all.shape[0] == 0:
+        nSamples = self._nSamples()
+        if nSamples == 0:
             return
         if self.counter != 0:
             self.counter -= 1
             return
         # print(self.counter)
         self.counter = self.multiplier
+        if not self._isDirty(tV, extraT, t_in_ms):
+            self.stats.count('skipped')
+            return
+        stats = self.stats
+        tFrame = stats.tic()
+        stamp = self._newestStamp()
         # i = 0
 
         # def _plotThread(self, tV, extraT, preprocess):
@@ -459,66 +1024,186 @@ class PlotPanelPandas(PlotPanel):
             ms_scale = 1000.0
         else:
             ms_scale = 1.0
-        dt = ms_scale / np.diff(self.all.index.values).mean()
-        if np.isnan(dt):
+        if nSamples < 2:
             return
+        if isinstance(self.all, RingBuffer) and self.all.rate > 0:
+            # estimated by the store on every append
+            dt = ms_scale * self.all.rate
+            tLast = self._lastTime()
+        else:
+            tAll = self._timestamps()
+            span = tAll[-1] - tAll[0]
+            if span == 0 or np.isnan(span):
+                return
+            # mean of the time differences
+            dt = ms_scale * (nSamples - 1) / span
+            tLast = tAll[-1]
         self.dt = dt
         if self.showTime:
-            t = self.all.index[-1] / ms_scale
+            t = tLast / ms_scale
             # print(self.all.columns)
-            s_val = self.all['sync'].values[-1] == 1
-            self.consoleVar.set(self.title + '\n %.1fs\n%.1fHz\n Sync: %d' % (t, dt, s_val))
+            s_val = self._lastSync()
+            self._setTitle(self.title + '\n %.1fs\n%.1fHz\n Sync: %d' % (t, dt, s_val))
             if self.timerFrame is not None:
                 self.timerFrame.setNewTime(t)
+        elif self.showStats:
+            self._setTitle(self.title + '\n%.1fHz' % dt)
         vals = [ch.getAllValues() for ch in self.checks]
         if all(v == 0 for vv in vals for v in vv):
             return
-        self.axis.cla()
 
         # I'll plot only the new 500 values
-
-        # t = np.array(t1) / 1000
-        # timeS = int((self.all.index[-1] - tV * 1000 ) // self.all.index.get_values().mean())
-        # # print(tV * 1000)
-        # windowVals = self.all.iloc[-timeS:, :].copy() / 4096
-
-        windowVals = self.all.iloc[-int(tV * dt):, :].copy()
+        n = int(tV * dt)
+        t0 = stats.tic()
         if preprocess is not None:
-            for k, fn in zip(*preprocess):
+            preprocess = preprocessFunctions(preprocess)
+        if preprocess is not None and isinstance(self.all, RingBuffer):
+            self._updatePipeline(preprocess)
+            preprocess = None
+            stats.toc('preprocess', t0)
+        elif preprocess is None:
+            self.pipeline = None
+        t0 = stats.tic()
+        window = self._window(n)
+        if window is None:
+            return
+        t, windowVals = window
+        stats.toc('window', t0, n)
+        if preprocess is not None:
+            t0 = stats.tic()
+            for k, fn in preprocess.items():
                 windowVals[k] = fn(windowVals[k])
+            stats.toc('preprocess', t0, n)
         if self.useScale:
-            if self.maxValsAux is None:
-                self.maxValsAux = pandas.Series(np.zeros_like(windowVals.max()), index=windowVals.max().index)
-                self.minValsAux = self.maxValsAux.copy() + 4096
-            else:
-                self.maxValsAux.loc[windowVals.max() > self.maxValsAux] = windowVals.max().loc[
-                    windowVals.max() > self.maxValsAux]
-                self.minValsAux.loc[windowVals.min() < self.minValsAux] = windowVals.min().loc[
-                    windowVals.min() < self.minValsAux]
+            # only the new samples are fed, the cost does not depend on the window length
+            t0 = stats.tic()
+            self._feedNormalizer(n, preprocess)
+            self.minValsAux, self.maxValsAux = self.normalizer.getSeries(list(windowVals.keys()), n)
             divAux = self.maxValsAux - self.minValsAux
             divAux[divAux == 0] = 1
-            windowVals = (windowVals - self.minValsAux) / (divAux)
+            stats.toc('normalize', t0)
         # print(dt)
         # print(windowVals.shape[0])
-        windowVals.index /= ms_scale
-        for ch, col, colNames in zip(self.checks, self.plotColor, self.names):
-            vals = ch.getAllValues()
-            for v, c1, na in zip(vals, col, colNames):
-                if na not in windowVals.columns:
+        t = t / ms_scale
+        traces = []
+        for v, col, colNames in zip(vals, self.plotColor, self.names):
+            for v1, c1, na in zip(v, col, colNames):
+                if na not in windowVals:
                     continue
-                if v == 1:
-                    # print(na)
-                    # try:
-                    windowVals[na].plot(ax=self.axis, color=c1)
-                    # self.axis.plot(t, (y[-s:] - ymin) / divAux, color=c1)
-                    # except TypeError:
-                    #     a = 1
-                # i = i + 1
-        self.axis.set_ylim(-0.1, 1.1)
-        x_lim = self.axis.get_xlim()
-        self.axis.set_xlim(x_lim[0], x_lim[1] + extraT)
+                if v1 == 1:
+                    y = windowVals[na]
+                    if self.useScale:
+                        y = (y - self.minValsAux[na]) / divAux[na]
+                    traces.append((na, t, y, c1))
         # self.axis.set_ylim(-200, 2200)
-        self.canvas.draw()
+        self._render(traces, ylim=(-0.1, 1.1), extraT=extraT, stamp=stamp)
+        stats.toc('frame', tFrame)
+
+
+class PlotDashboard(tk.Frame):
+    def __init__(self, parent, nCols=1, figsize=(6, 8), renderMode='blit', stats=None, **kwargs):
+        """
+        Lays out many plot panels as subplots of one figure. Each panel keeps its title and checkboxes on the left,
+        and there is one canvas and one toolbar. render() draws (or blits) the whole dashboard once per frame
+        :param parent: parent frame
+        :type parent: tk.Frame
+        :param nCols: number of columns of subplots, rows are added as panels are added
+        :type nCols: int
+        :param figsize: Size of the figure
+        :type figsize: tuple
+        :param renderMode: 'draw' or 'blit', see PlotPanel
+        :type renderMode: str
+        :param stats: timer of the 'draw' stage, the panels keep their own stats. If None, a disabled HotPathStats is
+        used
+        :type stats: HotPathStats
+        """
+        super(PlotDashboard, self).__init__(parent, **kwargs)
+        self.stats = stats if stats is not None else HotPathStats()
+        if renderMode not in ['draw', 'blit']:
+            raise ValueError('renderMode should be draw or blit, received: %s' % renderMode)
+        self.renderMode = renderMode
+        self.nCols = nCols
+        self.panels = []
+        self.axes = []
+        self._updates = []
+        self._dirty = True
+        self.controls = tk.Frame(self)
+        self.controls.pack(side=tk.LEFT, fill=tk.Y)
+        self.f = plt.figure(figsize=figsize, dpi=100)
+        self.canvas = FigureCanvasTkAgg(self.f, self)
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self)
+        self.toolbar.update()
+        self.canvas.get_tk_widget().pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.blitManager = BlitManager(self.canvas) if renderMode == 'blit' else None
+
+    def addAxis(self, shareAxis=None):
+        """
+        Adds a subplot, the existing subplots are moved to make room for it
+        :param shareAxis: A matplotlib axes that will share the scale
+        :type shareAxis: Axes
+        :rtype: Axes
+        """
+        n = len(self.axes) + 1
+        gs = GridSpec(-(-n // self.nCols), self.nCols, figure=self.f)
+        for k, ax in enumerate(self.axes):
+            ax.set_subplotspec(gs[k])
+        ax = self.f.add_subplot(gs[n - 1], sharex=shareAxis, sharey=shareAxis)
+        self.axes.append(ax)
+        if self.blitManager is not None:
+            self.blitManager.requestDraw()
+        self._dirty = True
+        return ax
+
+    def addPanel(self, panelClass, *args, **kwargs):
+        """
+        Creates a panel that plots on this dashboard
+        :param panelClass: PlotPanel or PlotPanelPandas
+        :type panelClass: type
+        :param args: arguments of the panel, without the parent
+        :param kwargs: keyword arguments of the panel
+        :return: the panel
+        :rtype: PlotPanel
+        """
+        panel = panelClass(self.controls, *args, dashboard=self, **kwargs)
+        panel.pack(side=tk.TOP, fill=tk.BOTH, expand=tk.YES)
+        self.panels.append(panel)
+        return panel
+
+    def addUpdate(self, fn):
+        """
+        Adds a function called by refresh before rendering, usually a plotControlFromChecksTime of a panel
+        :param fn: function without arguments
+        :type fn: function
+        """
+        self._updates.append(fn)
+
+    def markDirty(self):
+        self._dirty = True
+
+    def render(self):
+        """
+        Draws the changes of all the panels with one draw or blit
+        """
+        if not self._dirty:
+            return
+        self._dirty = False
+        t0 = self.stats.tic()
+        if self.blitManager is not None:
+            self.blitManager.render()
+        else:
+            self.canvas.draw()
+        self.stats.toc('draw', t0, len(self.panels))
+        for panel in self.panels:
+            panel._recordLatency(panel._pendingStamp)
+            panel._pendingStamp = None
+
+    def refresh(self):
+        """
+        Runs the update functions and renders the dashboard, register it with a FrameScheduler
+        """
+        for fn in self._updates:
+            fn()
+        self.render()
 
 
 class PlotPanel3D(tk.Frame):
@@ -577,32 +1262,34 @@ class PlotPanel3D(tk.Frame):
             self.Hs.append(np.identity(4))
             # self.Hs[-1][0, 3] = j
             self.systs.append(AxesSystemPlotter(self.axis))
-            self.systs[-1].rotateAndPlotSystem(H=self.Hs[-1])
+            self.systs[-1].updateSystem(H=self.Hs[-1])
+        self.axis.set_xlim(-2, 2)
+        self.axis.set_ylim(-2, 2)
+        self.axis.set_zlim(-2, 2)
         self.canvas.draw()
+        self._lastKey = None
 
-    def plotControlFromChecks(self):
-        self.axis.clear()
-
-        i = 0
-        # t = np.array(t1) / 1000
-        for ch, col in zip(self.checks, self.plotColor):
-            vals = ch.getAllValues()
-            for v, c1 in zip(vals, col):
-                if v == 1:
-                    # Get the values of rotation
-                    if len(self.all[i][0]) == 0:
-                        self.systs[i].rotateAndPlotSystem(H=self.Hs[i], clearAx=False)
-                        continue
-                    # self.all is a list of list with [rx, ry, rz]
-                    eu = [x[-1] for x in self.all[i]]
-                    self.Hs[i][:3, :3] = rot.from_euler(self._rotationOrder, eu, degrees=self._degrees).as_matrix()
-                    self.systs[i].rotateAndPlotSystem(H=self.Hs[i], clearAx=False)
+    def invalidate(self):
+        """
+        Forces a redraw on the next call even if the angles and the checkboxes did not change
+        """
+        self._lastKey = None
 
-                i = i + 1
+    def _lastAngles(self, i):
+        """
+        Returns the latest euler angles of the i-th system, or None if there is no data
+        """
+        # self.all is a list of list with [rx, ry, rz]
+        if len(self.all[i][0]) == 0:
+            return None
+        return [x[-1] for x in self.all[i]]
 
-        self.axis.set_xlim(-2, 2)
-        self.axis.set_ylim(-2, 2)
-        self.axis.set_zlim(-2, 2)
+    def plotControlFromChecks(self):
+        key = (dataVersion(self.all), tuple(tuple(ch.getAllValues()) for ch in self.checks))
+        if key == self._lastKey:
+            return
+        self._lastKey = key
+        updateSystems(self)
         self.canvas.draw()
 
 
@@ -621,9 +1308,11 @@ class PlotPanel3DPandas(tk.Frame):
         :type names: list
         :param plotColor: Color to use for systems
         :type plotColor: list
-        :param allValsPandas: Dataframe with the angle values
-        :type allValsPandas: pandas.DataFrame
-        :param angle_column_names: name of the columns containing the angle values in the correct order
+        :param allValsPandas: Dataframes or RingBuffers with the angle values, one per system. A single Dataframe or
+        RingBuffer is used for all the systems
+        :type allValsPandas: list, pandas.DataFrame, RingBuffer
+        :param angle_column_names: name of the columns containing the angle values in the correct order, one list per
+        system. A single list of names is used for all the systems
         :type angle_column_names: list
         :param figsize: Size of the figure
         :type figsize: tuple
@@ -636,8 +1325,7 @@ class PlotPanel3DPandas(tk.Frame):
         super(PlotPanel3DPandas, self).__init__(parent, **kwargs)
         self._rotationOrder = rotationOrder
         self._degrees = degrees
-        self._angle_column_names = angle_column_names
-        self.all = allValsPandas
+        self.all, self._angle_column_names = angleSources(allValsPandas, angle_column_names, len(names))
         self.parent = parent
         self.titleLabel = ttk.Label(self, text=title, background=color)
         self.titleLabel.pack(side=tk.LEFT, fill=tk.Y)
@@ -665,33 +1353,95 @@ class PlotPanel3DPandas(tk.Frame):
             self.Hs.append(np.identity(4))
             # self.Hs[-1][0, 3] = j
             self.systs.append(AxesSystemPlotter(self.axis))
-            self.systs[-1].rotateAndPlotSystem(H=self.Hs[-1])
+            self.systs[-1].updateSystem(H=self.Hs[-1])
+        self.axis.set_xlim(-2, 2)
+        self.axis.set_ylim(-2, 2)
+        self.axis.set_zlim(-2, 2)
         self.canvas.draw()
+        self._lastKey = None
+
+    def invalidate(self):
+        """
+        Forces a redraw on the next call even if the angles and the checkboxes did not change
+        """
+        self._lastKey = None
+
+    def _lastAngles(self, i):
+        """
+        Returns the latest euler angles of the i-th system, or None if there is no data
+        """
+        src = self.all[i]
+        names = self._angle_column_names[i]
+        if isinstance(src, RingBuffer):
+            if len(src) == 0:
+                return None
+            return [src.column(na, 1)[-1] for na in names]
+        if src.shape[0] == 0:
+            return None
+        return src[names].values[-1]
 
     def plotControlFromChecks(self):
         # this function will plot all the values from all
-        self.axis.clear()
+        key = (dataVersion(self.all), tuple(tuple(ch.getAllValues()) for ch in self.checks))
+        if key == self._lastKey:
+            return
+        self._lastKey = key
+        updateSystems(self)
+        self.canvas.draw()
 
-        i = 0
-        # t = np.array(t1) / 1000
-        for ch, col in zip(self.checks, self.plotColor):
-            vals = ch.getAllValues()
-            for v, c1 in zip(vals, col):
-                if v == 1:
-                    # Get the values of rotation
-                    if self.all[i].shape[0] == 0:
-                        self.systs[i].rotateAndPlotSystem(H=self.Hs[i], clearAx=False)
-                        continue
-                    eu = self.all.loc[self._angle_column_names].values[-1]
-                    self.Hs[i][:3, :3] = rot.from_euler(self._rotationOrder, eu, degrees=self._degrees).as_matrix()
-                    self.systs[i].rotateAndPlotSystem(H=self.Hs[i], clearAx=False)
 
-                i = i + 1
+def angleSources(allVals, columnNames, nSystems):
+    """
+    Returns one data source and one list of angle columns per system. A single Dataframe or RingBuffer and a single
+    list of column names (the signature of the previous PlotPanel3DPandas) are repeated for all the systems
+    :param allVals: Dataframes or RingBuffers, one per system, or a single one
+    :type allVals: list, pandas.DataFrame, RingBuffer
+    :param columnNames: lists of angle column names, one per system, or a single list
+    :type columnNames: list
+    :param nSystems: number of systems
+    :type nSystems: int
+    :rtype: (list, list)
+    """
+    if not isinstance(allVals, (list, tuple)):
+        allVals = [allVals] * nSystems
+    if len(columnNames) > 0 and isinstance(columnNames[0], str):
+        columnNames = [columnNames] * len(allVals)
+    if len(allVals) != len(columnNames):
+        raise ValueError('Got %d data sources and %d lists of angle columns' % (len(allVals), len(columnNames)))
+    return list(allVals), list(columnNames)
 
-        self.axis.set_xlim(-2, 2)
-        self.axis.set_ylim(-2, 2)
-        self.axis.set_zlim(-2, 2)
-        self.canvas.draw()
+
+def updateSystems(panel):
+    """
+    Updates the coordinate systems of a 3D panel in place. The rotation matrices of all the active systems are
+    computed with one Rotation.from_euler call
+    :param panel: panel with checks, Hs, systs and _lastAngles(i)
+    :type panel: PlotPanel3D, PlotPanel3DPandas
+    """
+    i = 0
+    visible = []
+    idx = []
+    angles = []
+    for ch in panel.checks:
+        for v in ch.getAllValues():
+            if i >= len(panel.systs):
+                break
+            visible.append(v == 1)
+            if v == 1:
+                eu = panel._lastAngles(i)
+                if eu is not None:
+                    idx.append(i)
+                    angles.append(eu)
+            i = i + 1
+    if len(angles) > 0:
+        mats = rot.from_euler(panel._rotationOrder, np.asarray(angles, dtype=np.float64),
+                              degrees=panel._degrees).as_matrix()
+        for j, m in zip(idx, mats):
+            panel.Hs[j][:3, :3] = m
+    for j, v in enumerate(visible):
+        if v:
+            panel.systs[j].updateSystem(H=panel.Hs[j])
+        panel.systs[j].setVisible(v)
 
 
 class InputWithButton(tk.Frame):
@@ -885,10 +1635,40 @@ class AxesSystemPlotter(object):
         self.xi = np.array([1.0, 0.0, 0.0, 1.0])
         self.yi = np.array([0.0, 1.0, 0.0, 1.0])
         self.zi = np.array([0.0, 0.0, 1.0, 1.0])
+        self._axesPoints = np.stack([self.xi, self.yi, self.zi], axis=1)
+        self._segments = np.zeros((3, 2, 3))
+        self.lines = None
+
+    def _computeSegments(self, H):
+        o = H[:-1, -1]
+        # same geometry as the quivers, each axis goes from o to o + H * axis
+        self._segments[:, 0, :] = o
+        self._segments[:, 1, :] = o + np.matmul(H, self._axesPoints)[:-1].T
+        return self._segments
+
+    def updateSystem(self, H=None):
+        """
+        Moves the system to a new transformation. The three axes are one Line3DCollection that is created on the first
+        call and then only gets new segments, so nothing is added to the axis after that
+        :param H: homogenous transformation
+        :type H: np.ndarray
+        """
+        if H is None:
+            H = np.identity(4)
+        segments = self._computeSegments(H)
+        if self.lines is None or self.lines.axes is not self.axis:
+            self.lines = Line3DCollection(segments.copy(), colors=['red', 'green', 'blue'])
+            self.axis.add_collection3d(self.lines)
+        else:
+            self.lines.set_segments(segments.copy())
+
+    def setVisible(self, visible):
+        if self.lines is not None:
+            self.lines.set_visible(visible)
 
     def rotateAndPlotSystem(self, H=None, clearAx=False):
         """
-        Information about the system axes
+        Information about the system axes. It adds three new quivers on every call, use updateSystem to animate
         :param H: homogenous transformation
         :type H: np.ndarray
         :param clearAx: Flag to clear the axis before plotting
@@ -905,6 +1685,588 @@ class AxesSystemPlotter(object):
             self.axis.quiver(*o, *v, length=1.0, color=c)
 
 
+class BlitManager(object):
+    def __init__(self, canvas):
+        """
+        Redraws animated artists over a cached background of the figure. The background is captured every time the
+        canvas does a full draw (first render, resize, toolbar zoom or requestDraw)
+        :param canvas: canvas of the figure
+        :type canvas: FigureCanvasTkAgg
+        """
+        self.canvas = canvas
+        self.artists = []
+        self._background = None
+        self._needsDraw = True
+        self._cid = canvas.mpl_connect('draw_event', self._onDraw)
+
+    def add(self, artist):
+        """
+        Adds an artist that is only drawn by the manager
+        :param artist: artist to animate
+        :type artist: matplotlib.artist.Artist
+        """
+        artist.set_animated(True)
+        self.artists.append(artist)
+
+    def remove(self, artist):
+        self.artists.remove(artist)
+        artist.set_animated(False)
+
+    def requestDraw(self):
+        """
+        The next render draws the full figure, use it when something that is not animated changes
+        """
+        self._needsDraw = True
+
+    def _onDraw(self, event):
+        if event is not None and event.canvas is not self.canvas:
+            return
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._drawAnimated()
+
+    def _drawAnimated(self):
+        fig = self.canvas.figure
+        for a in self.artists:
+            fig.draw_artist(a)
+
+    def render(self):
+        """
+        Shows the current state of the artists
+        """
+        if self._needsDraw or self._background is None:
+            self._needsDraw = False
+            # the draw event captures the background and draws the artists
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._background)
+            self._drawAnimated()
+            self.canvas.blit(self.canvas.figure.bbox)
+
+
+class TracePlotter(object):
+    def __init__(self, axis, blitManager=None):
+        """
+        Keeps one persistent Line2D per signal and updates its data instead of plotting again. Axis limits only
+        change when the data leaves them, so most refreshes do not need a full draw
+        :param axis: axis to plot on
+        :type axis: matplotlib.axes.Axes
+        :param blitManager: manager that draws the lines, if None the lines are drawn with the figure
+        :type blitManager: BlitManager
+        """
+        self.axis = axis
+        self.blitManager = blitManager
+        self.lines = {}
+
+    def _line(self, name, color):
+        line = self.lines.get(name)
+        if line is None:
+            line, = self.axis.plot([], [], color=color)
+            if self.blitManager is not None:
+                self.blitManager.add(line)
+            self.lines[name] = line
+        return line
+
+    def update(self, traces, ylim=None, extraT=None):
+        """
+        Updates the lines with new data
+        :param traces: list of (name, t, y, color). Lines not in traces are hidden
+        :type traces: list
+        :param ylim: limits of the y axis, if None the limits follow the data
+        :type ylim: tuple
+        :param extraT: extra time (empty) shown after the last sample. The x axis jumps forward only when the data
+        reaches its end. If None, a quarter of the time window is used
+        :type extraT: float
+        :return: True if the axis limits changed
+        :rtype: bool
+        """
+        shown = set()
+        tMin = yMin = np.inf
+        tMax = yMax = -np.inf
+        for na, t, y, c in traces:
+            line = self._line(na, c)
+            line.set_data(t, y)
+            line.set_visible(True)
+            shown.add(na)
+            if len(t) > 0:
+                tMin = min(tMin, t[0])
+                tMax = max(tMax, t[-1])
+                yMin = min(yMin, np.nanmin(y))
+                yMax = max(yMax, np.nanmax(y))
+        for na, line in self.lines.items():
+            if na not in shown:
+                line.set_visible(False)
+        if not np.isfinite(tMax):
+            return False
+        changed = False
+        x0, x1 = self.axis.get_xlim()
+        if tMax > x1 or tMin < x0 or tMax < x0:
+            span = tMax - tMin
+            extra = extraT if extraT is not None else 0.25 * span
+            if span + extra <= 0:
+                extra = 1.0
+            self.axis.set_xlim(tMin, tMax + extra)
+            changed = True
+        y0, y1 = self.axis.get_ylim()
+        if ylim is not None:
+            if (y0, y1) != tuple(ylim):
+                self.axis.set_ylim(*ylim)
+                changed = True
+        elif np.isfinite(yMax):
+            r = max(yMax - yMin, 1e-9)
+            if yMin < y0 or yMax > y1 or r < 0.5 * (y1 - y0):
+                self.axis.set_ylim(yMin - 0.1 * r, yMax + 0.1 * r)
+                changed = True
+        if changed and self.blitManager is not None:
+            self.blitManager.requestDraw()
+        return changed
+
+
+def minMaxDecimate(t, y, nPixels):
+    """
+    Reduces a trace to the minimum and maximum of each pixel column, so peaks are kept. The first and last samples
+    are always kept, so the trace spans the same time. The output has at most 2*nPixels points
+    :param t: time of the samples
+    :type t: np.ndarray
+    :param y: values of the samples
+    :type y: np.ndarray
+    :param nPixels: number of pixel columns (buckets)
+    :type nPixels: int
+    :return: decimated t and y
+    :rtype: tuple
+    """
+    t = np.asarray(t)
+    y = np.asarray(y)
+    n = y.shape[0]
+    if n <= 2 * nPixels:
+        return t, y
+    # one bucket less leaves room for the first and last samples
+    k = -(-n // max(nPixels - 1, 1))
+    nB = -(-n // k)
+    # pad with the last sample so every bucket has k samples
+    yB = np.empty(nB * k, dtype=y.dtype)
+    yB[:n] = y
+    yB[n:] = y[-1]
+    yB = yB.reshape(nB, k)
+    base = np.arange(nB) * k
+    iMin = base + np.argmin(yB, axis=1)
+    iMax = base + np.argmax(yB, axis=1)
+    idx = np.empty(2 * nB + 2, dtype=np.intp)
+    idx[0] = 0
+    idx[1:-1:2] = np.minimum(iMin, iMax)
+    idx[2:-1:2] = np.maximum(iMin, iMax)
+    idx[-1] = n - 1
+    np.minimum(idx, n - 1, out=idx)
+    return t[idx], y[idx]
+
+
+def lttbDecimate(t, y, nPixels):
+    """
+    Reduces a trace to 2*nPixels points with the Largest Triangle Three Buckets algorithm. Each bucket keeps the point
+    that forms the largest triangle with the point kept in the previous bucket and the mean of the next one
+    :param t: time of the samples
+    :type t: np.ndarray
+    :param y: values of the samples
+    :type y: np.ndarray
+    :param nPixels: number of pixel columns
+    :type nPixels: int
+    :return: decimated t and y
+    :rtype: tuple
+    """
+    t = np.asarray(t)
+    y = np.asarray(y)
+    n = y.shape[0]
+    nOut = 2 * nPixels
+    if n <= nOut or nOut < 3:
+        return t, y
+    tf = t.astype(np.float64)
+    yf = y.astype(np.float64)
+    # first and last points are always kept, the rest is split in nOut - 2 buckets
+    edges = np.linspace(1, n - 1, nOut - 1).astype(np.intp)
+    idx = np.empty(nOut, dtype=np.intp)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for j in range(nOut - 2):
+        s0, s1 = edges[j], edges[j + 1]
+        if j + 2 < nOut - 1:
+            n0, n1 = s1, edges[j + 2]
+            tN = tf[n0:n1].mean()
+            yN = yf[n0:n1].mean()
+        else:
+            tN = tf[-1]
+            yN = yf[-1]
+        area = np.abs((tf[a] - tN) * (yf[s0:s1] - yf[a]) - (tf[a] - tf[s0:s1]) * (yN - yf[a]))
+        a = s0 + int(np.argmax(area))
+        idx[j + 1] = a
+    return t[idx], y[idx]
+
+
+decimators = {None: None, 'minmax': minMaxDecimate, 'lttb': lttbDecimate}
+
+
+class SlidingMinMax(object):
+    def __init__(self, capacity=None):
+        """
+        Min and max of a stream of values. It keeps the running min and max since the last reset, and two monotonic
+        deques for the min and max of the last n samples. Each sample is pushed and popped at most once, so the cost is
+        O(1) amortized per sample and does not depend on n
+        :param capacity: largest window that can be queried, if None the deques are only trimmed by the queries
+        :type capacity: int
+        """
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.runMin = np.nan
+        self.runMax = np.nan
+        self._minQ = collections.deque()
+        self._maxQ = collections.deque()
+
+    @staticmethod
+    def _push(q, idx, vals):
+        # candidates are the samples larger than every later sample of the batch, they are decreasing
+        suffix = np.maximum.accumulate(vals[::-1])[::-1]
+        keep = np.ones(vals.shape[0], dtype=bool)
+        keep[:-1] = vals[:-1] > suffix[1:]
+        top = suffix[0]
+        while len(q) > 0 and q[-1][1] <= top:
+            q.pop()
+        q.extend(zip(idx[keep].tolist(), vals[keep].tolist()))
+
+    def extend(self, values):
+        """
+        Adds new samples, NaN values are skipped
+        :param values: new samples
+        :type values: np.ndarray
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        m = values.shape[0]
+        if m == 0:
+            return
+        idx = np.arange(self.count, self.count + m)
+        valid = ~np.isnan(values)
+        self.count += m
+        if not valid.all():
+            idx = idx[valid]
+            values = values[valid]
+            if values.shape[0] == 0:
+                return
+        self.runMin = np.fmin(self.runMin, values.min())
+        self.runMax = np.fmax(self.runMax, values.max())
+        self._push(self._maxQ, idx, values)
+        self._push(self._minQ, idx, -values)
+        if self.capacity is not None:
+            self._evict(self.capacity)
+
+    def _evict(self, n):
+        first = self.count - n
+        for q in (self._minQ, self._maxQ):
+            while len(q) > 0 and q[0][0] < first:
+                q.popleft()
+
+    def minMax(self, n=None):
+        """
+        Returns the min and max of the last n samples. The samples older than n are dropped, so n should not grow
+        between calls. If n is None, the running min and max since the last reset are returned
+        :param n: number of samples
+        :type n: int
+        :rtype: tuple
+        """
+        if n is None:
+            return self.runMin, self.runMax
+        self._evict(n)
+        if len(self._maxQ) == 0:
+            return np.nan, np.nan
+        return -self._minQ[0][1], self._maxQ[0][1]
+
+
+class StreamNormalizer(object):
+    def __init__(self, mode='running', capacity=None):
+        """
+        Keeps the min and max of each column of a stream, it is fed only with the new samples
+        :param mode: 'running' uses the min and max since the last reset, 'window' the min and max of the last n
+        samples
+        :type mode: str
+        :param capacity: largest window that can be queried
+        :type capacity: int
+        """
+        if mode not in ['running', 'window']:
+            raise ValueError('mode should be running or window, received: %s' % mode)
+        self.mode = mode
+        self.capacity = capacity
+        self.columns = {}
+
+    def reset(self, names=None):
+        """
+        :param names: columns to reset, if None all the columns are reset
+        :type names: list
+        """
+        for na, c in self.columns.items():
+            if names is None or na in names:
+                c.reset()
+
+    def update(self, values):
+        """
+        :param values: dict with the new samples of each column
+        :type values: dict
+        """
+        for na, v in values.items():
+            c = self.columns.get(na)
+            if c is None:
+                c = self.columns[na] = SlidingMinMax(self.capacity)
+            c.extend(v)
+
+    def minMax(self, name, n=None):
+        """
+        Min and max of a column. In window mode, of its last n samples
+        :rtype: tuple
+        """
+        c = self.columns.get(name)
+        if c is None:
+            return np.nan, np.nan
+        return c.minMax(n if self.mode == 'window' else None)
+
+    def getSeries(self, names, n=None):
+        """
+        Min and max of several columns
+        :return: min and max Series indexed by name
+        :rtype: tuple
+        """
+        vals = [self.minMax(na, n) for na in names]
+        minVals = pandas.Series([v[0] for v in vals], index=names, dtype=float)
+        maxVals = pandas.Series([v[1] for v in vals], index=names, dtype=float)
+        return minVals, maxVals
+
+
+class RenderThread(object):
+    _default = None
+    _defaultLock = threading.Lock()
+
+    def __init__(self):
+        """
+        Daemon thread that renders figures off the Tk thread. Jobs are kept per panel and a new job replaces the
+        pending one, so when rendering is slower than the refresh rate old frames are dropped instead of queued
+        """
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.rendered = 0
+        self.dropped = 0
+        self.renderTime = 0.0
+
+    @classmethod
+    def default(cls):
+        """
+        Thread shared by all the panels that do not provide one
+        :rtype: RenderThread
+        """
+        with cls._defaultLock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def start(self):
+        """
+        Starts the thread, does nothing if it is already running
+        """
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._cond:
+            self._running = False
+            self._jobs.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, key, job):
+        """
+        Schedules a render job
+        :param key: owner of the job, usually the panel. A pending job with the same key is replaced
+        :param job: function that renders, it receives no arguments
+        :type job: function
+        """
+        with self._cond:
+            if key in self._jobs:
+                self.dropped += 1
+                del self._jobs[key]
+            self._jobs[key] = job
+            self._cond.notify()
+
+    def cancel(self, key):
+        with self._cond:
+            self._jobs.pop(key, None)
+
+    def pending(self):
+        with self._cond:
+            return len(self._jobs)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and len(self._jobs) == 0:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                key = next(iter(self._jobs))
+                job = self._jobs.pop(key)
+            t0 = time.perf_counter()
+            try:
+                job()
+            except Exception as e:
+                warnings.warn('Render job failed: %r' % e)
+            self.renderTime = time.perf_counter() - t0
+            self.rendered += 1
+
+
+class FrameScheduler(object):
+    class Task(object):
+        def __init__(self, callback, fps, priority, name):
+            self.callback = callback
+            self.period = 1.0 / fps
+            self.fps = fps
+            self.priority = priority
+            self.name = name
+            self.nextDue = 0.0
+            self.drawTime = 0.0
+            self.frames = 0
+            self.skipped = 0
+            self.firstFrame = None
+
+    def __init__(self, root, frameBudget=0.016, minPeriod=0.001, alpha=0.2):
+        """
+        Owns the Tk after loop and decides which panels are redrawn on each frame. Every task has a target fps and a
+        priority. The draw time of each task is measured and the due tasks are run, most important first, until the
+        frame budget is used. The tasks that did not fit are late and go first on the next frame, so redraws spread
+        over frames instead of piling up
+        :param root: Tk widget that runs the after loop
+        :type root: tk.Tk
+        :param frameBudget: time (s) that the redraws can use per frame
+        :type frameBudget: float
+        :param minPeriod: minimum time (s) between frames
+        :type minPeriod: float
+        :param alpha: weight of the last measurement in the draw time average
+        :type alpha: float
+        """
+        super(FrameScheduler, self).__init__()
+        self.root = root
+        self.frameBudget = frameBudget
+        self.minPeriod = minPeriod
+        self.alpha = alpha
+        self.tasks = []
+        self.frames = 0
+        self.overBudget = 0
+        self._afterId = None
+
+    def register(self, callback, fps=30.0, priority=0, name=None):
+        """
+        Adds a redraw task
+        :param callback: function that redraws the panel, it receives no arguments
+        :type callback: function
+        :param fps: target refresh rate
+        :type fps: float
+        :param priority: tasks with higher priority are drawn first when the budget is short
+        :type priority: int
+        :param name: name used in the stats
+        :type name: str
+        :return: the task, use it to unregister or to change fps and priority
+        :rtype: FrameScheduler.Task
+        """
+        if fps <= 0:
+            raise ValueError('fps should be positive, received: %s' % fps)
+        if name is None:
+            name = getattr(callback, '__name__', 'task%d' % len(self.tasks))
+        task = self.Task(callback, fps, priority, name)
+        task.nextDue = time.perf_counter()
+        self.tasks.append(task)
+        return task
+
+    def unregister(self, task):
+        self.tasks.remove(task)
+
+    def setFps(self, task, fps):
+        task.fps = fps
+        task.period = 1.0 / fps
+
+    @property
+    def isRunning(self):
+        return self._afterId is not None
+
+    def start(self):
+        if self._afterId is None:
+            self._afterId = self.root.after(0, self._tick)
+
+    def stop(self):
+        if self._afterId is not None:
+            self.root.after_cancel(self._afterId)
+            self._afterId = None
+
+    def _order(self, task, now):
+        # every missed period counts as one extra level of priority, so low priority tasks are not starved
+        return task.priority + (now - task.nextDue) / task.period
+
+    def runFrame(self):
+        """
+        Runs the tasks that are due within the frame budget
+        :return: time (s) until the next task is due
+        :rtype: float
+        """
+        start = time.perf_counter()
+        due = [task for task in self.tasks if task.nextDue <= start]
+        due.sort(key=lambda task: self._order(task, start), reverse=True)
+        used = 0.0
+        for k, task in enumerate(due):
+            if k > 0 and used + task.drawTime > self.frameBudget:
+                task.skipped += 1
+                continue
+            t0 = time.perf_counter()
+            task.callback()
+            t1 = time.perf_counter()
+            dT = t1 - t0
+            used += dT
+            task.drawTime = dT if task.frames == 0 else (1 - self.alpha) * task.drawTime + self.alpha * dT
+            if task.firstFrame is None:
+                task.firstFrame = t0
+            task.frames += 1
+            # drop the missed frames instead of running them back to back
+            task.nextDue = max(task.nextDue + task.period, t1)
+        self.frames += 1
+        if used > self.frameBudget:
+            self.overBudget += 1
+        if len(self.tasks) == 0:
+            return self.minPeriod
+        return min(task.nextDue for task in self.tasks) - time.perf_counter()
+
+    def _tick(self):
+        wait = self.runFrame()
+        self._afterId = self.root.after(int(max(wait, self.minPeriod) * 1000), self._tick)
+
+    def getStats(self):
+        """
+        Returns the measured fps, the average draw time and the skipped frames of each task
+        :return: dict with one entry per task name
+        :rtype: dict
+        """
+        now = time.perf_counter()
+        stats = {}
+        for task in self.tasks:
+            if task.firstFrame is None or now <= task.firstFrame:
+                fps = 0.0
+            else:
+                fps = task.frames / (now - task.firstFrame)
+            stats[task.name] = {'fps': fps, 'targetFps': task.fps, 'priority': task.priority,
+                                'drawTime': task.drawTime, 'frames': task.frames, 'skipped': task.skipped}
+        return stats
+
+
 class InputsMatrix(tk.Frame):
     def __init__(self, parent, defaultVals, inputWidth, parseFN=int, **kwargs):
         """
@@ -947,3 +2309,576 @@ class InputsMatrix(tk.Frame):
                     self.values.loc[j, i] = self.parseFN(0)
                 c += 1
         return self.values
+
+
+class RateEstimator(object):
+    def __init__(self, window=256, alpha=0.05):
+        """
+        Estimates the sample rate of a stream from the timestamps of the appended batches. The rate is the number of
+        samples received over the time spanned by the last window samples. Until there are two batches, an EWMA of the
+        rate of each batch is used. Jitter is averaged over the window and dropped samples lower the rate instead of
+        making it jump
+        :param window: number of samples used for the windowed count
+        :type window: int
+        :param alpha: weight of the last batch in the EWMA
+        :type alpha: float
+        """
+        self.window = window
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self._batches = collections.deque()
+        self._count = 0
+        self._lastT = None
+        self.ewma = 0.0
+        self.rate = 0.0
+
+    def update(self, tLast, n, tFirst=None):
+        """
+        Adds a batch
+        :param tLast: timestamp of the last sample of the batch
+        :type tLast: float
+        :param n: number of samples of the batch
+        :type n: int
+        :param tFirst: timestamp of the first sample of the batch, used for the first estimate
+        :type tFirst: float
+        :return: the rate in samples per time unit
+        :rtype: float
+        """
+        tLast = float(tLast)
+        if self._lastT is not None:
+            if tLast < self._lastT or tLast != tLast:
+                # the clock of the source restarted
+                self.reset()
+            elif tLast > self._lastT:
+                inst = n / (tLast - self._lastT)
+                self.ewma = inst if self.ewma == 0 else (1 - self.alpha) * self.ewma + self.alpha * inst
+        if self._lastT is None and tFirst is not None and n > 1 and tLast > tFirst:
+            self.ewma = (n - 1) / (tLast - float(tFirst))
+        self._lastT = tLast
+        self._batches.append((tLast, n))
+        self._count += n
+        b = self._batches
+        # keep the shortest tail of batches with at least window samples after the first one
+        while len(b) > 2 and self._count - b[0][1] - b[1][1] >= self.window:
+            self._count -= b.popleft()[1]
+        span = tLast - b[0][0]
+        if span > 0:
+            self.rate = (self._count - b[0][1]) / span
+        else:
+            self.rate = self.ewma
+        return self.rate
+
+
+def preprocessFunctions(preprocess):
+    """
+    Pairs the columns and the functions of a preprocess argument
+    :param preprocess: [column names, functions], one function per column or a single function for all the columns
+    :type preprocess: list
+    :return: function of each column
+    :rtype: dict
+    """
+    names, functions = preprocess
+    if len(functions) == 1:
+        functions = list(functions) * len(names)
+    if len(functions) != len(names):
+        raise ValueError('preprocess has %d columns and %d functions' % (len(names), len(functions)))
+    return dict(zip(names, functions))
+
+
+def dataVersion(source):
+    """
+    Returns a token that changes when the data source is written. Panels compare it with the token of the last render
+    to skip redraws when no new samples arrived
+    :param source: RingBuffer, DataFrame or list (of lists) with the values
+    :type source: RingBuffer, pandas.DataFrame, list
+    :rtype: hashable
+    """
+    if isinstance(source, RingBuffer):
+        return id(source), source.seq
+    if isinstance(source, pandas.DataFrame):
+        if source.shape[0] == 0:
+            return id(source), 0, None
+        return id(source), source.shape[0], source.index[-1]
+    if isinstance(source, np.ndarray):
+        return id(source), source.shape[0], source[-1:].tobytes()
+    if isinstance(source, (list, tuple)):
+        if len(source) > 0 and isinstance(source[0], (list, tuple, np.ndarray, RingBuffer, pandas.DataFrame)):
+            return tuple(dataVersion(x) for x in source)
+        if len(source) == 0:
+            return id(source), 0, None
+        last = source[-1]
+        if isinstance(last, np.ndarray):
+            last = last.tobytes()
+        return id(source), len(source), last
+    return id(source), len(source)
+
+
+class RingBuffer(object):
+    def __init__(self, names, capacity, dtypes=np.float64, timeDtype=np.float64, buffer=None):
+        """
+        Fixed capacity signal store. All the columns share one time column, appending never allocates and any window
+        of up to capacity samples is returned as a contiguous view of the store.
+        Every sample is written twice (at i and i + capacity), so the last n samples are always a single slice.
+        Next to the timestamp of the device, every sample keeps the host time (time.monotonic) when it was received,
+        see stamps()
+        :param names: Name of each column
+        :type names: list
+        :param capacity: Max number of samples kept in the store
+        :type capacity: int
+        :param dtypes: dtype of the columns. Either one dtype for all the columns or a list with len(names) dtypes
+        :type dtypes: np.dtype, list
+        :param timeDtype: dtype of the time column
+        :type timeDtype: np.dtype
+        :param buffer: Memory to use for the store, it has to be at least RingBuffer.nbytes(...) long. If None the
+        memory is allocated by the object
+        :type buffer: buffer
+        """
+        self.names = list(names)
+        self.capacity = int(capacity)
+        if self.capacity < 1:
+            raise ValueError('capacity has to be at least 1, received: %d' % self.capacity)
+        self.dtypes = self._columnDtypes(self.names, dtypes)
+        self.timeDtype = np.dtype(timeDtype)
+        layout, size = self._layout(self.names, self.capacity, self.dtypes, self.timeDtype)
+        if buffer is None:
+            buffer = np.zeros(size, dtype=np.uint8)
+        self._buffer = buffer
+        # state holds the total number of samples written, the write sequence, the sample rate (as float64) and the
+        # total that will be reached when the write in progress ends. Readers use the last one to validate snapshots
+        self._state = np.frombuffer(buffer, dtype=np.int64, count=layout['state'][1], offset=layout['state'][0])
+        self._fstate = self._state.view(np.float64)
+        self.rateEstimator = RateEstimator()
+        self._t = np.frombuffer(buffer, dtype=self.timeDtype, count=2 * self.capacity, offset=layout['time'])
+        self._stamp = np.frombuffer(buffer, dtype=np.float64, count=2 * self.capacity, offset=layout['stamp'])
+        # columns with the same dtype share a block of shape (nColumns, 2 * capacity)
+        self._groups = []
+        self._columns = {}
+        for dt, (offset, idx) in layout['groups'].items():
+            block = np.frombuffer(buffer, dtype=dt, count=len(idx) * 2 * self.capacity,
+                                  offset=offset).reshape(len(idx), 2 * self.capacity)
+            self._groups.append((block, idx))
+            for row, i in enumerate(idx):
+                self._columns[self.names[i]] = block[row]
+        self._singleGroup = len(self._groups) == 1
+
+    @staticmethod
+    def _columnDtypes(names, dtypes):
+        if isinstance(dtypes, (list, tuple)):
+            if len(dtypes) != len(names):
+                raise ValueError('dtypes should be 1 or equal to the number of names')
+            return [np.dtype(d) for d in dtypes]
+        return [np.dtype(dtypes)] * len(names)
+
+    @staticmethod
+    def _layout(names, capacity, dtypes, timeDtype):
+        """
+        Computes where each array lives inside the memory of the store, every array is aligned to 8 bytes
+        """
+        align = lambda x: (x + 7) // 8 * 8
+        layout = {'state': (0, 4)}
+        offset = 4 * 8
+        layout['time'] = offset
+        offset = align(offset + 2 * capacity * timeDtype.itemsize)
+        layout['stamp'] = offset
+        offset += 2 * capacity * 8
+        groups = {}
+        for i, dt in enumerate(dtypes):
+            groups.setdefault(dt, []).append(i)
+        layout['groups'] = {}
+        for dt, idx in groups.items():
+            layout['groups'][dt] = (offset, idx)
+            offset = align(offset + len(idx) * 2 * capacity * dt.itemsize)
+        return layout, offset
+
+    @classmethod
+    def nbytes(cls, names, capacity, dtypes=np.float64, timeDtype=np.float64):
+        """
+        Size in bytes of the memory needed by a store
+        """
+        return cls._layout(list(names), int(capacity), cls._columnDtypes(names, dtypes), np.dtype(timeDtype))[1]
+
+    @property
+    def total(self):
+        """
+        Total number of samples appended since the last clear
+        """
+        return int(self._state[0])
+
+    @property
+    def seq(self):
+        """
+        Write sequence number, it increases on every append, extend or clear. Readers compare it with the last value
+        they saw to know if the store changed
+        """
+        return int(self._state[1])
+
+    @property
+    def rate(self):
+        """
+        Sample rate in samples per time unit of the timestamps, 0 if it is not known yet. It is estimated by the
+        writer on every append and extend, readers of a shared store see the same value
+        """
+        return float(self._fstate[2])
+
+    def __len__(self):
+        return min(int(self._state[0]), self.capacity)
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def append(self, t, values, stamp=None):
+        """
+        Appends one sample
+        :param t: timestamp of the sample
+        :type t: float
+        :param values: values of the sample in the same order as names
+        :type values: iter
+        :param stamp: host time (time.monotonic) when the sample was received, e.g. PacketBatch.stamp. If None, the
+        time of the append is used
+        :type stamp: float
+        """
+        if stamp is None:
+            stamp = time.monotonic()
+        total = int(self._state[0])
+        self._state[3] = total + 1
+        p = total % self.capacity
+        p2 = p + self.capacity
+        self._t[p] = t
+        self._t[p2] = t
+        self._stamp[p] = stamp
+        self._stamp[p2] = stamp
+        if self._singleGroup:
+            block = self._groups[0][0]
+            block[:, p] = values
+            block[:, p2] = values
+        else:
+            for block, idx in self._groups:
+                v = [values[i] for i in idx]
+                block[:, p] = v
+                block[:, p2] = v
+        self._state[0] = total + 1
+        self._state[1] += 1
+        self._fstate[2] = self.rateEstimator.update(t, 1)
+
+    def extend(self, t, values, stamp=None):
+        """
+        Appends a batch of samples
+        :param t: timestamps of the samples
+        :type t: np.ndarray
+        :param values: Either an array of shape (len(t), len(names)) or a dict with one array per column
+        :type values: np.ndarray, dict
+        :param stamp: host time (time.monotonic) when the samples were received, one value for the batch (e.g.
+        PacketBatch.stamp) or one per sample. If None, the time of the extend is used
+        :type stamp: float, np.ndarray
+        """
+        t = np.asarray(t)
+        m = t.shape[0]
+        if m == 0:
+            return
+        if stamp is None:
+            stamp = time.monotonic()
+        stamp = np.broadcast_to(np.asarray(stamp, dtype=np.float64), (m,))
+        if isinstance(values, dict):
+            getCol = lambda i: values[self.names[i]]
+        else:
+            values = np.asarray(values)
+            getCol = lambda i: values[:, i]
+        start = 0
+        if m > self.capacity:
+            # only the newest samples fit
+            start = m - self.capacity
+        total = int(self._state[0])
+        self._state[3] = total + m
+        p = (total + start) % self.capacity
+        n = m - start
+        first = min(n, self.capacity - p)
+        segments = [(p, start, start + first), (0, start + first, m)]
+        for dst, a, b in segments:
+            if b <= a:
+                continue
+            for arr in (self._t[dst:dst + b - a], self._t[dst + self.capacity:dst + self.capacity + b - a]):
+                arr[:] = t[a:b]
+            for arr in (self._stamp[dst:dst + b - a], self._stamp[dst + self.capacity:dst + self.capacity + b - a]):
+                arr[:] = stamp[a:b]
+            for block, idx in self._groups:
+                for row, i in enumerate(idx):
+                    col = getCol(i)[a:b]
+                    block[row, dst:dst + b - a] = col
+                    block[row, dst + self.capacity:dst + self.capacity + b - a] = col
+        self._state[0] = total + m
+        self._state[1] += 1
+        self._fstate[2] = self.rateEstimator.update(t[-1], m, t[0])
+
+    def _slice(self, n):
+        size = len(self)
+        if n is None or n > size:
+            n = size
+        end = int(self._state[0]) % self.capacity + self.capacity
+        return slice(end - max(int(n), 0), end)
+
+    def _isIntact(self, current, n):
+        """
+        Checks that the last n samples before current were not overwritten by a write that started after current was
+        read. The writer is never blocked, readers retry instead
+        """
+        reserved = int(self._state[3])
+        return current <= reserved and reserved - current + n <= self.capacity
+
+    def _consistentRead(self, getN, names, copy, maxRetries, withStamps=False):
+        if names is None:
+            names = self.names
+        for k in range(maxRetries):
+            current = int(self._state[0])
+            n = getN(current)
+            end = current % self.capacity + self.capacity
+            s = slice(end - n, end)
+            if copy:
+                t = self._t[s].copy()
+                cols = {na: self._columns[na][s].copy() for na in names}
+                stamp = self._stamp[s].copy() if withStamps else None
+            else:
+                t = self._t[s]
+                cols = {na: self._columns[na][s] for na in names}
+                stamp = self._stamp[s] if withStamps else None
+            if not copy or self._isIntact(current, n):
+                if withStamps:
+                    return t, cols, current, stamp
+                return t, cols, current
+            # let the writer finish
+            time.sleep(0)
+        raise RuntimeError('Could not read a consistent snapshot after %d tries, the writer laps the reader' %
+                           maxRetries)
+
+    def snapshot(self, n=None, names=None, maxRetries=100):
+        """
+        Copies the last n samples. The copy is consistent even if another thread or process appends at the same time:
+        the writer publishes the end of every write before starting it and the copy is retried if that write reached
+        the window. Only the window is copied and the writer is never blocked
+        :param n: number of samples, if None all the samples in the store are returned
+        :type n: int
+        :param names: columns to return, if None all the columns are returned
+        :type names: list
+        :param maxRetries: max number of copies before giving up
+        :type maxRetries: int
+        :return: timestamps and a dict with the values of each column
+        :rtype: tuple
+        """
+        def getN(current):
+            size = min(current, self.capacity)
+            if n is None or n > size:
+                return size
+            return max(int(n), 0)
+
+        t, cols, _ = self._consistentRead(getN, names, True, maxRetries)
+        return t, cols
+
+    def since(self, total, names=None, copy=False, maxRetries=100, withStamps=False):
+        """
+        Returns the samples appended after the first total samples. If more than capacity samples were appended, only
+        the ones still in the store are returned. If the store was cleared (total > self.total), all the samples are
+        returned
+        :param total: value of self.total at the last read, None returns all the samples
+        :type total: int
+        :param names: columns to return, if None all the columns are returned
+        :type names: list
+        :param copy: If True, a consistent copy is returned (see snapshot), else views of the store
+        :type copy: bool
+        :param maxRetries: max number of copies before giving up
+        :type maxRetries: int
+        :param withStamps: If True, the host receive times of the samples (see stamps) are read with them and returned
+        last
+        :type withStamps: bool
+        :return: timestamps, a dict with the values of each column and the current total, to use in the next call
+        :rtype: tuple
+        """
+        def getN(current):
+            start = 0 if total is None or total > current else total
+            return min(current - start, self.capacity, current)
+
+        return self._consistentRead(getN, names, copy, maxRetries, withStamps)
+
+    def timestamps(self, n=None):
+        """
+        Returns a view with the last n timestamps
+        :param n: number of samples, if None all the samples in the store are returned
+        :type n: int
+        :rtype: np.ndarray
+        """
+        return self._t[self._slice(n)]
+
+    def stamps(self, n=None, end=None):
+        """
+        Returns a view with the host times (time.monotonic) when the last n samples were received
+        :param n: number of samples, if None all the samples in the store are returned
+        :type n: int
+        :param end: total of the store after the last sample to return, e.g. the total returned by since. If None,
+        the newest samples are returned
+        :type end: int
+        :rtype: np.ndarray
+        """
+        if end is None:
+            return self._stamp[self._slice(n)]
+        size = min(end, self.capacity)
+        if n is None or n > size:
+            n = size
+        e = end % self.capacity + self.capacity
+        return self._stamp[e - max(int(n), 0):e]
+
+    def column(self, name, n=None):
+        """
+        Returns a view with the last n values of a column
+        :param name: name of the column
+        :type name: str
+        :param n: number of samples, if None all the samples in the store are returned
+        :type n: int
+        :rtype: np.ndarray
+        """
+        return self._columns[name][self._slice(n)]
+
+    def window(self, n=None, names=None):
+        """
+        Returns views of the last n samples
+        :param n: number of samples, if None all the samples in the store are returned
+        :type n: int
+        :param names: columns to return, if None all the columns are returned
+        :type names: list
+        :return: timestamps and a dict with the values of each column
+        :rtype: tuple
+        """
+        s = self._slice(n)
+        if names is None:
+            names = self.names
+        return self._t[s], {na: self._columns[na][s] for na in names}
+
+    def clear(self):
+        """
+        Removes all the samples of the store
+        """
+        self._state[3] = 0
+        self._state[0] = 0
+        self._state[1] += 1
+        self.rateEstimator.reset()
+        self._fstate[2] = 0.0
+
+    def toDataFrame(self, n=None):
+        """
+        Copies the last n samples into a DataFrame indexed by time
+        :rtype: pandas.DataFrame
+        """
+        t, cols = self.snapshot(n)
+        return pandas.DataFrame(cols, index=t, columns=self.names)
+
+
+class DerivedRingBuffer(RingBuffer):
+    def __init__(self, source, functions):
+        """
+        RingBuffer that follows another store and keeps a processed copy of it. update() reads only the samples that
+        arrived since the last call and applies the functions to them, so each sample is processed once
+        :param source: store to follow
+        :type source: RingBuffer
+        :param functions: dict with the function applied to each column. The functions receive and return numpy arrays
+        :type functions: dict
+        """
+        dtypes = [np.dtype(np.float64) if na in functions else dt for na, dt in zip(source.names, source.dtypes)]
+        super(DerivedRingBuffer, self).__init__(source.names, source.capacity, dtypes, source.timeDtype)
+        self.source = source
+        self.functions = dict(functions)
+        self._sourceTotal = None
+
+    def update(self, functions=None):
+        """
+        Processes the new samples of the source
+        :param functions: replaces the functions of the columns in the dict, used for the new samples only
+        :type functions: dict
+        :return: number of processed samples
+        :rtype: int
+        """
+        if functions is not None:
+            self.functions.update(functions)
+        if self._sourceTotal is not None and self.source.total < self._sourceTotal:
+            # the source was cleared
+            self.clear()
+            self._sourceTotal = None
+        # the receive times are copied in the same consistent read as the samples
+        t, cols, self._sourceTotal, stamp = self.source.since(self._sourceTotal, copy=True, withStamps=True)
+        if t.shape[0] == 0:
+            return 0
+        for na, fn in self.functions.items():
+            if na in cols:
+                cols[na] = fn(cols[na])
+        self.extend(t, cols, stamp)
+        return t.shape[0]
+
+
+class SharedRingBuffer(RingBuffer):
+    def __init__(self, names, capacity, dtypes=np.float64, timeDtype=np.float64, name=None, create=True):
+        """
+        RingBuffer stored in multiprocessing shared memory. One process appends while others read windows without
+        copies. The object can be sent to other processes, the copy attaches to the same memory
+        :param names: Name of each column
+        :type names: list
+        :param capacity: Max number of samples kept in the store
+        :type capacity: int
+        :param dtypes: dtype of the columns. Either one dtype for all the columns or a list with len(names) dtypes
+        :type dtypes: np.dtype, list
+        :param timeDtype: dtype of the time column
+        :type timeDtype: np.dtype
+        :param name: name of the shared memory block. If None, a unique name is generated
+        :type name: str
+        :param create: If True, the shared memory block is created, else an existing block is attached
+        :type create: bool
+        """
+        size = RingBuffer.nbytes(names, capacity, dtypes, timeDtype)
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                # track was added in python 3.13
+                self.shm = shared_memory.SharedMemory(name=name)
+        self._owner = create
+        super(SharedRingBuffer, self).__init__(names, capacity, dtypes=dtypes, timeDtype=timeDtype,
+                                               buffer=self.shm.buf)
+
+    def spec(self):
+        """
+        Arguments needed to attach to this store from another process
+        :rtype: dict
+        """
+        return {'names': self.names, 'capacity': self.capacity, 'dtypes': [d.str for d in self.dtypes],
+                'timeDtype': self.timeDtype.str, 'name': self.shm.name}
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        Attaches to a store created by another process
+        :param spec: output of spec()
+        :type spec: dict
+        :rtype: SharedRingBuffer
+        """
+        return cls(spec['names'], spec['capacity'], dtypes=spec['dtypes'], timeDtype=spec['timeDtype'],
+                   name=spec['name'], create=False)
+
+    def __reduce__(self):
+        return SharedRingBuffer.attach, (self.spec(),)
+
+    def close(self):
+        """
+        Releases the shared memory in this process. The views returned before are not valid anymore
+        """
+        self._state = self._fstate = self._t = self._stamp = None
+        self._groups = []
+        self._columns = {}
+        self._buffer = None
+        self.shm.close()
+
+    def unlink(self):
+        """
+        Closes and destroys the shared memory block, only the creator should call it
+        """
+        self.close()
+        if self._owner:
+            self.shm.unlink()
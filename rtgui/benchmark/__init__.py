@@ -0,0 +1,473 @@
+import json
+import os
+import platform
+import socket
+import threading
+import time
+import warnings
+
+import matplotlib
+import numpy as np
+import serial
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import rtgui as guT
+import rtgui.communication as tu
+
+DEEPSOLE_FMT = '<3c I 13h 4c'
+DEEPSOLE_NAMES = ['pToe', 'pBall', 'pHeel', 'ax', 'ay', 'az', 'gx', 'gy', 'gz', 'EUy', 'EUz', 'EUx']
+DEEPSOLE_FIELDS = ['o1', 'o2', 'o3', 'timestamp'] + DEEPSOLE_NAMES + ['sync', 'side', 'c1', 'c2', 'c3']
+DEEPSOLE_HEADER = bytes([0x1, 0x2, 0x3])
+DEEPSOLE_FOOTER = bytes([0xA, 0xB, 0xC])
+
+
+def wrapAngles(x):
+    """
+    Preprocess of the Euler angles used by the DeepSole example, the raw values are scaled to radians and wrapped to
+    [-pi, pi)
+    :param x: raw angle values
+    :type x: np.ndarray
+    :rtype: np.ndarray
+    """
+    return (x / 8000 + np.pi) % (2 * np.pi) - np.pi
+
+
+DEEPSOLE_PREPROCESS = [['EUy', 'EUz', 'EUx'], [wrapAngles]]
+
+
+def makeDeepSolePackets(n, side=b'r', t0=0, dtMs=1.0, rng=None):
+    """
+    Creates n DeepSole packets with random signals
+    :param n: number of packets
+    :type n: int
+    :param side: b'l' or b'r'
+    :type side: bytes
+    :param t0: timestamp (ms) of the first packet
+    :type t0: float
+    :param dtMs: time between packets in ms
+    :type dtMs: float
+    :param rng: random generator
+    :type rng: np.random.Generator
+    :return: structured array with the packets, use tobytes() to send them
+    :rtype: np.ndarray
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    packets = np.zeros(n, dtype=tu.structDtype(DEEPSOLE_FMT, DEEPSOLE_FIELDS))
+    for na, b in zip(['o1', 'o2', 'o3'], DEEPSOLE_HEADER):
+        packets[na] = bytes([b])
+    for na, b in zip(['c1', 'c2', 'c3'], DEEPSOLE_FOOTER):
+        packets[na] = bytes([b])
+    packets['timestamp'] = (t0 + dtMs * np.arange(n)).astype(np.uint32)
+    for na in DEEPSOLE_NAMES:
+        packets[na] = rng.integers(-8000, 8000, n)
+    packets['sync'] = 0
+    packets['side'] = side
+    return packets
+
+
+class _NullConsole(object):
+    def __init__(self):
+        """
+        Console used by the receivers, it only counts the messages
+        """
+        self.messages = 0
+
+    def append(self, text, clear_console=False):
+        self.messages += 1
+
+    def set(self, text):
+        self.messages += 1
+
+
+class SyntheticDevice(object):
+    def __init__(self, rate=1000.0, transport='udp', port=None, side=b'r', chunk=1, seed=None):
+        """
+        Local device that emits DeepSole packets at a fixed rate on a thread
+        :param rate: packets per second
+        :type rate: float
+        :param transport: 'udp' sends datagrams to 127.0.0.1:port, 'pty' writes the frames to a pseudo terminal
+        :type transport: str
+        :param port: UDP port, if None a free port is used
+        :type port: int
+        :param side: b'l' or b'r'
+        :type side: bytes
+        :param chunk: packets written at once on the pty
+        :type chunk: int
+        :param seed: seed of the random signals
+        :type seed: int
+        """
+        if transport not in ['udp', 'pty']:
+            raise ValueError('transport should be udp or pty, received: %s' % transport)
+        self.rate = float(rate)
+        self.transport = transport
+        self.side = side
+        self.chunk = chunk
+        self.sent = 0
+        self.cpuTime = 0.0
+        self._rng = np.random.default_rng(seed)
+        self._thread = None
+        self._running = threading.Event()
+        self._master = None
+        self.ptyName = None
+        self._sock = None
+        if transport == 'udp':
+            if port is None:
+                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                s.bind(('127.0.0.1', 0))
+                port = s.getsockname()[1]
+                s.close()
+            self.port = port
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self.port = None
+            self._master, slave = os.openpty()
+            self.ptyName = os.ttyname(slave)
+            self._slave = slave
+
+    def openSerial(self):
+        """
+        Opens the device side of the pty as a serial port
+        :rtype: serial.Serial
+        """
+        return serial.Serial(self.ptyName, timeout=0.1)
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def close(self):
+        self.stop()
+        if self._sock is not None:
+            self._sock.close()
+        if self._master is not None:
+            os.close(self._master)
+            os.close(self._slave)
+            self._master = None
+
+    def _run(self):
+        dtMs = 1000.0 / self.rate
+        # one second of packets is generated at a time and then sent
+        block = makeDeepSolePackets(max(int(self.rate), 1), self.side, 0, dtMs, self._rng)
+        raw = block.tobytes()
+        size = block.dtype.itemsize
+        tStamps = 0.0
+        pos = block.shape[0]
+        start = time.perf_counter()
+        cpu0 = time.thread_time()
+        while self._running.is_set():
+            due = int((time.perf_counter() - start) * self.rate) - self.sent
+            while due > 0:
+                if pos >= block.shape[0]:
+                    block['timestamp'] = (tStamps + dtMs * np.arange(block.shape[0])).astype(np.uint32)
+                    tStamps += dtMs * block.shape[0]
+                    raw = block.tobytes()
+                    pos = 0
+                n = min(due, block.shape[0] - pos, self.chunk if self.transport == 'pty' else due)
+                if self.transport == 'udp':
+                    for k in range(pos, pos + n):
+                        self._sock.sendto(raw[k * size:(k + 1) * size], ('127.0.0.1', self.port))
+                else:
+                    os.write(self._master, raw[pos * size:(pos + n) * size])
+                pos += n
+                due -= n
+                self.sent += n
+            time.sleep(0.001)
+        self.cpuTime = time.thread_time() - cpu0
+
+
+class _StoreSink(object):
+    def __init__(self, store):
+        """
+        Decodes DeepSole batches into a store and measures the parse time
+        :param store: store for the decoded samples
+        :type store: RingBuffer
+        """
+        self.store = store
+        self.decoder = tu.StructDecoder(DEEPSOLE_FMT, DEEPSOLE_FIELDS, header=DEEPSOLE_HEADER,
+                                        footer=DEEPSOLE_FOOTER)
+        self.packets = 0
+        self.batches = 0
+        self.parseCpu = 0.0
+        self.threadCpu0 = None
+        self.threadCpu = 0.0
+
+    def __call__(self, batch):
+        t0 = time.thread_time()
+        if self.threadCpu0 is None:
+            self.threadCpu0 = t0
+        records, _ = self.decoder.splitBatch(batch)
+        if records.size > 0:
+            self.store.extend(records['timestamp'], {na: records[na] for na in self.store.names}, batch.stamp)
+        self.packets += records.size
+        self.batches += 1
+        t1 = time.thread_time()
+        self.parseCpu += t1 - t0
+        # cpu of the receive thread, includes the parse time
+        self.threadCpu = t1 - self.threadCpu0
+
+
+class _Value(object):
+    def __init__(self, value):
+        self.value = value
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _AllChecked(object):
+    def __init__(self, n):
+        self.n = n
+
+    def getAllValues(self):
+        return [1] * self.n
+
+
+class HeadlessPlotPanel(guT.PlotPanelPandas):
+    def __init__(self, title, names, store, renderMode='blit', decimation='minmax', figsize=(5, 2),
+                 scaleMode='running', stats=None, latency=None):
+        """
+        PlotPanelPandas without Tk. The plot code is the same, the figure is drawn on an Agg canvas and the checkboxes
+        are always on. Used to measure the frame time without a display. The __init__ of PlotPanel and PlotPanelPandas
+        are not called, they create the widgets. The plot state is set by the same _initPlotState and _initPandasState
+        they use, only the figure, the canvas and the stand-ins of the widgets are created here
+        :param title: title of the panel
+        :type title: str
+        :param names: A list of list containing the name of each signal to plot
+        :type names: list
+        :param store: data source
+        :type store: RingBuffer
+        :param renderMode: 'draw' or 'blit'
+        :type renderMode: str
+        :param decimation: see PlotPanel
+        :type decimation: str
+        :param figsize: Size of the figure
+        :type figsize: tuple
+        :param scaleMode: see PlotPanelPandas
+        :type scaleMode: str
+        :param stats: timers of the plot stages, see PlotPanel
+        :type stats: HotPathStats
+        :param latency: age of the newest sample drawn, see PlotPanel
+        :type latency: LatencyHistogram
+        """
+        # tk.Frame.__init__ is not called, this object is not a widget
+        if renderMode not in ['draw', 'blit']:
+            raise ValueError('renderMode should be draw or blit, received: %s' % renderMode)
+        plotColor = [['C%d' % (j % 10) for j in range(len(n))] for n in names]
+        self._initPlotState(title, names, plotColor, [], store, 500, True, True, renderMode, decimation, None, stats,
+                            False, latency)
+        self._initPandasState(scaleMode, 0, None)
+        self.consoleVar = _Value(title)
+        self.checks = [_AllChecked(len(n)) for n in names]
+        self.f = Figure(figsize=figsize, dpi=100)
+        self.axis = self.f.add_subplot(111)
+        self.canvas = FigureCanvasAgg(self.f)
+        self.canvas.draw()
+        if renderMode == 'blit':
+            self.blitManager = guT.BlitManager(self.canvas)
+            self.plotter = guT.TracePlotter(self.axis, self.blitManager)
+
+
+def _percentile(values, q):
+    if len(values) == 0:
+        return None
+    return float(np.percentile(values, q))
+
+
+def runBenchmark(rate=1000.0, devices=2, transport='udp', duration=5.0, fps=30.0, renderMode='blit',
+                 decimation='minmax', visualizeTime=8.0, backend='thread', plot=True, capacity=None, stats=False,
+                 preprocess=True):
+    """
+    Runs the synthetic devices, the receivers and the plot panels for duration seconds
+    :param rate: packets per second of each device
+    :type rate: float
+    :param devices: number of devices, each one has its own port (or pty), receiver, store and panel
+    :type devices: int
+    :param transport: 'udp' or 'pty'
+    :type transport: str
+    :param duration: length of the run in seconds
+    :type duration: float
+    :param fps: target refresh rate of the panels
+    :type fps: float
+    :param renderMode: 'draw' or 'blit'
+    :type renderMode: str
+    :param decimation: see PlotPanel
+    :type decimation: str
+    :param visualizeTime: seconds shown on the panels
+    :type visualizeTime: float
+    :param backend: receive backend, 'thread' or 'asyncio'
+    :type backend: str
+    :param plot: If False, only the receive path is measured
+    :type plot: bool
+    :param capacity: samples kept per store, if None 2 * visualizeTime seconds
+    :type capacity: int
+    :param stats: If True, the time of each stage of the receivers and the panels is added to the results
+    :type stats: bool
+    :param preprocess: If True, the panels preprocess the Euler angles as the DeepSole example does (see
+    DEEPSOLE_PREPROCESS), so the frame time includes the derived store update
+    :type preprocess: bool
+    :return: results, can be saved with json. If the panels plotted less than half of the expected window,
+    windowTooShort is True and the frame times are not comparable with other runs
+    :rtype: dict
+    """
+    if capacity is None:
+        capacity = int(2 * visualizeTime * rate)
+    console = _NullConsole()
+    config = {'rate': rate, 'devices': devices, 'transport': transport, 'duration': duration, 'fps': fps,
+              'renderMode': renderMode, 'decimation': decimation, 'visualizeTime': visualizeTime, 'backend': backend,
+              'plot': plot, 'capacity': capacity, 'stats': stats, 'preprocess': preprocess}
+    latency = tu.LatencyHistogram()
+    receiveStats = tu.HotPathStats(enabled=stats)
+    plotStats = tu.HotPathStats(enabled=stats)
+    sides = [b'r', b'l']
+    devs, sinks, receivers, panels = [], [], [], []
+    for k in range(devices):
+        dev = SyntheticDevice(rate, transport, side=sides[k % 2], chunk=max(int(rate / 1000), 1), seed=k)
+        store = guT.RingBuffer(DEEPSOLE_NAMES + ['sync'], capacity)
+        sink = _StoreSink(store)
+        if transport == 'udp':
+            rec = tu.UDPreceiveProto(console, dev.port, batchMode=True, rcvBufSize=1 << 20,
+                                     parseBatchFunction=sink, backend=backend, stats=receiveStats)
+            rec.reOpenSocket()
+        else:
+            size = tu.structDtype(DEEPSOLE_FMT).itemsize
+            rec = tu.serialReceive(console, dev.openSerial(), header=DEEPSOLE_HEADER, footer=DEEPSOLE_FOOTER,
+                                   frameSize=size, parseBatchFunction=sink, backend=backend,
+                                   stats=receiveStats)
+        devs.append(dev)
+        sinks.append(sink)
+        receivers.append(rec)
+        if plot:
+            names = [DEEPSOLE_NAMES[3 * j:3 * j + 3] for j in range(4)]
+            panels.append(HeadlessPlotPanel('D%d' % k, names, store, renderMode=renderMode, decimation=decimation,
+                                            stats=plotStats, latency=latency))
+    for rec in receivers:
+        rec.startThread()
+    for dev in devs:
+        dev.start()
+    frameTimes = []
+    plotCpu = 0.0
+    period = 1.0 / fps
+    cpu0 = time.process_time()
+    start = time.perf_counter()
+    nextFrame = start
+    panelPreprocess = DEEPSOLE_PREPROCESS if preprocess else None
+    while time.perf_counter() - start < duration:
+        if plot:
+            c0 = time.thread_time()
+            t0 = time.perf_counter()
+            for panel in panels:
+                # the timestamps of the devices are in ms
+                panel.plotControlFromChecksTime(visualizeTime, extraT=1.0, preprocess=panelPreprocess, t_in_ms=True)
+            frameTimes.append(time.perf_counter() - t0)
+            plotCpu += time.thread_time() - c0
+        nextFrame += period
+        wait = nextFrame - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        else:
+            # late, drop the missed frames
+            nextFrame = time.perf_counter()
+    elapsed = time.perf_counter() - start
+    for dev in devs:
+        dev.stop()
+    # let the receivers drain the sockets
+    time.sleep(0.2)
+    totalCpu = time.process_time() - cpu0
+    for rec in receivers:
+        rec.stopThread()
+    for dev in devs:
+        dev.close()
+    if transport == 'pty':
+        for rec in receivers:
+            rec._serial.close()
+    sent = sum(dev.sent for dev in devs)
+    received = sum(sink.packets for sink in sinks)
+    parseCpu = sum(sink.parseCpu for sink in sinks)
+    receiveCpu = sum(sink.threadCpu for sink in sinks) - parseCpu
+    frameTimes = np.array(frameTimes)
+    results = {
+        'config': config,
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                        'matplotlib': matplotlib.__version__, 'platform': platform.platform()},
+        'elapsed': elapsed,
+        'packetsSent': sent,
+        'packetsReceived': received,
+        'packetsPerSec': received / elapsed,
+        'dropRate': (sent - received) / sent if sent > 0 else 0.0,
+        'batches': sum(sink.batches for sink in sinks),
+        'frames': int(frameTimes.size),
+        'fps': frameTimes.size / elapsed,
+        'frameTime': {'p50': _percentile(frameTimes, 50), 'p99': _percentile(frameTimes, 99),
+                      'mean': float(frameTimes.mean()) if frameTimes.size > 0 else None,
+                      'max': float(frameTimes.max()) if frameTimes.size > 0 else None},
+        'cpu': {'device': sum(dev.cpuTime for dev in devs), 'receive': receiveCpu, 'parse': parseCpu,
+                'plot': plotCpu, 'total': totalCpu},
+    }
+    if plot:
+        results['latency'] = latency.getStats()
+        # samples on screen, a short window means the panels did not plot visualizeTime seconds
+        results['windowSamples'] = [int(visualizeTime * panel.dt) for panel in panels]
+        results['windowTooShort'] = min(results['windowSamples']) < 0.5 * visualizeTime * rate
+        if results['windowTooShort']:
+            warnings.warn('The panels plotted %d samples, expected about %d' %
+                          (min(results['windowSamples']), visualizeTime * rate))
+    if stats:
+        results['stages'] = {'receive': receiveStats.getStats(), 'plot': plotStats.getStats()}
+    return results
+
+
+def saveResults(results, fileN):
+    """
+    Saves a list of results as JSON
+    :param results: output of runBenchmark, or a list of them
+    :type results: dict, list
+    :param fileN: path of the file
+    :type fileN: str
+    """
+    if isinstance(results, dict):
+        results = [results]
+    with open(fileN, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def loadResults(fileN):
+    with open(fileN, 'r') as f:
+        return json.load(f)
+
+
+def compareResults(old, new):
+    """
+    Compares two runs with the same config
+    :param old: results of the reference version
+    :type old: dict
+    :param new: results of the version to check
+    :type new: dict
+    :return: for each metric, the old value, the new value and the relative change
+    :rtype: dict
+    """
+    metrics = {'packetsPerSec': lambda r: r['packetsPerSec'],
+               'dropRate': lambda r: r['dropRate'],
+               'frameTimeP50': lambda r: r['frameTime']['p50'],
+               'frameTimeP99': lambda r: r['frameTime']['p99'],
+               'latencyP50': lambda r: r.get('latency', {}).get('p50'),
+               'latencyP99': lambda r: r.get('latency', {}).get('p99'),
+               'cpuTotal': lambda r: r['cpu']['total']}
+    out = {}
+    for na, fn in metrics.items():
+        a, b = fn(old), fn(new)
+        change = None
+        if a is not None and b is not None and a != 0:
+            change = (b - a) / abs(a)
+        out[na] = {'old': a, 'new': b, 'change': change}
+    return out
@@ -0,0 +1,65 @@
+import argparse
+import json
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+from rtgui.benchmark import runBenchmark, saveResults, loadResults, compareResults
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m rtgui.benchmark',
+                                     description='Headless benchmark of the receive and plot path with synthetic '
+                                                 'DeepSole devices')
+    parser.add_argument('--rate', type=float, nargs='+', default=[1000.0], help='packets per second of each device')
+    parser.add_argument('--devices', type=int, nargs='+', default=[2], help='number of devices')
+    parser.add_argument('--transport', choices=['udp', 'pty'], default='udp')
+    parser.add_argument('--backend', choices=['thread', 'asyncio'], default='thread')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per run')
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--render', choices=['draw', 'blit'], default='blit')
+    parser.add_argument('--decimation', choices=['minmax', 'lttb', 'none'], default='minmax')
+    parser.add_argument('--window', type=float, default=8.0, help='seconds shown on the panels')
+    parser.add_argument('--no-plot', action='store_true', help='only measure the receive path')
+    parser.add_argument('--stats', action='store_true', help='time each stage of the receive and plot paths')
+    parser.add_argument('--no-preprocess', action='store_true', help='plot the raw Euler angles')
+    parser.add_argument('--out', default=None, help='JSON file for the results')
+    parser.add_argument('--compare', default=None, help='JSON file of a previous run to compare with')
+    args = parser.parse_args()
+
+    results = []
+    for devices in args.devices:
+        for rate in args.rate:
+            r = runBenchmark(rate=rate, devices=devices, transport=args.transport, duration=args.duration,
+                             fps=args.fps, renderMode=args.render,
+                             decimation=None if args.decimation == 'none' else args.decimation,
+                             visualizeTime=args.window, backend=args.backend, plot=not args.no_plot,
+                             stats=args.stats, preprocess=not args.no_preprocess)
+            results.append(r)
+            ft = r['frameTime']
+            print('devices: %d rate: %.0f -> %.0f packets/s, drop: %.2f%%, frame p50: %s ms p99: %s ms, fps: %.1f'
+                  % (devices, rate, r['packetsPerSec'], 100 * r['dropRate'],
+                     '%.2f' % (1000 * ft['p50']) if ft['p50'] is not None else '-',
+                     '%.2f' % (1000 * ft['p99']) if ft['p99'] is not None else '-', r['fps']))
+            if r.get('windowTooShort'):
+                print('    the panels plotted a short window (%s samples), the frame times are not comparable'
+                      % r['windowSamples'])
+            lat = r.get('latency')
+            if lat is not None and lat['count'] > 0:
+                print('    latency: p50 %.2f ms, p99 %.2f ms, max %.2f ms' % (1000 * lat['p50'], 1000 * lat['p99'],
+                                                                          1000 * lat['max']))
+            print('    cpu (s): ' + ', '.join('%s %.3f' % (k, v) for k, v in r['cpu'].items()))
+            for path, st in r.get('stages', {}).items():
+                print('    %s: ' % path + ', '.join('%s %.3fms' % (k, 1000 * v['mean'])
+                                                    for k, v in st['stages'].items()))
+    if args.out is not None:
+        saveResults(results, args.out)
+    if args.compare is not None:
+        old = loadResults(args.compare)
+        for a, b in zip(old, results):
+            print(json.dumps(compareResults(a, b), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,10 @@
+import asyncio
+import collections
+import json
+import math
+import multiprocessing
+import re
+import selectors
 import socket
 import select
 import queue
@@ -6,6 +13,7 @@ import time
 import struct
 import warnings
 
+import numpy as np
 import serial
 
 
@@ -35,16 +43,1034 @@ class UDPsend(object):
                                   socket.SOCK_DGRAM)  # UDP
 
 
+class PacketBatch(object):
+    def __init__(self, bufferSize=262144, maxPackets=256):
+        """
+        Group of packets stored one after the other in a preallocated buffer. The buffer is reused on every receive,
+        so packets are only valid until the next receive, use copy() to keep them. stamp is the host time
+        (time.monotonic) when the first packet of the batch was read from the socket or port
+        :param bufferSize: size in bytes of the buffer
+        :type bufferSize: int
+        :param maxPackets: max number of packets in the batch
+        :type maxPackets: int
+        """
+        self.buffer = bytearray(bufferSize)
+        self.maxPackets = maxPackets
+        self._view = memoryview(self.buffer)
+        self.offsets = []
+        self.sizes = []
+        self.nbytes = 0
+        self.stamp = None
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __iter__(self):
+        for o, n in zip(self.offsets, self.sizes):
+            yield self._view[o:o + n]
+
+    def __getitem__(self, item):
+        return self._view[self.offsets[item]:self.offsets[item] + self.sizes[item]]
+
+    @property
+    def data(self):
+        """
+        memoryview with all the packets of the batch
+        """
+        return self._view[:self.nbytes]
+
+    @property
+    def free(self):
+        """
+        Number of bytes available in the buffer
+        """
+        return len(self.buffer) - self.nbytes
+
+    def isFull(self, packetSize=0):
+        return len(self.sizes) >= self.maxPackets or self.free < packetSize
+
+    def writable(self):
+        """
+        memoryview of the free part of the buffer
+        """
+        return self._view[self.nbytes:]
+
+    def commit(self, n):
+        """
+        Adds a packet of n bytes that was written at the start of writable()
+        """
+        if not self.sizes:
+            self.stamp = time.monotonic()
+        self.offsets.append(self.nbytes)
+        self.sizes.append(n)
+        self.nbytes += n
+
+    def add(self, packet):
+        """
+        Copies a packet into the batch
+        """
+        n = len(packet)
+        self._view[self.nbytes:self.nbytes + n] = packet
+        self.commit(n)
+
+    def clear(self):
+        self.offsets = []
+        self.sizes = []
+        self.nbytes = 0
+        self.stamp = None
+
+    def copy(self):
+        """
+        Returns a batch that owns a copy of the packets
+        :rtype: PacketBatch
+        """
+        other = PacketBatch(bufferSize=self.nbytes, maxPackets=self.maxPackets)
+        other._view[:] = self.data
+        other.offsets = list(self.offsets)
+        other.sizes = list(self.sizes)
+        other.nbytes = self.nbytes
+        other.stamp = self.stamp
+        return other
+
+
+def _countPackets(received):
+    """
+    Number of packets in a list of received data, a PacketBatch counts its packets and anything else counts as one
+    :param received: output of _readReady
+    :type received: list
+    :rtype: int
+    """
+    return sum(len(d) if isinstance(d, PacketBatch) else 1 for d in received)
+
+
+def structDtype(fmt, names=None):
+    """
+    Creates a numpy structured dtype with the same memory layout as a struct format. Every value returned by
+    struct.unpack is a field of the dtype, padding bytes ('x') are skipped
+    :param fmt: struct format, e.g. '<3c I 13h 4c'
+    :type fmt: str
+    :param names: name of each value in the same order as struct.unpack. Values without name are called f<i>
+    :type names: list
+    :rtype: np.dtype
+    """
+    if fmt and fmt[0] in '@=<>!':
+        prefix = fmt[0]
+        body = fmt[1:]
+    else:
+        prefix = '@'
+        body = fmt
+    order = {'<': '<', '>': '>', '!': '>'}.get(prefix, '=')
+    kinds = {'c': 'S', 's': 'S', 'p': 'S', '?': 'b', 'e': 'f', 'f': 'f', 'd': 'f'}
+    tokens = re.findall(r'(\d*)([xcbB?hHiIlLqQnNefdspP])', body.replace(' ', ''))
+    if ''.join(c + t for c, t in tokens) != body.replace(' ', ''):
+        raise ValueError('Format not supported: %s' % fmt)
+    fields = []
+    consumed = ''
+    for count, code in tokens:
+        count = int(count) if count else 1
+        if code == 'x':
+            consumed += '%dx' % count
+            continue
+        if code in 'sp':
+            # strings are a single value
+            items = ['%d%s' % (count, code)]
+        else:
+            items = [code] * count
+        for item in items:
+            size = struct.calcsize(prefix + item)
+            offset = struct.calcsize(prefix + consumed + item) - size
+            consumed += item
+            kind = kinds.get(code)
+            if kind is None:
+                kind = 'i' if code.islower() else 'u'
+            if kind == 'S':
+                dt = 'S%d' % size
+            elif kind == 'b':
+                dt = '?'
+            else:
+                dt = '%s%s%d' % (order, kind, size)
+            fields.append((dt, offset))
+    if names is None:
+        names = [None] * len(fields)
+    if len(names) != len(fields):
+        raise ValueError('Format %s has %d values, received %d names' % (fmt, len(fields), len(names)))
+    names = [na if na is not None else 'f%d' % i for i, na in enumerate(names)]
+    return np.dtype({'names': names,
+                     'formats': [f[0] for f in fields],
+                     'offsets': [f[1] for f in fields],
+                     'itemsize': struct.calcsize(fmt)})
+
+
+class StructDecoder(object):
+    def __init__(self, fmt, names=None, header=None, footer=None):
+        """
+        Decodes batches of fixed-size packets in one call. Packets are viewed as a numpy structured array with the
+        same layout as the struct format, so the cost is per batch instead of per packet
+        :param fmt: struct format of one packet, e.g. '<3c I 13h 4c'
+        :type fmt: str
+        :param names: name of each value in the same order as struct.unpack
+        :type names: list
+        :param header: bytes every valid packet starts with
+        :type header: bytes
+        :param footer: bytes every valid packet ends with
+        :type footer: bytes
+        """
+        self.fmt = fmt
+        self.dtype = structDtype(fmt, names)
+        self.size = self.dtype.itemsize
+        self.names = list(self.dtype.names)
+        self.header = np.frombuffer(header, dtype=np.uint8) if header else None
+        self.footer = np.frombuffer(footer, dtype=np.uint8) if footer else None
+        self.nDecoded = 0
+        self.nRejected = 0
+
+    def _validMask(self, raw):
+        """
+        Checks the header and footer of all the packets
+        :param raw: packets as an array of shape (n, size)
+        :type raw: np.ndarray
+        """
+        valid = np.ones(raw.shape[0], dtype=bool)
+        if self.header is not None:
+            valid &= (raw[:, :self.header.size] == self.header).all(axis=1)
+        if self.footer is not None:
+            valid &= (raw[:, self.size - self.footer.size:] == self.footer).all(axis=1)
+        return valid
+
+    def _fromRaw(self, raw):
+        valid = self._validMask(raw)
+        records = raw.reshape(-1).view(self.dtype)
+        nValid = int(np.count_nonzero(valid))
+        self.nDecoded += nValid
+        self.nRejected += raw.shape[0] - nValid
+        if nValid != raw.shape[0]:
+            records = records[valid]
+        return records, valid
+
+    def decodeRecords(self, data):
+        """
+        Decodes packets stored one after the other. Incomplete trailing bytes are ignored. When every packet is valid
+        the records are a view of data, not a copy, so if data is a reused buffer they are only valid until it is
+        written again. Use records.copy() to keep them
+        :param data: packets to decode
+        :type data: bytes, bytearray, memoryview
+        :return: structured array with the valid packets
+        :rtype: np.ndarray
+        """
+        n = len(data) // self.size
+        raw = np.frombuffer(data, dtype=np.uint8, count=n * self.size).reshape(n, self.size)
+        return self._fromRaw(raw)[0]
+
+    def decode(self, data):
+        """
+        Decodes packets stored one after the other. As in decodeRecords, the arrays can be views of data
+        :param data: packets to decode
+        :type data: bytes, bytearray, memoryview
+        :return: dict with an array for each value of the format
+        :rtype: dict
+        """
+        records = self.decodeRecords(data)
+        return {na: records[na] for na in self.names}
+
+    def splitBatch(self, batch):
+        """
+        Decodes the packets of a batch that match the format. Packets with a different size or with wrong
+        header/footer are returned untouched. Like the packets of the batch, the records are only valid until the next
+        receive: when every packet is valid they are a view of the batch buffer. Use records.copy() to keep them
+        :param batch: batch of packets
+        :type batch: PacketBatch
+        :return: structured array with the decoded packets and a list with the packets that were not decoded
+        :rtype: tuple
+        """
+        sizes = np.asarray(batch.sizes)
+        fixed = sizes == self.size
+        buf = np.frombuffer(batch.buffer, dtype=np.uint8, count=batch.nbytes)
+        if fixed.all():
+            raw = buf.reshape(-1, self.size)
+        else:
+            offsets = np.asarray(batch.offsets)[fixed]
+            raw = buf[offsets[:, None] + np.arange(self.size)]
+        records, valid = self._fromRaw(raw)
+        decoded = np.zeros(sizes.size, dtype=bool)
+        decoded[np.flatnonzero(fixed)[valid]] = True
+        others = [batch[i] for i in np.flatnonzero(~decoded)]
+        return records, others
+
+
+class AsyncReceiveLoop(object):
+    _default = None
+    _defaultLock = threading.Lock()
+
+    def __init__(self):
+        """
+        asyncio event loop running on its own daemon thread. Many receivers can share one loop, each socket or serial
+        port is serviced when the OS reports data, without polling
+        """
+        self.loop = None
+        self._thread = None
+        self._closers = {}
+
+    @classmethod
+    def default(cls):
+        """
+        Loop shared by all the receivers that do not provide one
+        :rtype: AsyncReceiveLoop
+        """
+        with cls._defaultLock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def start(self):
+        """
+        Starts the loop thread, does nothing if it is already running
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(started.set)
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self):
+        """
+        Closes all the receivers and stops the loop thread
+        """
+        if self._thread is None:
+            return
+        for receiver in list(self._closers):
+            self.remove(receiver)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self._thread = None
+        self.loop.close()
+
+    def add(self, receiver, timeout=5.0):
+        """
+        Starts receiving with receiver on this loop
+        :param receiver: receiver to add
+        :type receiver: receiveProto
+        :param timeout: max time to wait for the receiver to be opened
+        :type timeout: float
+        """
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(receiver._asyncOpen(self.loop), self.loop)
+        self._closers[receiver] = future.result(timeout)
+
+    def remove(self, receiver, timeout=5.0):
+        """
+        Stops receiving with receiver
+        :param receiver: receiver to remove
+        :type receiver: receiveProto
+        :param timeout: max time to wait for the receiver to be closed
+        :type timeout: float
+        """
+        closer = self._closers.pop(receiver, None)
+        if closer is None:
+            return
+
+        async def close():
+            closer()
+
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result(timeout)
+
+
+class _DatagramReceiver(asyncio.DatagramProtocol):
+    def __init__(self, receiver):
+        """
+        Collects the datagrams received during one loop iteration and hands them to the receiver together
+        :param receiver: receiver that parses the data
+        :type receiver: UDPreceiveProto
+        """
+        self.receiver = receiver
+        self.batch = receiver._batch
+        self.loop = None
+        self._flushScheduled = False
+
+    def connection_made(self, transport):
+        self.loop = asyncio.get_running_loop()
+
+    def datagram_received(self, data, addr):
+        if not self.receiver.batchMode:
+            self.receiver._dispatch(data)
+            return
+        if self.batch.isFull(len(data)):
+            self.flush()
+        self.batch.add(data)
+        if not self._flushScheduled:
+            self._flushScheduled = True
+            self.loop.call_soon(self.flush)
+
+    def flush(self):
+        self._flushScheduled = False
+        if len(self.batch) > 0:
+            self.receiver._dispatch(self.batch)
+            self.batch.clear()
+
+    def error_received(self, exc):
+        warnings.warn('UDP receive error: %s' % exc)
+
+
+class MultiReceiver(object):
+    def __init__(self, pollPeriod=0.002):
+        """
+        Services many receivers (UDPreceiveProto, serialReceive) from one selectors loop on a single thread. Data is
+        routed to the parse function of each receiver
+        :param pollPeriod: period in seconds used for sources that cannot be watched by the selector, e.g. serial
+        ports on Windows
+        :type pollPeriod: float
+        """
+        self.pollPeriod = pollPeriod
+        self.selector = selectors.DefaultSelector()
+        self.receivers = []
+        self._polled = []
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._wakeR, self._wakeW = socket.socketpair()
+        self._wakeR.setblocking(False)
+        self.selector.register(self._wakeR, selectors.EVENT_READ, None)
+        self.t1 = None
+        self.rec1 = None
+
+    def register(self, receiver):
+        """
+        Adds a receiver, can be called while the loop is running
+        :param receiver: receiver to service, its socket/port has to be open
+        :type receiver: receiveProto
+        """
+        with self._lock:
+            self.receivers.append(receiver)
+            self._stats[receiver] = [0, 0, 0, 0, time.monotonic()]
+            fileobj = receiver._selectable()
+            if fileobj is None:
+                self._polled.append(receiver)
+            else:
+                self.selector.register(fileobj, selectors.EVENT_READ, receiver)
+        self._wakeUp()
+
+    def unregister(self, receiver):
+        """
+        Removes a receiver
+        :param receiver: receiver to remove
+        :type receiver: receiveProto
+        """
+        with self._lock:
+            self.receivers.remove(receiver)
+            self._stats.pop(receiver)
+            if receiver in self._polled:
+                self._polled.remove(receiver)
+            else:
+                self.selector.unregister(receiver._selectable())
+        self._wakeUp()
+
+    def _wakeUp(self):
+        try:
+            self._wakeW.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _service(self, receiver):
+        t0 = receiver.stats.tic()
+        data = receiver._readReady()
+        if not data:
+            return
+        receiver.stats.toc('receive', t0, _countPackets(data))
+        st = self._stats.get(receiver)
+        for d in data:
+            if isinstance(d, PacketBatch):
+                st[0] += len(d)
+                st[1] += d.nbytes
+            else:
+                st[0] += 1
+                st[1] += len(d)
+            receiver._dispatch(d)
+
+    def _loop(self, e):
+        while e.is_set():
+            timeout = self.pollPeriod if self._polled else None
+            events = self.selector.select(timeout)
+            with self._lock:
+                for key, _ in events:
+                    if key.data is None:
+                        try:
+                            self._wakeR.recv(4096)
+                        except BlockingIOError:
+                            pass
+                        continue
+                    self._service(key.data)
+                for receiver in self._polled:
+                    self._service(receiver)
+
+    def startThread(self):
+        """
+        Starts the receiving thread
+        """
+        self.rec1 = threading.Event()
+        self.rec1.set()
+        self.t1 = threading.Thread(target=self._loop, args=[self.rec1], daemon=True)
+        self.t1.start()
+
+    def stopThread(self, timeout=1.0):
+        """
+        Stops the receiving thread, the receivers are not closed
+        :param timeout: max time to wait for the thread
+        :type timeout: float
+        :return: True if the thread ended or was not running
+        :rtype: bool
+        """
+        if self.t1 is None:
+            return True
+        self.rec1.clear()
+        self._wakeUp()
+        self.t1.join(timeout)
+        if self.t1.is_alive():
+            warnings.warn('The receiving thread did not end after %.1fs' % timeout)
+            return False
+        self.t1 = None
+        return True
+
+    def close(self, timeout=1.0):
+        """
+        Stops the receiving thread and releases the selector and the wake up sockets. The receivers are not closed
+        :param timeout: max time to wait for the thread
+        :type timeout: float
+        :return: True if everything was released. If False, the thread did not end and nothing was released
+        :rtype: bool
+        """
+        if not self.stopThread(timeout):
+            return False
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+            self._wakeR.close()
+            self._wakeW.close()
+        return True
+
+    def getStats(self):
+        """
+        Throughput of each receiver. Rates are computed since the previous call
+        :return: dict with receiver: dict(packets, bytes, packetsPerSec, bytesPerSec)
+        :rtype: dict
+        """
+        now = time.monotonic()
+        stats = {}
+        with self._lock:
+            for receiver, st in self._stats.items():
+                dt = max(now - st[4], 1e-9)
+                stats[receiver] = {'packets': st[0], 'bytes': st[1],
+                                   'packetsPerSec': (st[0] - st[2]) / dt, 'bytesPerSec': (st[1] - st[3]) / dt}
+                st[2], st[3], st[4] = st[0], st[1], now
+        return stats
+
+
+class IngestQueue(object):
+    policies = ['drop-oldest', 'drop-newest', 'coalesce', 'block']
+
+    def __init__(self, maxSize=4, policy='drop-oldest'):
+        """
+        Bounded queue between the receiving thread and the parsing thread
+        :param maxSize: max number of items waiting in the queue
+        :type maxSize: int
+        :param policy: what to do when a put finds the queue full.
+        'drop-oldest' removes the oldest item, 'drop-newest' discards the new item, 'coalesce' replaces all the
+        waiting items with the new one and 'block' waits until there is space
+        :type policy: str
+        """
+        if policy not in self.policies:
+            raise ValueError('policy should be one of %s, received: %s' % (self.policies, policy))
+        self.maxSize = max(int(maxSize), 1)
+        self.policy = policy
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.maxDepth = 0
+
+    def qsize(self):
+        return len(self._items)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def put(self, item, timeout=None):
+        """
+        Adds an item following the overload policy
+        :param item: item to add
+        :param timeout: max time to wait when the policy is 'block'. None waits forever
+        :type timeout: float
+        :return: True if the item was queued, False if it was dropped or the queue is closed
+        :rtype: bool
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxSize:
+                if self.policy == 'drop-newest':
+                    self.dropped += 1
+                    return False
+                elif self.policy == 'drop-oldest':
+                    self._items.popleft()
+                    self.dropped += 1
+                elif self.policy == 'coalesce':
+                    self.dropped += len(self._items)
+                    self._items.clear()
+                else:
+                    if not self._cond.wait_for(lambda: len(self._items) < self.maxSize or self._closed, timeout):
+                        self.dropped += 1
+                        return False
+                    if self._closed:
+                        return False
+            self._items.append(item)
+            self.enqueued += 1
+            if len(self._items) > self.maxDepth:
+                self.maxDepth = len(self._items)
+            self._cond.notify_all()
+        return True
+
+    def get(self, timeout=None):
+        """
+        Removes and returns the oldest item, waits if the queue is empty
+        :param timeout: max time to wait. None waits forever
+        :type timeout: float
+        :return: the item, or None if the queue was closed or the timeout expired
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """
+        Wakes up every thread waiting on the queue, get returns None once the queue is empty. Puts are rejected until
+        open is called
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def open(self):
+        with self._cond:
+            self._closed = False
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+            self._cond.notify_all()
+
+    def getStats(self):
+        """
+        :return: dict with enqueued, dropped, depth and maxDepth
+        :rtype: dict
+        """
+        with self._cond:
+            return {'enqueued': self.enqueued, 'dropped': self.dropped, 'depth': len(self._items),
+                    'maxDepth': self.maxDepth}
+
+
+class PacketRecorder(object):
+    indexDtype = np.dtype([('offset', '<u8'), ('stamp', '<f8'), ('size', '<u4')])
+
+    def __init__(self, flushPeriod=1.0, maxPending=1024, bufferSize=1 << 20):
+        """
+        Streams raw packets to disk from a writer thread. Memory use does not grow with the length of the recording.
+        Next to the data file, an index file (fileN + '.idx') stores offset, host timestamp and size of every packet,
+        see PacketRecorder.indexDtype
+        :param flushPeriod: max time in seconds between flushes to disk
+        :type flushPeriod: float
+        :param maxPending: max number of writes waiting for the writer thread, writes block when it is reached
+        :type maxPending: int
+        :param bufferSize: size of the file buffers
+        :type bufferSize: int
+        """
+        self.flushPeriod = flushPeriod
+        self.bufferSize = bufferSize
+        self.fileN = None
+        self.packets = 0
+        self.nbytes = 0
+        self._q = IngestQueue(maxPending, 'block')
+        self._offset = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def isOpen(self):
+        return self._thread is not None
+
+    def open(self, fileN):
+        """
+        Starts a new recording, if the file exists it is overwritten
+        :param fileN: path of the data file
+        :type fileN: str
+        """
+        with self._lock:
+            if self.isOpen:
+                raise RuntimeError('Recorder is already writing to %s' % self.fileN)
+            self.fileN = fileN
+            self.packets = 0
+            self.nbytes = 0
+            self._offset = 0
+            dataFile = open(fileN, 'wb', buffering=self.bufferSize)
+            indexFile = open(fileN + '.idx', 'wb', buffering=self.bufferSize)
+            self._q.clear()
+            self._q.open()
+            self._thread = threading.Thread(target=self._writeLoop, args=(dataFile, indexFile), daemon=True)
+            self._thread.start()
+
+    def write(self, packet, stamp=None):
+        """
+        Records one packet, does nothing if the recorder is not open
+        :param packet: raw packet
+        :type packet: bytes
+        :param stamp: host timestamp, if None time.time() is used
+        :type stamp: float
+        :return: True if the packet was queued
+        :rtype: bool
+        """
+        return self.writeBatch(packet, [len(packet)], stamp)
+
+    def writeBatch(self, data, sizes, stamp=None):
+        """
+        Records many packets stored one after the other, does nothing if the recorder is not open
+        :param data: packets
+        :type data: bytes, memoryview
+        :param sizes: size of each packet, or one int if all packets have the same size
+        :type sizes: list, int
+        :param stamp: host timestamp of the packets, if None time.time() is used
+        :type stamp: float
+        :return: True if the packets were queued. Packets written while the recorder closes are dropped
+        :rtype: bool
+        """
+        if not self.isOpen:
+            return False
+        if stamp is None:
+            stamp = time.time()
+        if isinstance(sizes, int):
+            sizes = np.full(len(data) // sizes, sizes, dtype=np.uint32)
+        return self._q.put((bytes(data), sizes, stamp))
+
+    def _writeLoop(self, dataFile, indexFile):
+        lastFlush = time.monotonic()
+        while True:
+            item = self._q.get(timeout=self.flushPeriod)
+            if item is not None:
+                data, sizes, stamp = item
+                index = np.empty(len(sizes), dtype=self.indexDtype)
+                index['size'] = sizes
+                index['offset'] = self._offset
+                index['offset'][1:] += np.cumsum(index['size'][:-1], dtype=np.uint64)
+                index['stamp'] = stamp
+                dataFile.write(data)
+                indexFile.write(index.tobytes())
+                self._offset += len(data)
+                self.packets += len(sizes)
+                self.nbytes += len(data)
+            elif self._q.qsize() == 0 and self._q.closed:
+                break
+            if time.monotonic() - lastFlush >= self.flushPeriod:
+                dataFile.flush()
+                indexFile.flush()
+                lastFlush = time.monotonic()
+        dataFile.close()
+        indexFile.close()
+
+    def close(self, timeout=None):
+        """
+        Writes the pending packets and closes the files
+        :param timeout: max time to wait for the writer thread
+        :type timeout: float
+        :return: True if the files were closed. If False, the writer is still draining the packets and the recorder
+        stays open, call close again
+        :rtype: bool
+        """
+        with self._lock:
+            if not self.isOpen:
+                return True
+            self._q.close()
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                warnings.warn('The recorder of %s did not end after %.1fs' % (self.fileN, timeout))
+                return False
+            self._thread = None
+            return True
+
+    @classmethod
+    def readIndex(cls, fileN):
+        """
+        Reads the index of a recording
+        :param fileN: path of the data file
+        :type fileN: str
+        :return: structured array with offset, stamp and size of every packet
+        :rtype: np.ndarray
+        """
+        return np.fromfile(fileN + '.idx', dtype=cls.indexDtype)
+
+
+class HotPathStats(object):
+    def __init__(self, enabled=False, alpha=0.1):
+        """
+        Counters and timers for the stages of the receive and plot paths. When it is disabled, tic returns None and
+        toc returns right away, so the instrumented code only pays two method calls. Usage:
+            t0 = stats.tic()
+            ...
+            stats.toc('parse', t0, nPackets)
+        :param enabled: If False, nothing is measured
+        :type enabled: bool
+        :param alpha: weight of the last measure in the recent time of each stage
+        :type alpha: float
+        """
+        self.enabled = enabled
+        self.alpha = alpha
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def tic(self):
+        """
+        Start time of a stage, None if the stats are disabled
+        :rtype: float
+        """
+        if not self.enabled:
+            return None
+        return time.perf_counter()
+
+    def toc(self, stage, t0, items=1):
+        """
+        Adds the time since t0 to a stage
+        :param stage: name of the stage
+        :type stage: str
+        :param t0: value returned by tic
+        :type t0: float
+        :param items: number of items (packets, samples, traces...) processed
+        :type items: int
+        """
+        if t0 is None:
+            return
+        self.add(stage, time.perf_counter() - t0, items)
+
+    def add(self, stage, dt, items=1):
+        """
+        Adds a measure to a stage
+        :param stage: name of the stage
+        :type stage: str
+        :param dt: time spent in seconds
+        :type dt: float
+        :param items: number of items processed
+        :type items: int
+        """
+        with self._lock:
+            st = self._stages.get(stage)
+            if st is None:
+                # calls, items, total time, max time, recent time
+                st = self._stages[stage] = [0, 0, 0.0, 0.0, dt]
+            st[0] += 1
+            st[1] += items
+            st[2] += dt
+            if dt > st[3]:
+                st[3] = dt
+            st[4] += self.alpha * (dt - st[4])
+
+    def count(self, name, n=1):
+        """
+        Increments a counter, e.g. dropped packets or skipped frames
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+
+    def getStats(self):
+        """
+        :return: dict with stages: dict(stage: dict(calls, items, total, mean, max, recent)) and counters: dict(name:
+        value). Times are in seconds
+        :rtype: dict
+        """
+        with self._lock:
+            stages = {na: {'calls': st[0], 'items': st[1], 'total': st[2], 'mean': st[2] / st[0], 'max': st[3],
+                           'recent': st[4]} for na, st in self._stages.items()}
+            return {'stages': stages, 'counters': dict(self._counters)}
+
+    def summary(self, stages=None):
+        """
+        Recent time of the stages in ms, one line per stage
+        :param stages: stages to show, if None all the stages measured
+        :type stages: list
+        :rtype: str
+        """
+        with self._lock:
+            if stages is None:
+                stages = list(self._stages)
+            lines = ['%s %.1fms' % (na, 1000 * self._stages[na][4]) for na in stages if na in self._stages]
+        return '\n'.join(lines)
+
+
+class LatencyHistogram(object):
+    def __init__(self, minValue=1e-5, maxValue=100.0, binsPerDecade=50):
+        """
+        Streaming histogram of latencies with log-spaced bins, memory does not grow with the number of values and the
+        percentiles have a relative error below the bin width (4.7% with 50 bins per decade). Values can be added from
+        any thread
+        :param minValue: lower edge of the first bin in seconds, smaller values are counted in an underflow bin
+        :type minValue: float
+        :param maxValue: upper edge of the last bin in seconds, larger values are counted in an overflow bin
+        :type maxValue: float
+        :param binsPerDecade: resolution of the histogram
+        :type binsPerDecade: int
+        """
+        self.minValue = float(minValue)
+        self.maxValue = float(maxValue)
+        self.binsPerDecade = binsPerDecade
+        self._logMin = math.log10(self.minValue)
+        self.nBins = int(math.ceil((math.log10(self.maxValue) - self._logMin) * binsPerDecade))
+        self.edges = self.minValue * 10 ** (np.arange(self.nBins + 1) / binsPerDecade)
+        # bin 0 is the underflow and bin nBins + 1 the overflow
+        self.counts = np.zeros(self.nBins + 2, dtype=np.int64)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts[:] = 0
+            self.count = 0
+            self.sum = 0.0
+            self.min = math.inf
+            self.max = -math.inf
+
+    def _bin(self, value):
+        if value < self.minValue:
+            return 0
+        return min(int((math.log10(value) - self._logMin) * self.binsPerDecade) + 1, self.nBins + 1)
+
+    def add(self, value):
+        """
+        Adds one latency or an array of latencies
+        :param value: latency in seconds
+        :type value: float, np.ndarray
+        """
+        if np.ndim(value) == 0:
+            value = float(value)
+            b = self._bin(value)
+            with self._lock:
+                self.counts[b] += 1
+                self.count += 1
+                self.sum += value
+                self.min = min(self.min, value)
+                self.max = max(self.max, value)
+            return
+        value = np.asarray(value, dtype=np.float64).ravel()
+        if value.size == 0:
+            return
+        bins = np.searchsorted(self.edges, value, side='right')
+        with self._lock:
+            np.add.at(self.counts, bins, 1)
+            self.count += value.size
+            self.sum += float(value.sum())
+            self.min = min(self.min, float(value.min()))
+            self.max = max(self.max, float(value.max()))
+
+    def percentile(self, q):
+        """
+        Latency below which q percent of the values are, None if there are no values. The upper edge of the bin is
+        returned, limited to the min and max seen
+        :param q: percentile between 0 and 100
+        :type q: float
+        :rtype: float
+        """
+        with self._lock:
+            return self._percentile(q)
+
+    def _percentile(self, q):
+        if self.count == 0:
+            return None
+        b = int(np.searchsorted(np.cumsum(self.counts), q / 100.0 * self.count, side='left'))
+        if b == 0:
+            value = self.minValue
+        elif b > self.nBins:
+            value = self.max
+        else:
+            value = self.edges[b]
+        return float(min(max(value, self.min), self.max))
+
+    def getStats(self):
+        """
+        :return: dict with count, mean, min, max, p50, p90, p99 and p999, times in seconds
+        :rtype: dict
+        """
+        with self._lock:
+            if self.count == 0:
+                return {'count': 0, 'mean': None, 'min': None, 'max': None, 'p50': None, 'p90': None, 'p99': None,
+                        'p999': None}
+            return {'count': self.count, 'mean': self.sum / self.count, 'min': self.min, 'max': self.max,
+                    'p50': self._percentile(50), 'p90': self._percentile(90), 'p99': self._percentile(99),
+                    'p999': self._percentile(99.9)}
+
+    def dump(self, fileN=None):
+        """
+        Stats and the non empty bins of the histogram, usually called at shutdown
+        :param fileN: If given, the result is also saved in this file as JSON
+        :type fileN: str
+        :return: getStats() plus bins: list of (lower edge, upper edge, count). The underflow bin starts at 0 and the
+        overflow bin ends at inf
+        :rtype: dict
+        """
+        out = self.getStats()
+        with self._lock:
+            edges = [0.0] + self.edges.tolist() + [math.inf]
+            out['bins'] = [(edges[b], edges[b + 1], int(c)) for b, c in enumerate(self.counts) if c > 0]
+        if fileN is not None:
+            with open(fileN, 'w') as f:
+                # inf is not valid JSON
+                json.dump(dict(out, bins=[(lo, hi if hi != math.inf else None, c) for lo, hi, c in out['bins']]), f,
+                          indent=2)
+        return out
+
+
 class receiveProto(object):
 
     def __init__(self, console, parseFunction=None, useThread=False, maxQSize=4, useQ=False,
-                 parseArgs=(), **kwargs):
+                 parseArgs=(), parseBatchFunction=None, backend='thread', asyncLoop=None, qPolicy='drop-oldest',
+                 stats=None, **kwargs):
         """
         :param console: rtgui console
         :type console: ConsoleFrame
         :param parseFunction: Function used to parse the data
         :type parseFunction: Function
         :param parseArgs: positional arguments for parse function
+        :param parseBatchFunction: Function used to parse a PacketBatch in one call. If None, each packet of the batch
+        is parsed with _parseData
+        :type parseBatchFunction: Function
+        :param backend: 'thread' to receive on a dedicated thread or 'asyncio' to receive on an AsyncReceiveLoop. Only
+        the receivers that implement _asyncOpen support 'asyncio'
+        :type backend: str
+        :param asyncLoop: loop used by the asyncio backend. If None, AsyncReceiveLoop.default() is used
+        :type asyncLoop: AsyncReceiveLoop
+        :param maxQSize: max number of messages waiting in the parse queue
+        :type maxQSize: int
+        :param qPolicy: what to do when the parse queue is full, see IngestQueue
+        :type qPolicy: str
+        :param stats: timers of the 'receive' and 'parse' stages, parse functions can add their own stages to it. If
+        None, a disabled HotPathStats is used, call self.stats.enable() to start measuring
+        :type stats: HotPathStats
         :param parseKwargs: keyword arguments for parse function
         """
 
@@ -57,12 +1083,22 @@ class receiveProto(object):
         self.q_var = None
         self.console = console
         self.useThread = useThread
-        self.q = queue.Queue()
+        self.q = IngestQueue(maxQSize, qPolicy)
         self.useQ = useQ
         self.maxQSize = maxQSize
+        if backend not in ['thread', 'asyncio']:
+            raise ValueError('backend should be thread or asyncio, received: %s' % backend)
+        if backend == 'asyncio' and type(self)._asyncOpen is receiveProto._asyncOpen:
+            raise ValueError('%s does not support the asyncio backend, use the thread backend' % type(self).__name__)
+        self.backend = backend
+        self._asyncLoop = asyncLoop
         self._parseFunction = parseFunction
+        self._parseBatchFunction = parseBatchFunction
         self._parseArgs = parseArgs
         self._parseKwargs = kwargs
+        self._wakeR = None
+        self._wakeW = None
+        self.stats = stats if stats is not None else HotPathStats()
 
     def _parseData(self, unparsed):
         """
@@ -76,42 +1112,134 @@ class receiveProto(object):
         else:
             self.console.set(unparsed.decode("utf-8", "ignore"))
 
+    def _parseBatch(self, batch):
+        """
+        Parses all the packets received in one wakeup
+        :param batch: packets to parse
+        :type batch: PacketBatch
+        """
+        if self._parseBatchFunction:
+            self._parseBatchFunction(batch, *self._parseArgs, **self._parseKwargs)
+        else:
+            for packet in batch:
+                self._parseData(bytes(packet))
+
+    def _parse(self, data):
+        t0 = self.stats.tic()
+        if isinstance(data, PacketBatch):
+            self._parseBatch(data)
+            self.stats.toc('parse', t0, len(data))
+        else:
+            self._parseData(data)
+            self.stats.toc('parse', t0)
+
     def _comReceive(self):
         warnings.warn("_comReceive function not declared")
         return None
 
-    def __receiveData(self, e):
+    def _selectable(self):
         """
-        Main function for receiving, this is usually on a different thread
+        Object that a selector can watch for incoming data, None if the source has to be polled
+        """
+        return None
+
+    def _readReady(self):
+        """
+        Reads the data available without blocking
+        :return: list with the messages or batches read
+        :rtype: list
+        """
+        data = self._comReceive()
+        return [data] if data else []
+
+    async def _asyncOpen(self, loop):
+        """
+        Starts receiving on an asyncio loop. Receivers that support the asyncio backend override it, __init__ rejects
+        backend='asyncio' for the others
+        :param loop: running loop
+        :type loop: asyncio.AbstractEventLoop
+        :return: function that stops receiving
+        :rtype: function
+        """
+        raise NotImplementedError('%s does not support the asyncio backend' % type(self).__name__)
+
+    def _dispatch(self, data):
+        """
+        Sends the received data to the queue or to the parser
+        :param data: data received
+        :type data: bytes, PacketBatch
+        """
+        if self.useQ:
+            if isinstance(data, PacketBatch):
+                # the receive buffer is reused, the queue needs its own copy
+                data = data.copy()
+            self.q.put(data)
+        else:
+            if self.useThread:
+                th = threading.Thread(target=self._parse, args=(data,))
+                th.start()
+                th.join()
+            else:
+                self._parse(data)
+
+    def _cancelRead(self):
+        """
+        Unblocks a _comReceive call that is waiting for data
+        """
+        pass
+
+    def __receiveData(self, e, wakeR):
+        """
+        Main function for receiving, this is usually on a different thread. The thread sleeps until the source has
+        data or stopThread wakes it up
         :param e:
+        :param wakeR: socket written by stopThread, the thread closes it when it ends
         :return:
         """
-        while e.is_set():
-            data = self._comReceive()
-            if not data:
-                continue
-            if self.useQ:
-                self.q.put(data)
-            else:
-                if self.useThread:
-                    th = threading.Thread(target=self._parseData, args=(data,))
-                    th.start()
-                    th.join()
-                else:
-                    self._parseData(data)
+        try:
+            self.__receiveLoop(e, wakeR)
+        finally:
+            wakeR.close()
         print("Thread ended")
 
+    def __receiveLoop(self, e, wakeR):
+        fileobj = self._selectable()
+        stats = self.stats
+        if fileobj is None:
+            # the source cannot be watched, _comReceive has to block. The receive time includes the wait
+            while e.is_set():
+                t0 = stats.tic()
+                data = self._comReceive()
+                if not data:
+                    continue
+                stats.toc('receive', t0)
+                self._dispatch(data)
+        else:
+            while e.is_set():
+                readable, _, _ = select.select([fileobj, wakeR], [], [])
+                if wakeR in readable:
+                    continue
+                t0 = stats.tic()
+                received = self._readReady()
+                stats.toc('receive', t0, _countPackets(received))
+                for data in received:
+                    self._dispatch(data)
+
     def parseQueue(self, e):
         while e.is_set():
-            for j in range(self.q.qsize()):
-                data = self.q.get()
-                self._parseData(data)
-                self.q.task_done()
-                if j > self.maxQSize:
-                    # flush the queue
-                    print('Flushing Q')
-                    with self.q.mutex:
-                        self.q.queue.clear()
+            data = self.q.get()
+            if data is None:
+                # queue closed
+                break
+            self._parse(data)
+
+    def getQueueStats(self):
+        """
+        Counters of the parse queue
+        :return: dict with enqueued, dropped, depth and maxDepth
+        :rtype: dict
+        """
+        return self.q.getStats()
 
     def startThread(self):
         """
@@ -122,47 +1250,400 @@ class receiveProto(object):
         # self.reOpenSocket()
         self.rec1 = threading.Event()
         self.rec1.set()
-        self.t1 = threading.Thread(target=self.__receiveData, args=[self.rec1], daemon=True)
-        self.t1.start()
+        if self._wakeR is None:
+            self._wakeR, self._wakeW = socket.socketpair()
+        if self.backend == 'asyncio':
+            if self._asyncLoop is None:
+                self._asyncLoop = AsyncReceiveLoop.default()
+            self._asyncLoop.add(self)
+        else:
+            self.t1 = threading.Thread(target=self.__receiveData, args=[self.rec1, self._wakeR], daemon=True)
+            self.t1.start()
         # start queue thread
         if self.useQ:
+            self.q.open()
             self.q_var = threading.Event()
             self.q_var.set()
             self.t2 = threading.Thread(target=self.parseQueue, args=[self.q_var], daemon=True)
             self.t2.start()
 
-    def stopThread(self):
+    def stopThread(self, timeout=1.0):
+        """
+        Stops the receiving threads and waits for them to end
+        :param timeout: max time to wait for each thread
+        :type timeout: float
+        :return: True if the receiving thread ended. If False, it is still inside a parse call and it will end when the
+        call returns, the source should not be closed yet
+        :rtype: bool
+        """
         self.rec = False
         self.rec1.clear()
+        ended = True
+        if self.backend == 'asyncio':
+            self._asyncLoop.remove(self)
+            self._wakeR.close()
+        else:
+            self._wakeW.send(b'\0')
+            self._cancelRead()
+            self.t1.join(timeout)
+            # the thread closes the read end when it leaves select, closing it here could break a select in progress
+            ended = not self.t1.is_alive()
+            if not ended:
+                warnings.warn('The receiving thread did not end after %.1fs' % timeout)
+        self._wakeW.close()
+        self._wakeR = None
+        self._wakeW = None
         if self.useQ:
             self.q_var.clear()
-        time.sleep(0.5)
+            self.q.close()
+            self.t2.join(timeout)
+        return ended
+
+
+class _ConsoleProxy(object):
+    def __init__(self, q):
+        """
+        Console used by receivers running in another process, the messages are sent to the GUI process
+        :param q: queue shared with the GUI process
+        :type q: multiprocessing.Queue
+        """
+        self._q = q
+
+    def append(self, text, clear_console=False):
+        self._q.put(text)
+
+    def set(self, text):
+        self._q.put(text)
+
+
+def _processIngestMain(factory, stores, factoryArgs, consoleQ, readyEvent, stopEvent):
+    """
+    Entry point of the ingest process
+    """
+    receiver = factory(_ConsoleProxy(consoleQ), stores, *factoryArgs)
+    receiver.startThread()
+    readyEvent.set()
+    stopEvent.wait()
+    receiver.stopThread()
+    for st in stores:
+        st.close()
+
+
+class ProcessIngest(object):
+    def __init__(self, factory, stores, console=None, factoryArgs=(), startMethod=None):
+        """
+        Runs a receiver in a separate process, so receiving and decoding do not compete with the GUI for the GIL.
+        The receiver writes the decoded samples into SharedRingBuffers that the GUI process reads without copies
+        :param factory: picklable function called in the new process as factory(console, stores, *factoryArgs).
+        It has to return a receiveProto with its socket/port open, whose parse function writes into stores
+        :type factory: function
+        :param stores: stores shared with the new process
+        :type stores: list
+        :param console: console of the GUI process that shows the messages of the receiver, see pollConsole
+        :type console: ConsoleFrame
+        :param factoryArgs: extra positional arguments for factory
+        :type factoryArgs: tuple
+        :param startMethod: multiprocessing start method, if None the platform default is used
+        :type startMethod: str
+        """
+        self.factory = factory
+        self.stores = list(stores)
+        self.console = console
+        self.factoryArgs = factoryArgs
+        self._ctx = multiprocessing.get_context(startMethod)
+        self._consoleQ = self._ctx.Queue()
+        self._ready = self._ctx.Event()
+        self._stop = self._ctx.Event()
+        self.process = None
+
+    def start(self, timeout=None):
+        """
+        Starts the ingest process
+        :param timeout: If not None, waits up to timeout seconds for the receiver to start
+        :type timeout: float
+        :return: True if the receiver is known to be running
+        :rtype: bool
+        """
+        self._ready.clear()
+        self._stop.clear()
+        self.process = self._ctx.Process(target=_processIngestMain,
+                                         args=(self.factory, self.stores, self.factoryArgs, self._consoleQ,
+                                               self._ready, self._stop),
+                                         daemon=True)
+        self.process.start()
+        if timeout is None:
+            return False
+        return self._ready.wait(timeout)
+
+    def stop(self, timeout=2.0):
+        """
+        Stops the receiver and waits for the process to end
+        :param timeout: max time to wait before terminating the process
+        :type timeout: float
+        """
+        if self.process is None:
+            return
+        self._stop.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def pollConsole(self):
+        """
+        Appends the messages sent by the receiver to the console, call it from the GUI loop
+        """
+        while True:
+            try:
+                text = self._consoleQ.get_nowait()
+            except queue.Empty:
+                return
+            if self.console is not None:
+                self.console.append(text)
+
+
+class FrameSplitter(object):
+    def __init__(self, header, footer=None, frameSize=None, maxFrameSize=4096):
+        """
+        Splits a byte stream into binary frames delimited by header/footer bytes. When a frame is corrupted, the
+        splitter resynchronizes on the next header
+        :param header: bytes every frame starts with
+        :type header: bytes
+        :param footer: bytes every frame ends with
+        :type footer: bytes
+        :param frameSize: size of the frames including header and footer. If None, frames end at the first footer
+        :type frameSize: int
+        :param maxFrameSize: longest frame accepted when frameSize is None
+        :type maxFrameSize: int
+        """
+        if frameSize is None and not footer:
+            raise ValueError('frameSize or footer is needed to find the end of the frames')
+        self.header = bytes(header)
+        self.footer = bytes(footer) if footer else b''
+        self.frameSize = frameSize
+        self.maxFrameSize = frameSize if frameSize is not None else maxFrameSize
+        self._buf = bytearray()
+        self.frames = 0
+        self.resyncs = 0
+        self.discarded = 0
+
+    def split(self, data, batch):
+        """
+        Adds data to the stream and copies every complete frame into batch
+        :param data: new bytes of the stream
+        :type data: bytes
+        :param batch: batch to fill, it is cleared first
+        :type batch: PacketBatch
+        :return: batch
+        :rtype: PacketBatch
+        """
+        batch.clear()
+        buf = self._buf
+        buf += data
+        view = memoryview(buf)
+        nH = len(self.header)
+        nF = len(self.footer)
+        pos = 0
+        end = len(buf)
+        try:
+            while not batch.isFull(self.maxFrameSize):
+                i = buf.find(self.header, pos)
+                if i < 0:
+                    # keep what could be the start of a header
+                    keep = max(end - nH + 1, pos)
+                    self.discarded += keep - pos
+                    pos = keep
+                    break
+                if i > pos:
+                    self.discarded += i - pos
+                    self.resyncs += 1
+                if self.frameSize is not None:
+                    stop = i + self.frameSize
+                    if stop > end:
+                        pos = i
+                        break
+                    if nF and view[stop - nF:stop] != self.footer:
+                        # not a real header, look for the next one
+                        pos = i + 1
+                        self.discarded += 1
+                        continue
+                else:
+                    j = buf.find(self.footer, i + nH)
+                    if j < 0:
+                        if end - i > self.maxFrameSize:
+                            pos = i + 1
+                            self.discarded += 1
+                            continue
+                        pos = i
+                        break
+                    stop = j + nF
+                    if stop - i > self.maxFrameSize:
+                        pos = i + 1
+                        self.discarded += 1
+                        continue
+                batch.add(view[i:stop])
+                self.frames += 1
+                pos = stop
+        finally:
+            view.release()
+        del buf[:pos]
+        return batch
+
+    def reset(self):
+        self._buf = bytearray()
 
 
 class serialReceive(receiveProto):
-    def __init__(self, console, serialConnection, **kwargs):
+    def __init__(self, console, serialConnection, header=None, footer=None, frameSize=None, chunkSize=16384,
+                 **kwargs):
         """
-        Serial communication
+        Serial communication. By default every line is a message, if header is given the port is read in binary
+        frames instead, see FrameSplitter
         :param console: rtgui console
         :type console: ConsoleFrame
         :param serialConnection: serial object to use for receiving
         :type serialConnection: serial.Serial
+        :param header: bytes every frame starts with, e.g. bytes([0x1, 0x2, 0x3])
+        :type header: bytes
+        :param footer: bytes every frame ends with, e.g. bytes([0xA, 0xB, 0xC])
+        :type footer: bytes
+        :param frameSize: size of the frames, if None frames end at the first footer
+        :type frameSize: int
+        :param chunkSize: max number of bytes read from the port at once
+        :type chunkSize: int
         """
         super(serialReceive, self).__init__(console, **kwargs)
         self._serial = serialConnection
+        self._pending = bytearray()
+        self.chunkSize = chunkSize
+        self.framer = None
+        if header is not None:
+            self.framer = FrameSplitter(header, footer=footer, frameSize=frameSize)
+            # a batch holds every frame found in one chunk plus an incomplete frame from the previous read
+            size = chunkSize + self.framer.maxFrameSize
+            self._batch = PacketBatch(bufferSize=size, maxPackets=size)
+
+    def _readChunk(self, block):
+        """
+        Reads the bytes waiting in the port, up to chunkSize
+        :param block: If True and there is nothing waiting, waits for one byte (up to the port timeout)
+        :type block: bool
+        """
+        n = min(self._serial.in_waiting, self.chunkSize)
+        if n == 0:
+            if not block:
+                return b''
+            n = 1
+        return self._serial.read(n)
 
     def _comReceive(self):
+        if self.framer is not None:
+            data = self._readChunk(True)
+            return self.framer.split(data, self._batch)
         data = self._serial.readline()
         return data
 
+    def _selectable(self):
+        try:
+            return self._serial.fileno()
+        except (AttributeError, OSError, ValueError):
+            # ports without a file descriptor, e.g. on Windows fileno raises io.UnsupportedOperation
+            return None
+
+    def _cancelRead(self):
+        if hasattr(self._serial, 'cancel_read'):
+            self._serial.cancel_read()
+
+    def _readReady(self):
+        """
+        Reads the bytes waiting in the port and returns the complete lines, or a batch of frames
+        """
+        if self.framer is not None:
+            batch = self.framer.split(self._readChunk(False), self._batch)
+            return [batch] if len(batch) > 0 else []
+        n = self._serial.in_waiting
+        if n > 0:
+            self._pending += self._serial.read(n)
+        end = self._pending.rfind(b'\n')
+        if end < 0:
+            return []
+        lines = bytes(self._pending[:end + 1]).splitlines(keepends=True)
+        del self._pending[:end + 1]
+        return lines
+
+    async def _asyncRead(self, reader):
+        """
+        Reads one message from the stream of the serial port
+        :param reader: stream with the bytes of the serial port
+        :type reader: asyncio.StreamReader
+        """
+        if self.framer is not None:
+            data = await reader.read(self.chunkSize)
+            return self.framer.split(data, self._batch)
+        return await reader.readline()
+
+    async def _asyncOpen(self, loop):
+        """
+        Feeds the serial port into a StreamReader. If the port has no file descriptor that the loop can watch,
+        blocking reads run on the default executor
+        """
+        reader = asyncio.StreamReader()
+        usesReader = False
+        try:
+            fd = self._serial.fileno()
+            loop.add_reader(fd, self._feedReader, reader)
+            usesReader = True
+        except (AttributeError, NotImplementedError, ValueError, OSError):
+            fd = None
+
+        async def readLoop():
+            while True:
+                if usesReader:
+                    data = await self._asyncRead(reader)
+                else:
+                    data = await loop.run_in_executor(None, self._comReceive)
+                if data:
+                    self._dispatch(data)
+
+        task = loop.create_task(readLoop())
+
+        def close():
+            if usesReader:
+                loop.remove_reader(fd)
+            task.cancel()
+
+        return close
+
+    def _feedReader(self, reader):
+        n = self._serial.in_waiting
+        data = self._serial.read(n if n > 0 else 1)
+        if data:
+            reader.feed_data(data)
+
 
 class UDPreceiveProto(receiveProto):
 
-    def __init__(self, console, portN=12345, bufferedData=None, **kwargs):
+    def __init__(self, console, portN=12345, bufferedData=None, batchMode=False, maxBatch=256, bufferSize=262144,
+                 maxPacketSize=65507, rcvBufSize=None, **kwargs):
         """
         :param console: rtgui console
         :type console: ConsoleFrame
         :param portN: port number for receiving
+        :param batchMode: If True, every wakeup drains all the pending datagrams into a preallocated PacketBatch that
+        is parsed in one call
+        :type batchMode: bool
+        :param maxBatch: max number of datagrams per batch
+        :type maxBatch: int
+        :param bufferSize: size in bytes of the batch buffer
+        :type bufferSize: int
+        :param maxPacketSize: largest datagram expected, the batch stops draining when less space is left
+        :type maxPacketSize: int
+        :param rcvBufSize: size of the kernel receive buffer (SO_RCVBUF). If None, the OS default is used
+        :type rcvBufSize: int
         """
         super(UDPreceiveProto, self).__init__(console, **kwargs)
         self.portN = portN
@@ -170,36 +1651,101 @@ class UDPreceiveProto(receiveProto):
             self.bufferedData = []
         else:
             self.bufferedData = bufferedData
+        self.batchMode = batchMode
+        self.maxPacketSize = maxPacketSize
+        self.rcvBufSize = rcvBufSize
+        self._batch = PacketBatch(bufferSize=max(bufferSize, maxPacketSize), maxPackets=maxBatch)
 
     def reOpenSocket(self):
         self.sock = socket.socket(socket.AF_INET,  # Internet
                                   socket.SOCK_DGRAM)  # UDP
+        if self.rcvBufSize is not None:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvBufSize)
         self.sock.bind(("", self.portN))
+        if self.batchMode:
+            self.sock.setblocking(False)
+
+    def _drainSocket(self):
+        """
+        Reads all the pending datagrams without blocking
+        :return: batch with the datagrams, the batch is reused on the next call
+        :rtype: PacketBatch
+        """
+        batch = self._batch
+        batch.clear()
+        while not batch.isFull(self.maxPacketSize):
+            try:
+                n = self.sock.recv_into(batch.writable(), self.maxPacketSize)
+            except (BlockingIOError, InterruptedError):
+                break
+            batch.commit(n)
+        return batch
+
+    def _recvOne(self):
+        """
+        Reads one datagram. It is received in the batch buffer (unused without batchMode) and only its bytes are
+        copied, so no maxPacketSize object is allocated per datagram
+        :rtype: bytes
+        """
+        view = self._batch.writable()
+        n = self.sock.recv_into(view, self.maxPacketSize)
+        return bytes(view[:n])
+
+    def _selectable(self):
+        return self.sock
+
+    def _readReady(self):
+        """
+        Reads the datagrams waiting in the socket
+        """
+        if self.batchMode:
+            batch = self._drainSocket()
+            return [batch] if len(batch) > 0 else []
+        return [self._recvOne()]
+
+    async def _asyncOpen(self, loop):
+        """
+        Serves the socket with an asyncio.DatagramProtocol, datagrams received in the same loop iteration are parsed
+        together when batchMode is True
+        """
+        transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramReceiver(self), sock=self.sock)
+        return transport.close
 
     def _comReceive(self):
         """
         Main function for receiving, this is usually on a different thread
         :return: data from the UDP port
         """
-        readable = [self.sock]
-        # q = queue.Queue()
-        while len(readable) > 0:
-            readable, _, _, = select.select([self.sock], [], [], 1. / 500.)
-            if self.sock in readable:
-                data, addr = self.sock.recvfrom(1024)
-                return data
+        readable, _, _, = select.select([self.sock], [], [], 1. / 500.)
+        if self.sock not in readable:
+            return None
+        if self.batchMode:
+            return self._drainSocket()
+        return self._recvOne()
 
     def clearBuffer(self):
         self.bufferedData = []
 
-    def stopThread(self):
-        self.rec = False
-        self.rec1.clear()
-        if self.useQ:
-            self.q_var.clear()
-        time.sleep(0.5)
-        self.closeSocket()
+    def stopThread(self, timeout=1.0):
+        """
+        Stops the receiving threads and closes the socket. If the thread does not end in time, the socket is left open
+        :param timeout: max time to wait for each thread
+        :type timeout: float
+        :return: True if the receiving thread ended
+        :rtype: bool
+        """
+        ended = super(UDPreceiveProto, self).stopThread(timeout)
+        if ended:
+            self.closeSocket()
+        return ended
 
     def closeSocket(self):
-        self.sock.shutdown(socket.SHUT_RDWR)
+        if self.sock.fileno() == -1:
+            # already closed by the asyncio transport
+            return
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            # UDP sockets are not connected
+            pass
         self.sock.close()
@@ -0,0 +1,53 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+import numpy as np
+import pytest
+
+from rtgui import HotPathStats, RingBuffer
+from rtgui.benchmark import DEEPSOLE_NAMES, DEEPSOLE_PREPROCESS, HeadlessPlotPanel, runBenchmark, wrapAngles
+
+
+def _store(n, rate=1000.0):
+    store = RingBuffer(DEEPSOLE_NAMES + ['sync'], 4 * n)
+    rng = np.random.default_rng(0)
+    t = np.arange(n) * 1000.0 / rate
+    values = {na: rng.integers(-8000, 8000, n).astype(np.float64) for na in DEEPSOLE_NAMES}
+    values['sync'] = np.zeros(n)
+    store.extend(t, values)
+    return store
+
+
+@pytest.mark.parametrize('renderMode', ['draw', 'blit'])
+def test_headless_panel_preprocess_stage(renderMode):
+    store = _store(2000)
+    stats = HotPathStats(enabled=True)
+    names = [DEEPSOLE_NAMES[3 * j:3 * j + 3] for j in range(4)]
+    panel = HeadlessPlotPanel('D0', names, store, renderMode=renderMode, stats=stats)
+    panel.plotControlFromChecksTime(1.0, extraT=1.0, preprocess=DEEPSOLE_PREPROCESS, t_in_ms=True)
+    t, cols = panel.pipeline.snapshot()
+    for na in ['EUy', 'EUz', 'EUx']:
+        assert np.array_equal(cols[na], wrapAngles(store.column(na)))
+    assert np.array_equal(cols['ax'], store.column('ax'))
+    stages = stats.getStats()['stages']
+    assert 'preprocess' in stages and 'plot' in stages
+    # nothing changed, the frame is skipped
+    panel.plotControlFromChecksTime(1.0, extraT=1.0, preprocess=DEEPSOLE_PREPROCESS, t_in_ms=True)
+    assert stats.getStats()['counters']['skipped'] == 1
+    panel.invalidate()
+    panel.plotControlFromChecksTime(1.0, extraT=1.0, t_in_ms=True)
+    assert panel.pipeline is None
+
+
+def test_benchmark_run():
+    r = runBenchmark(rate=500.0, devices=1, duration=1.0, fps=10.0, visualizeTime=1.0)
+    assert r['config']['preprocess'] and r['frames'] > 0 and r['packetsReceived'] > 0
+    assert not r['windowTooShort']
+
+
+def test_short_window_is_flagged():
+    # the only frame runs before the devices send, the panels have nothing to plot
+    with pytest.warns(UserWarning, match='samples'):
+        r = runBenchmark(rate=500.0, devices=1, duration=0.01, fps=1.0, visualizeTime=1.0, preprocess=False)
+    assert r['windowTooShort'] and r['windowSamples'] == [0]
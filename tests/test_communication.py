@@ -0,0 +1,802 @@
+import io
+import json
+import os
+import pickle
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from rtgui import SharedRingBuffer
+from rtgui.communication import AsyncReceiveLoop, FrameSplitter, HotPathStats, IngestQueue, LatencyHistogram, \
+    MultiReceiver, PacketBatch, PacketRecorder, ProcessIngest, StructDecoder, UDPreceiveProto, receiveProto, serialReceive, structDtype
+
+FMT = '<3c I 13h 4c'
+NAMES = ['o1', 'o2', 'o3', 'timestamp'] + ['v%d' % i for i in range(13)] + ['side', 'c1', 'c2', 'c3']
+HEADER = bytes([1, 2, 3])
+FOOTER = bytes([0xA, 0xB, 0xC])
+
+
+def _packets(n, seed=0):
+    rng = np.random.default_rng(seed)
+    packets = []
+    for k in range(n):
+        vals = rng.integers(-8000, 8000, 13).tolist()
+        packets.append(struct.pack(FMT, *[bytes([b]) for b in HEADER], 1000 + k, *vals, b'r',
+                                   *[bytes([b]) for b in FOOTER]))
+    return packets
+
+
+def _assertSame(record, packet):
+    for na, v in zip(NAMES, struct.unpack(FMT, packet)):
+        assert record[na] == v
+
+
+class _Console(object):
+    def __init__(self):
+        self.messages = []
+
+    def append(self, text, clear_console=False):
+        self.messages.append(text)
+
+    def set(self, text):
+        self.messages.append(text)
+
+
+def _splitAll(splitter, stream, chunk=17):
+    batch = PacketBatch()
+    frames = []
+    # the chunks cut frames in two
+    for k in range(0, len(stream), chunk):
+        splitter.split(stream[k:k + chunk], batch)
+        frames.extend(bytes(f) for f in batch)
+    return frames
+
+
+def test_frame_splitter_resyncs_fixed_size():
+    packets = _packets(20)
+    splitter = FrameSplitter(HEADER, footer=FOOTER, frameSize=struct.calcsize(FMT))
+    # garbage, a truncated frame and a fake header between valid frames
+    stream = b'\x00\x05' + packets[0] + packets[1][:10] + b''.join(packets[2:10]) + HEADER + b'\x00' + \
+        b''.join(packets[10:])
+    assert _splitAll(splitter, stream) == [packets[0]] + packets[2:]
+    assert splitter.frames == 19 and splitter.resyncs > 0
+
+
+def test_frame_splitter_resyncs_footer():
+    packets = _packets(20)
+    splitter = FrameSplitter(HEADER, footer=FOOTER, maxFrameSize=64)
+    # garbage between frames and a frame without footer longer than maxFrameSize
+    stream = b'\x00\x05' + b''.join(packets[:5]) + b'junk' + b''.join(packets[5:10]) + HEADER + b'\x00' * 100 + \
+        b''.join(packets[10:])
+    assert _splitAll(splitter, stream) == packets
+    assert splitter.frames == 20 and splitter.resyncs > 0
+
+
+class _NoFdPort(object):
+    def __init__(self):
+        """
+        Serial port without a file descriptor, like pyserial on Windows
+        """
+        self._buf = bytearray()
+        self._cond = threading.Condition()
+
+    def feed(self, data):
+        with self._cond:
+            self._buf += data
+            self._cond.notify_all()
+
+    def fileno(self):
+        raise io.UnsupportedOperation('fileno')
+
+    @property
+    def in_waiting(self):
+        return len(self._buf)
+
+    def read(self, n=1):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._buf) > 0, 0.05)
+            data = bytes(self._buf[:n])
+            del self._buf[:n]
+            return data
+
+    def cancel_read(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+def test_serial_without_file_descriptor():
+    port = _NoFdPort()
+    received = []
+    rec = serialReceive(_Console(), port, header=HEADER, footer=FOOTER, frameSize=struct.calcsize(FMT),
+                        parseBatchFunction=lambda batch: received.extend(bytes(p) for p in batch))
+    assert rec._selectable() is None
+    packets = _packets(50)
+    rec.startThread()
+    try:
+        port.feed(b''.join(packets))
+        assert _waitFor(lambda: len(received) >= len(packets))
+    finally:
+        assert rec.stopThread()
+    assert received == packets
+    # the selector loop polls it
+    multi = MultiReceiver()
+    multi.register(rec)
+    multi.startThread()
+    try:
+        port.feed(b''.join(packets))
+        assert _waitFor(lambda: len(received) >= 2 * len(packets))
+    finally:
+        multi.close()
+    assert received == packets + packets
+
+
+def _openLoopback():
+    serial = pytest.importorskip('serial')
+    master, slave = os.openpty()
+    port = serial.Serial(os.ttyname(slave), timeout=0.1)
+    return master, slave, port
+
+
+def _waitFor(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.mark.parametrize('backend', ['thread', 'asyncio'])
+def test_serial_frames_pty_loopback(backend):
+    master, slave, port = _openLoopback()
+    packets = _packets(300)
+    received = []
+
+    def parse(batch):
+        received.extend(bytes(p) for p in batch)
+
+    rec = serialReceive(_Console(), port, header=HEADER, footer=FOOTER, frameSize=struct.calcsize(FMT),
+                        parseBatchFunction=parse, backend=backend)
+    rec.startThread()
+    try:
+        stream = b'\x07' + b''.join(packets[:150]) + HEADER + b''.join(packets[150:])
+        for k in range(0, len(stream), 1000):
+            os.write(master, stream[k:k + 1000])
+        assert _waitFor(lambda: len(received) >= len(packets))
+    finally:
+        rec.stopThread()
+        port.close()
+        os.close(master)
+        os.close(slave)
+    assert received == packets
+
+
+def test_serial_lines_pty_loopback():
+    master, slave, port = _openLoopback()
+    received = []
+    rec = serialReceive(_Console(), port, parseFunction=received.append)
+    rec.startThread()
+    try:
+        os.write(master, b'first\nsecond\nthi')
+        os.write(master, b'rd\n')
+        assert _waitFor(lambda: len(received) >= 3)
+    finally:
+        rec.stopThread()
+        port.close()
+        os.close(master)
+        os.close(slave)
+    assert received == [b'first\n', b'second\n', b'third\n']
+
+
+def _openUDP(**kwargs):
+    rec = UDPreceiveProto(_Console(), 0, **kwargs)
+    rec.reOpenSocket()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    return rec, sender, ('127.0.0.1', rec.sock.getsockname()[1])
+
+
+def test_packet_batch():
+    batch = PacketBatch(bufferSize=64, maxPackets=3)
+    batch.add(b'abc')
+    view = batch.writable()
+    view[:2] = b'de'
+    batch.commit(2)
+    assert [bytes(p) for p in batch] == [b'abc', b'de'] and bytes(batch.data) == b'abcde'
+    assert batch.stamp is not None and not batch.isFull() and batch.isFull(60)
+    other = batch.copy()
+    batch.clear()
+    batch.add(b'xyz')
+    assert [bytes(p) for p in other] == [b'abc', b'de'] and len(batch) == 1
+    batch.add(b'1')
+    batch.add(b'2')
+    assert batch.isFull()
+
+
+def test_udp_drain_reads_every_pending_datagram():
+    rec, sender, addr = _openUDP(batchMode=True, maxBatch=8, maxPacketSize=100)
+    try:
+        sent = [bytes([k]) * (k + 1) for k in range(20)]
+        for p in sent:
+            sender.sendto(p, addr)
+        time.sleep(0.05)
+        received = []
+        buffers = set()
+        while True:
+            batch = rec._drainSocket()
+            if len(batch) == 0:
+                break
+            assert len(batch) <= 8
+            buffers.add(id(batch.buffer))
+            received.extend(bytes(p) for p in batch)
+        assert received == sent
+        # the same buffer is used for every batch
+        assert len(buffers) == 1
+    finally:
+        rec.closeSocket()
+        sender.close()
+
+
+@pytest.mark.parametrize('batchMode', [True, False])
+def test_udp_receive_thread(batchMode):
+    received = []
+    if batchMode:
+        kwargs = {'parseBatchFunction': lambda batch: received.extend(bytes(p) for p in batch)}
+    else:
+        kwargs = {'parseFunction': received.append}
+    rec, sender, addr = _openUDP(batchMode=batchMode, **kwargs)
+    sent = [b'a' * 10, b'b' * 2000, b'c' * 60000] + [struct.pack('<I', k) for k in range(100)]
+    rec.startThread()
+    try:
+        for p in sent:
+            sender.sendto(p, addr)
+            time.sleep(0.0005)
+        assert _waitFor(lambda: len(received) >= len(sent))
+    finally:
+        assert rec.stopThread()
+        sender.close()
+    assert received == sent
+
+
+@pytest.mark.parametrize('fmt', ['<3c I 13h 4c', '>b2xH?4sd', '=hqf3B', 'iBhd'])
+def test_struct_dtype_layout(fmt):
+    dt = structDtype(fmt)
+    assert dt.itemsize == struct.calcsize(fmt)
+    rng = np.random.default_rng(0)
+    raw = rng.integers(0, 256, dt.itemsize, dtype=np.uint8).tobytes()
+    record = np.frombuffer(raw, dtype=dt)[0]
+    for v, na in zip(struct.unpack(fmt, raw), dt.names):
+        if isinstance(v, float) and np.isnan(v):
+            assert np.isnan(record[na])
+        else:
+            assert record[na] == v
+
+
+def test_struct_dtype_errors():
+    with pytest.raises(ValueError):
+        structDtype('<3c I', ['a', 'b'])
+    with pytest.raises(ValueError):
+        structDtype('<3c Z')
+
+
+def test_decoder_matches_struct_unpack():
+    packets = _packets(50)
+    decoder = StructDecoder(FMT, NAMES, header=HEADER, footer=FOOTER)
+    assert decoder.size == struct.calcsize(FMT)
+    records = decoder.decodeRecords(b''.join(packets) + b'\x01\x02')
+    assert records.shape[0] == 50
+    for r, p in zip(records, packets):
+        _assertSame(r, p)
+    cols = decoder.decode(b''.join(packets))
+    assert np.array_equal(cols['timestamp'], 1000 + np.arange(50))
+
+
+def test_decoder_rejects_bad_packets():
+    packets = _packets(10)
+    packets[3] = b'\x00' + packets[3][1:]
+    packets[7] = packets[7][:-1] + b'\x00'
+    decoder = StructDecoder(FMT, NAMES, header=HEADER, footer=FOOTER)
+    records = decoder.decodeRecords(b''.join(packets))
+    assert records.shape[0] == 8 and decoder.nRejected == 2
+    good = [p for i, p in enumerate(packets) if i not in (3, 7)]
+    for r, p in zip(records, good):
+        _assertSame(r, p)
+
+
+def test_split_batch():
+    packets = _packets(6)
+    batch = PacketBatch()
+    for i, p in enumerate(packets):
+        batch.add(p)
+        if i == 2:
+            batch.add(b'hello')
+    decoder = StructDecoder(FMT, NAMES, header=HEADER, footer=FOOTER)
+    records, others = decoder.splitBatch(batch)
+    assert records.shape[0] == 6 and [bytes(o) for o in others] == [b'hello']
+    for r, p in zip(records, packets):
+        _assertSame(r, p)
+
+
+class _Polled(receiveProto):
+    def _comReceive(self):
+        time.sleep(0.001)
+        return None
+
+
+def test_backend_is_validated():
+    with pytest.raises(ValueError):
+        _Polled(_Console(), backend='asyncio')
+    with pytest.raises(ValueError):
+        UDPreceiveProto(_Console(), 0, backend='trio')
+    _Polled(_Console(), backend='thread')
+
+
+@pytest.mark.parametrize('batchMode', [True, False])
+def test_udp_asyncio_backend(batchMode):
+    loop = AsyncReceiveLoop()
+    received = []
+    if batchMode:
+        kwargs = {'parseBatchFunction': lambda batch: received.extend(bytes(p) for p in batch)}
+    else:
+        kwargs = {'parseFunction': received.append}
+    rec, sender, addr = _openUDP(batchMode=batchMode, backend='asyncio', asyncLoop=loop, **kwargs)
+    sent = [struct.pack('<I', k) * (k + 1) for k in range(200)]
+    rec.startThread()
+    try:
+        for p in sent:
+            sender.sendto(p, addr)
+            time.sleep(0.0002)
+        assert _waitFor(lambda: len(received) >= len(sent))
+    finally:
+        assert rec.stopThread()
+        sender.close()
+        loop.stop()
+    assert received == sent
+
+
+def test_multi_receiver_services_two_sockets():
+    batched = []
+    single = []
+    recA, sender, addrA = _openUDP(batchMode=True,
+                                   parseBatchFunction=lambda batch: batched.extend(bytes(p) for p in batch))
+    recB, _, addrB = _openUDP(parseFunction=single.append)
+    multi = MultiReceiver()
+    multi.register(recA)
+    multi.startThread()
+    # registered while the loop runs
+    multi.register(recB)
+    try:
+        for k in range(100):
+            sender.sendto(b'a%d' % k, addrA)
+            sender.sendto(b'b%d' % k, addrB)
+            time.sleep(0.0002)
+        assert _waitFor(lambda: len(batched) >= 100 and len(single) >= 100)
+        stats = multi.getStats()
+        assert stats[recA]['packets'] == 100 and stats[recB]['packets'] == 100
+        multi.unregister(recB)
+        sender.sendto(b'late', addrB)
+        time.sleep(0.05)
+        assert len(single) == 100
+    finally:
+        assert multi.close()
+        recA.closeSocket()
+        recB.closeSocket()
+        sender.close()
+    assert batched == [b'a%d' % k for k in range(100)]
+    assert single == [b'b%d' % k for k in range(100)]
+    assert multi.t1 is None and multi.selector is None
+
+
+def test_multi_receiver_stop_without_start():
+    multi = MultiReceiver()
+    assert multi.stopThread()
+    assert multi.close()
+    assert multi.close()
+
+
+@pytest.mark.parametrize('useQ', [False, True])
+def test_stop_wakes_the_idle_thread(useQ):
+    rec, sender, addr = _openUDP(batchMode=True, parseBatchFunction=lambda batch: None, useQ=useQ)
+    sender.close()
+    rec.startThread()
+    time.sleep(0.05)
+    t0 = time.monotonic()
+    assert rec.stopThread(timeout=2.0)
+    # woken by the socketpair, not by a timeout
+    assert time.monotonic() - t0 < 0.5
+    assert rec.sock.fileno() == -1 and not rec.t1.is_alive()
+
+
+def test_stop_reports_a_thread_that_did_not_end():
+    release = threading.Event()
+    received = []
+
+    def parse(data):
+        received.append(data)
+        release.wait(5.0)
+
+    rec, sender, addr = _openUDP(parseFunction=parse)
+    rec.startThread()
+    try:
+        sender.sendto(b'x', addr)
+        assert _waitFor(lambda: len(received) == 1)
+        with pytest.warns(UserWarning):
+            assert not rec.stopThread(timeout=0.1)
+        # the socket is left open for the thread that is still running
+        assert rec.sock.fileno() != -1
+    finally:
+        release.set()
+        sender.close()
+    rec.t1.join(2.0)
+    assert not rec.t1.is_alive()
+    rec.closeSocket()
+
+
+def test_restart_after_stop():
+    received = []
+    rec, sender, addr = _openUDP(parseFunction=received.append)
+    port = addr[1]
+    try:
+        for k in range(2):
+            rec.startThread()
+            sender.sendto(b'%d' % k, addr)
+            assert _waitFor(lambda: len(received) == k + 1)
+            assert rec.stopThread()
+            rec.portN = port
+            rec.reOpenSocket()
+    finally:
+        rec.closeSocket()
+        sender.close()
+    assert received == [b'0', b'1']
+
+
+def _putAll(q, items, timeout=None):
+    return [q.put(item, timeout) for item in items]
+
+
+def _getAll(q):
+    items = []
+    while q.qsize() > 0:
+        items.append(q.get())
+    return items
+
+
+def test_queue_drop_oldest():
+    q = IngestQueue(3, 'drop-oldest')
+    assert _putAll(q, range(5)) == [True] * 5
+    assert _getAll(q) == [2, 3, 4]
+    assert q.getStats() == {'enqueued': 5, 'dropped': 2, 'depth': 0, 'maxDepth': 3}
+
+
+def test_queue_drop_newest():
+    q = IngestQueue(3, 'drop-newest')
+    assert _putAll(q, range(5)) == [True, True, True, False, False]
+    assert _getAll(q) == [0, 1, 2]
+    assert q.getStats() == {'enqueued': 3, 'dropped': 2, 'depth': 0, 'maxDepth': 3}
+
+
+def test_queue_coalesce():
+    q = IngestQueue(3, 'coalesce')
+    assert _putAll(q, range(5)) == [True] * 5
+    assert _getAll(q) == [3, 4]
+    assert q.getStats() == {'enqueued': 5, 'dropped': 3, 'depth': 0, 'maxDepth': 3}
+
+
+def test_queue_block():
+    q = IngestQueue(2, 'block')
+    _putAll(q, range(2))
+    t0 = time.monotonic()
+    assert not q.put(2, timeout=0.05)
+    assert time.monotonic() - t0 >= 0.04 and q.dropped == 1
+    done = []
+    th = threading.Thread(target=lambda: done.append(q.put(3)))
+    th.start()
+    time.sleep(0.05)
+    assert done == []
+    assert q.get() == 0
+    th.join(1.0)
+    assert done == [True] and _getAll(q) == [1, 3]
+    assert q.getStats() == {'enqueued': 3, 'dropped': 1, 'depth': 0, 'maxDepth': 2}
+
+
+def test_queue_invalid_policy():
+    with pytest.raises(ValueError):
+        IngestQueue(2, 'drop-all')
+
+
+def test_queue_get_timeout():
+    q = IngestQueue(2)
+    t0 = time.monotonic()
+    assert q.get(timeout=0.05) is None
+    assert time.monotonic() - t0 >= 0.04
+
+
+def test_queue_close_wakes_get_and_put():
+    q = IngestQueue(1, 'block')
+    got = []
+    getter = threading.Thread(target=lambda: got.append(q.get()))
+    getter.start()
+    time.sleep(0.05)
+    q.close()
+    getter.join(1.0)
+    assert not getter.is_alive() and got == [None]
+    q.open()
+    q.put(0)
+    put = []
+    putter = threading.Thread(target=lambda: put.append(q.put(1)))
+    putter.start()
+    time.sleep(0.05)
+    q.close()
+    putter.join(1.0)
+    assert not putter.is_alive() and put == [False]
+    # the items queued before close can still be read
+    assert q.get() == 0 and q.get() is None
+
+
+def _sharedReceiver(console, stores, port):
+    """
+    Runs in the ingest process, every datagram is a '<dd' sample (time, value)
+    """
+    store = stores[0]
+
+    def parse(batch):
+        data = np.frombuffer(batch.data, dtype='<f8').reshape(-1, 2)
+        store.extend(data[:, 0], data[:, 1:])
+
+    rec = UDPreceiveProto(console, port, batchMode=True, parseBatchFunction=parse)
+    rec.reOpenSocket()
+    console.append('listening on %d' % port)
+    return rec
+
+
+def _freePort():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(('', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_shared_ring_buffer_pickles_to_the_same_memory():
+    store = SharedRingBuffer(['a', 'b'], 16)
+    try:
+        other = pickle.loads(pickle.dumps(store))
+        store.extend(np.arange(20.0), np.ones((20, 2)))
+        assert other.total == 20 and np.array_equal(other.timestamps(), np.arange(4.0, 20.0))
+        other.close()
+    finally:
+        store.unlink()
+
+
+def test_process_ingest_round_trip():
+    store = SharedRingBuffer(['v'], 1000)
+    console = _Console()
+    port = _freePort()
+    ingest = ProcessIngest(_sharedReceiver, [store], console=console, factoryArgs=(port,))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        assert ingest.start(timeout=10.0) and ingest.is_alive()
+        for k in range(200):
+            sender.sendto(struct.pack('<dd', k, 2.0 * k), ('127.0.0.1', port))
+            time.sleep(0.0002)
+        assert _waitFor(lambda: store.total >= 200)
+        t, cols = store.snapshot()
+        assert np.array_equal(t, np.arange(200.0)) and np.array_equal(cols['v'], 2.0 * t)
+        assert _waitFor(lambda: ingest.pollConsole() or console.messages)
+        assert console.messages == ['listening on %d' % port]
+    finally:
+        ingest.stop()
+        sender.close()
+        store.unlink()
+    assert not ingest.is_alive()
+
+
+def test_queue_rejects_puts_after_close():
+    q = IngestQueue(4)
+    q.close()
+    assert not q.put(1) and q.qsize() == 0
+    q.open()
+    assert q.put(2) and q.get() == 2
+
+
+def _readRecording(fileN):
+    with open(fileN, 'rb') as f:
+        data = f.read()
+    index = PacketRecorder.readIndex(fileN)
+    return [data[o:o + n] for o, n in zip(index['offset'], index['size'])], index, data
+
+
+def test_recorder_index_matches_data(tmp_path):
+    fileN = str(tmp_path / 'rec.bin')
+    rec = PacketRecorder(flushPeriod=0.05)
+    packets = _packets(30)
+    rec.open(fileN)
+    assert rec.isOpen
+    for k, p in enumerate(packets[:10]):
+        assert rec.write(p, stamp=100.0 + k)
+    assert rec.writeBatch(b''.join(packets[10:]), len(packets[0]), stamp=200.0)
+    assert rec.write(b'short', stamp=300.0)
+    assert rec.close()
+    assert not rec.isOpen and not rec.write(b'late')
+    read, index, data = _readRecording(fileN)
+    assert read == packets + [b'short']
+    assert len(data) == sum(len(p) for p in packets) + 5
+    assert np.array_equal(index['stamp'], [100.0 + k for k in range(10)] + [200.0] * 20 + [300.0])
+    assert rec.packets == 31 and rec.nbytes == len(data)
+
+
+def test_recorder_reopen(tmp_path):
+    rec = PacketRecorder()
+    for k in range(3):
+        fileN = str(tmp_path / ('rec%d.bin' % k))
+        rec.open(fileN)
+        with pytest.raises(RuntimeError):
+            rec.open(fileN)
+        rec.write(b'%d' % k * (k + 1), stamp=float(k))
+        assert rec.close() and rec.close()
+        read, index, _ = _readRecording(fileN)
+        assert read == [b'%d' % k * (k + 1)] and index['offset'][0] == 0 and index['stamp'][0] == k
+
+
+class _SlowRecorder(PacketRecorder):
+    def __init__(self):
+        super(_SlowRecorder, self).__init__()
+        self.release = threading.Event()
+
+    def _writeLoop(self, dataFile, indexFile):
+        self.release.wait(5.0)
+        super(_SlowRecorder, self)._writeLoop(dataFile, indexFile)
+
+
+def test_recorder_close_timeout_keeps_it_open(tmp_path):
+    rec = _SlowRecorder()
+    fileN = str(tmp_path / 'a.bin')
+    rec.open(fileN)
+    rec.write(b'first')
+    with pytest.warns(UserWarning):
+        assert not rec.close(timeout=0.05)
+    # the writer is still draining, a new recording cannot start and new packets are dropped
+    assert rec.isOpen and not rec.write(b'during close')
+    with pytest.raises(RuntimeError):
+        rec.open(str(tmp_path / 'b.bin'))
+    rec.release.set()
+    assert rec.close(timeout=2.0)
+    assert _readRecording(fileN)[0] == [b'first']
+    rec.open(str(tmp_path / 'b.bin'))
+    rec.write(b'second')
+    assert rec.close(timeout=2.0)
+    assert _readRecording(str(tmp_path / 'b.bin'))[0] == [b'second']
+
+
+def test_hot_path_stats_disabled():
+    stats = HotPathStats()
+    t0 = stats.tic()
+    assert t0 is None
+    stats.toc('parse', t0)
+    stats.count('skipped')
+    assert stats.getStats() == {'stages': {}, 'counters': {}} and stats.summary() == ''
+
+
+def test_hot_path_stats_stages_and_counters():
+    stats = HotPathStats(enabled=True, alpha=0.5)
+    stats.add('parse', 0.002, 10)
+    stats.add('parse', 0.004, 30)
+    stats.add('draw', 0.01)
+    stats.count('skipped')
+    stats.count('skipped', 2)
+    st = stats.getStats()
+    assert st['counters'] == {'skipped': 3}
+    parse = st['stages']['parse']
+    assert parse['calls'] == 2 and parse['items'] == 40 and parse['max'] == 0.004
+    assert parse['total'] == pytest.approx(0.006) and parse['mean'] == pytest.approx(0.003)
+    assert parse['recent'] == pytest.approx(0.003)
+    assert stats.summary(['draw', 'parse', 'window']) == 'draw 10.0ms\nparse 3.0ms'
+    t0 = stats.tic()
+    stats.toc('window', t0, 5)
+    assert stats.getStats()['stages']['window']['calls'] == 1
+    stats.reset()
+    assert stats.getStats() == {'stages': {}, 'counters': {}}
+
+
+def test_hot_path_stats_from_many_threads():
+    stats = HotPathStats(enabled=True)
+
+    def work():
+        for k in range(1000):
+            stats.add('parse', 0.001, 2)
+            stats.count('packets')
+
+    threads = [threading.Thread(target=work) for k in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    st = stats.getStats()
+    assert st['stages']['parse']['calls'] == 4000 and st['stages']['parse']['items'] == 8000
+    assert st['counters']['packets'] == 4000
+
+
+def test_receiver_times_its_stages():
+    stats = HotPathStats(enabled=True)
+    received = []
+    rec, sender, addr = _openUDP(batchMode=True, stats=stats,
+                                 parseBatchFunction=lambda batch: received.extend(bytes(p) for p in batch))
+    sent = _packets(50)
+    rec.startThread()
+    try:
+        for p in sent:
+            sender.sendto(p, addr)
+        assert _waitFor(lambda: len(received) >= len(sent))
+    finally:
+        assert rec.stopThread()
+        sender.close()
+    st = stats.getStats()['stages']
+    assert st['receive']['items'] == 50 and st['parse']['items'] == 50
+    assert st['parse']['calls'] == st['receive']['calls']
+
+
+def test_latency_histogram_percentiles():
+    rng = np.random.default_rng(4)
+    values = rng.lognormal(np.log(0.005), 1.0, 20000)
+    hist = LatencyHistogram()
+    hist.add(values[:10000])
+    for v in values[10000:]:
+        hist.add(v)
+    # the error is below the width of one bin
+    width = 10 ** (1 / hist.binsPerDecade)
+    for q in [1, 50, 90, 99, 99.9]:
+        exact = np.percentile(values, q)
+        assert exact / width <= hist.percentile(q) <= exact * width
+    st = hist.getStats()
+    assert st['count'] == 20000 and st['mean'] == pytest.approx(values.mean())
+    assert st['min'] == values.min() and st['max'] == values.max() and st['p50'] == hist.percentile(50)
+
+
+def test_latency_histogram_scalar_and_array_bins_agree():
+    rng = np.random.default_rng(5)
+    values = 10 ** rng.uniform(-6, 3, 5000)
+    a = LatencyHistogram()
+    b = LatencyHistogram()
+    a.add(values)
+    for v in values:
+        b.add(v)
+    assert np.array_equal(a.counts, b.counts)
+    # below minValue and above maxValue
+    assert a.counts[0] == np.sum(values < a.minValue) > 0
+    assert a.counts[-1] == np.sum(values >= a.maxValue) > 0
+    # the upper edge of the bin is returned, limited to the max seen
+    assert a.percentile(100) == values.max() and a.percentile(0) == a.minValue
+
+
+def test_latency_histogram_empty_dump_and_reset(tmp_path):
+    hist = LatencyHistogram()
+    assert hist.percentile(50) is None and hist.getStats()['count'] == 0 and hist.getStats()['p99'] is None
+    hist.add(np.array([]))
+    hist.add([0.001, 0.001, 0.002, 1e-7, 500.0])
+    fileN = str(tmp_path / 'latency.json')
+    out = hist.dump(fileN)
+    assert sum(c for lo, hi, c in out['bins']) == 5
+    assert out['bins'][0][:2] == (0.0, hist.minValue) and out['bins'][-1][1] == np.inf
+    for lo, hi, c in out['bins'][1:-1]:
+        assert lo < hi and c > 0
+    with open(fileN) as f:
+        saved = json.load(f)
+    assert saved['count'] == 5 and saved['bins'][-1][1] is None
+    hist.reset()
+    assert hist.count == 0 and hist.counts.sum() == 0 and hist.dump()['bins'] == []
+
+
+def test_latency_histogram_from_many_threads():
+    hist = LatencyHistogram()
+
+    def work():
+        for k in range(2000):
+            hist.add(0.001)
+
+    threads = [threading.Thread(target=work) for k in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert hist.count == 8000 and hist.counts.sum() == 8000 and hist.sum == pytest.approx(8.0)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from rtgui import SlidingMinMax, StreamNormalizer
+
+
+def test_sliding_min_max_matches_brute_force():
+    rng = np.random.default_rng(0)
+    window = 200
+    mm = SlidingMinMax(capacity=window)
+    values = np.empty(0)
+    for _ in range(300):
+        new = rng.normal(size=rng.integers(0, 40)) * rng.uniform(0.1, 10)
+        mm.extend(new)
+        values = np.concatenate([values, new])
+        if values.size == 0:
+            continue
+        lo, hi = mm.minMax(window)
+        assert lo == values[-window:].min() and hi == values[-window:].max()
+        assert mm.minMax() == (values.min(), values.max())
+
+
+def test_sliding_min_max_shrinking_window():
+    rng = np.random.default_rng(2)
+    values = rng.normal(size=1000)
+    mm = SlidingMinMax()
+    mm.extend(values)
+    for n in range(1000, 0, -7):
+        lo, hi = mm.minMax(n)
+        assert lo == values[-n:].min() and hi == values[-n:].max()
+
+
+def test_sliding_min_max_monotonic_and_nan():
+    mm = SlidingMinMax(capacity=10)
+    mm.extend(np.arange(20.0))
+    assert mm.minMax(10) == (10.0, 19.0)
+    mm.extend(np.arange(20.0)[::-1])
+    assert mm.minMax(10) == (0.0, 9.0)
+    mm.extend([np.nan] * 10)
+    lo, hi = mm.minMax(10)
+    assert np.isnan(lo) and np.isnan(hi)
+    assert mm.minMax() == (0.0, 19.0)
+
+
+def test_stream_normalizer_window():
+    rng = np.random.default_rng(1)
+    norm = StreamNormalizer('window', capacity=50)
+    a = rng.normal(size=500)
+    b = rng.normal(size=500)
+    for k in range(0, 500, 25):
+        norm.update({'a': a[k:k + 25], 'b': b[k:k + 25]})
+        lo, hi = norm.getSeries(['a', 'b'], 50)
+        assert lo['a'] == a[max(k - 25, 0):k + 25].min() and hi['b'] == b[max(k - 25, 0):k + 25].max()
+
+
+def test_stream_normalizer_running_and_reset():
+    norm = StreamNormalizer()
+    norm.update({'a': [1.0, 5.0], 'b': [-2.0]})
+    norm.update({'a': [3.0]})
+    assert norm.minMax('a', 1) == (1.0, 5.0)
+    assert np.isnan(norm.minMax('c')[0])
+    norm.reset(['a'])
+    norm.update({'a': [4.0]})
+    assert norm.minMax('a') == (4.0, 4.0) and norm.minMax('b') == (-2.0, -2.0)
+    with pytest.raises(ValueError):
+        StreamNormalizer('median')
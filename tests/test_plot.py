@@ -0,0 +1,407 @@
+import threading
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import numpy as np
+import pandas
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from rtgui import (BlitManager, HotPathStats, PlotDashboard, PlotPanel, PlotPanel3DPandas, RenderThread, RingBuffer,
+                   TracePlotter, angleSources, dataVersion, lttbDecimate, minMaxDecimate)
+
+
+class _CountingCanvas(FigureCanvasAgg):
+    def __init__(self, figure):
+        super(_CountingCanvas, self).__init__(figure)
+        self.draws = 0
+        self.blits = 0
+
+    def draw(self):
+        self.draws += 1
+        super(_CountingCanvas, self).draw()
+
+    def blit(self, bbox=None):
+        self.blits += 1
+
+
+def _figure():
+    f = Figure(figsize=(4, 2), dpi=50)
+    canvas = _CountingCanvas(f)
+    return f, f.add_subplot(111), canvas
+
+
+def test_blit_manager_draws_the_figure_once():
+    f, axis, canvas = _figure()
+    manager = BlitManager(canvas)
+    plotter = TracePlotter(axis, manager)
+    t = np.arange(100.0)
+    plotter.update([('a', t, np.sin(t), 'red')], ylim=(-1.5, 1.5), extraT=50.0)
+    manager.render()
+    assert canvas.draws == 1 and canvas.blits == 0
+    for k in range(10):
+        changed = plotter.update([('a', t, np.sin(t + k), 'red')], ylim=(-1.5, 1.5), extraT=50.0)
+        assert not changed
+        manager.render()
+    assert canvas.draws == 1 and canvas.blits == 10
+    manager.requestDraw()
+    manager.render()
+    assert canvas.draws == 2
+
+
+def test_blit_matches_a_full_draw():
+    f, axis, canvas = _figure()
+    manager = BlitManager(canvas)
+    plotter = TracePlotter(axis, manager)
+    t = np.arange(100.0)
+    plotter.update([('a', t, np.zeros(100), 'red')], ylim=(-1.5, 1.5), extraT=50.0)
+    manager.render()
+    plotter.update([('a', t, np.sin(t / 10), 'red')], ylim=(-1.5, 1.5), extraT=50.0)
+    manager.render()
+    blitted = np.asarray(canvas.buffer_rgba()).copy()
+    # the line is not part of the background
+    canvas.restore_region(manager._background)
+    assert not np.array_equal(blitted, np.asarray(canvas.buffer_rgba()))
+    manager.requestDraw()
+    manager.render()
+    assert np.array_equal(blitted, np.asarray(canvas.buffer_rgba()))
+
+
+def test_animated_artists_are_only_drawn_by_the_manager():
+    f, axis, canvas = _figure()
+    manager = BlitManager(canvas)
+    line, = axis.plot([0, 1], [0, 1])
+    manager.add(line)
+    assert line.get_animated()
+    manager.remove(line)
+    assert not line.get_animated() and manager.artists == []
+
+
+def test_trace_plotter_limits():
+    f, axis, canvas = _figure()
+    manager = BlitManager(canvas)
+    plotter = TracePlotter(axis, manager)
+    t = np.arange(10.0)
+    assert plotter.update([('a', t, t, 'red'), ('b', t, -t, 'blue')], extraT=5.0)
+    assert axis.get_xlim() == (0.0, 14.0)
+    y0, y1 = axis.get_ylim()
+    assert y0 < -9 and y1 > 9
+    manager.render()
+    # the data stays inside the limits, nothing changes
+    assert not plotter.update([('a', t + 2, t, 'red'), ('b', t + 2, -t, 'blue')], extraT=5.0)
+    assert not manager._needsDraw
+    # the y range shrinks to less than half of the axis
+    assert plotter.update([('a', t + 2, t, 'red')], extraT=5.0)
+    y0, y1 = axis.get_ylim()
+    assert -1 < y0 < 0 and 9 < y1 < 10
+    manager.render()
+    assert not plotter.lines['b'].get_visible() and plotter.lines['a'].get_visible()
+    # the data reaches the end of the axis, the x axis jumps and a full draw is requested
+    assert plotter.update([('a', t + 10, t, 'red')], extraT=5.0)
+    assert axis.get_xlim() == (10.0, 24.0) and manager._needsDraw
+    assert not plotter.update([], extraT=5.0)
+
+
+def test_trace_plotter_without_blitting():
+    f, axis, canvas = _figure()
+    plotter = TracePlotter(axis)
+    t = np.arange(10.0)
+    plotter.update([('a', t, t, 'red')], ylim=(0, 10))
+    assert axis.get_ylim() == (0.0, 10.0) and not plotter.lines['a'].get_animated()
+    with pytest.raises(KeyError):
+        plotter.lines['b']
+
+
+@pytest.mark.parametrize('n', [1001, 1000, 4097, 12345])
+@pytest.mark.parametrize('nPixels', [2, 3, 100, 400])
+def test_min_max_decimate(n, nPixels):
+    rng = np.random.default_rng(n)
+    t = np.arange(n) * 0.01
+    y = rng.normal(size=n)
+    td, yd = minMaxDecimate(t, y, nPixels)
+    assert td.size == yd.size and td.size <= 2 * nPixels
+    assert td[0] == t[0] and td[-1] == t[-1] and yd[0] == y[0] and yd[-1] == y[-1]
+    assert np.all(np.diff(td) >= 0)
+    assert yd.min() == y.min() and yd.max() == y.max()
+    # every kept point is a sample of the trace
+    assert np.array_equal(yd, y[np.round(td / 0.01).astype(int)])
+
+
+def test_min_max_decimate_keeps_every_peak():
+    n = 10000
+    y = np.zeros(n)
+    peaks = np.arange(37, n, 97)
+    y[peaks] = np.arange(peaks.size) + 1.0
+    y[peaks + 40] = -1.0
+    t = np.arange(n, dtype=np.float64)
+    td, yd = minMaxDecimate(t, y, 200)
+    assert set(peaks.tolist()) <= set(td.astype(int).tolist())
+
+
+@pytest.mark.parametrize('decimate', [minMaxDecimate, lttbDecimate])
+def test_short_traces_are_not_decimated(decimate):
+    t = np.arange(50.0)
+    y = np.sin(t)
+    td, yd = decimate(t, y, 25)
+    assert td is t or np.array_equal(td, t)
+    assert np.array_equal(yd, y)
+
+
+@pytest.mark.parametrize('n', [1001, 5000])
+@pytest.mark.parametrize('nPixels', [2, 50, 400])
+def test_lttb_decimate(n, nPixels):
+    rng = np.random.default_rng(n)
+    t = np.cumsum(rng.uniform(0.5, 1.5, n))
+    y = rng.normal(size=n).astype(np.float32)
+    td, yd = lttbDecimate(t, y, nPixels)
+    assert td.size == 2 * nPixels and yd.dtype == np.float32
+    assert td[0] == t[0] and td[-1] == t[-1]
+    assert np.all(np.diff(td) > 0)
+    idx = np.searchsorted(t, td)
+    assert np.array_equal(t[idx], td) and np.array_equal(y[idx], yd)
+
+
+def test_lttb_keeps_a_spike():
+    t = np.arange(5000.0)
+    y = np.zeros(5000)
+    y[2345] = 10.0
+    td, yd = lttbDecimate(t, y, 50)
+    assert 2345.0 in td
+
+
+class _Check(object):
+    def __init__(self, values):
+        self.values = values
+
+    def getAllValues(self):
+        return self.values
+
+
+class _DirtyPanel(object):
+    _isDirty = PlotPanel._isDirty
+    _checkState = PlotPanel._checkState
+    invalidate = PlotPanel.invalidate
+
+    def __init__(self, source, timestamp):
+        """
+        Holds the attributes PlotPanel._isDirty reads, without Tk
+        """
+        self.all = source
+        self.timestamp = timestamp
+        self.checks = [_Check([1, 0])]
+        self.useScale = False
+        self._lastKey = None
+
+
+def test_data_version_changes_on_write():
+    store = RingBuffer(['a'], 10)
+    v = dataVersion(store)
+    assert dataVersion(store) == v
+    store.append(0.0, [1.0])
+    assert dataVersion(store) != v
+    v = dataVersion(store)
+    store.clear()
+    assert dataVersion(store) != v
+
+    values = [1.0, 2.0]
+    v = dataVersion(values)
+    values.append(2.0)
+    assert dataVersion(values) != v
+    nested = [[1.0], [2.0]]
+    v = dataVersion(nested)
+    nested[1].append(3.0)
+    assert dataVersion(nested) != v
+
+    df = pandas.DataFrame({'a': [1.0, 2.0]})
+    v = dataVersion(df)
+    df.loc[2] = [3.0]
+    assert dataVersion(df) != v
+    assert dataVersion(pandas.DataFrame({'a': []}))[1] == 0
+
+
+def test_redraw_is_skipped_until_something_changes():
+    store = RingBuffer(['a', 'b'], 10)
+    panel = _DirtyPanel(store, [])
+    assert panel._isDirty(5.0)
+    assert not panel._isDirty(5.0)
+    # the view arguments, the checkboxes and the scale are part of the key
+    assert panel._isDirty(6.0)
+    panel.checks[0].values = [1, 1]
+    assert panel._isDirty(6.0)
+    panel.useScale = True
+    assert panel._isDirty(6.0)
+    assert not panel._isDirty(6.0)
+    store.append(0.0, [1.0, 2.0])
+    assert panel._isDirty(6.0)
+    assert not panel._isDirty(6.0)
+    panel.invalidate()
+    assert panel._isDirty(6.0)
+
+
+class _AnglePanel(object):
+    _lastAngles = PlotPanel3DPandas._lastAngles
+
+    def __init__(self, allVals, columnNames, nSystems):
+        self.all, self._angle_column_names = angleSources(allVals, columnNames, nSystems)
+
+
+def test_3d_panel_accepts_a_single_store():
+    df = pandas.DataFrame({'x': [0.1, 0.2], 'y': [0.3, 0.4], 'z': [0.5, 0.6]})
+    panel = _AnglePanel(df, ['z', 'y', 'x'], 2)
+    assert panel.all == [df, df] and panel._angle_column_names == [['z', 'y', 'x'], ['z', 'y', 'x']]
+    assert np.array_equal(panel._lastAngles(1), [0.6, 0.4, 0.2])
+
+
+def test_3d_panel_with_one_store_per_system():
+    left = RingBuffer(['a', 'b', 'c'], 10)
+    right = pandas.DataFrame({'a': [], 'b': [], 'c': []})
+    panel = _AnglePanel([left, right], [['a', 'b', 'c'], ['c', 'b', 'a']], 2)
+    assert panel._lastAngles(0) is None and panel._lastAngles(1) is None
+    left.append(0.0, [1.0, 2.0, 3.0])
+    right.loc[0] = [1.0, 2.0, 3.0]
+    assert panel._lastAngles(0) == [1.0, 2.0, 3.0]
+    assert np.array_equal(panel._lastAngles(1), [3.0, 2.0, 1.0])
+    with pytest.raises(ValueError):
+        angleSources([left, right], [['a', 'b', 'c']], 2)
+
+
+class _Photo(object):
+    def configure(self, data, format):
+        self.data = data
+
+
+class _ThreadPanel(object):
+    _renderFrame = PlotPanel._renderFrame
+    _drawTraces = PlotPanel._drawTraces
+    _pollFrame = PlotPanel._pollFrame
+    _axisPixels = PlotPanel._axisPixels
+    _recordLatency = PlotPanel._recordLatency
+
+    def __init__(self):
+        """
+        Holds the attributes of a PlotPanel with renderMode 'thread', without Tk
+        """
+        self.f = Figure(figsize=(2, 1), dpi=100)
+        self.axis = self.f.add_subplot(111)
+        self.canvas = FigureCanvasAgg(self.f)
+        self.canvas.draw()
+        self.stats = HotPathStats()
+        self.latency = None
+        self._frame = None
+        self._frameLock = threading.Lock()
+        self._photo = _Photo()
+        self._axisWidth = self.axis.bbox.width
+
+    def after(self, ms, fn):
+        return None
+
+
+def test_thread_mode_reads_the_axis_width_of_the_last_frame():
+    panel = _ThreadPanel()
+    start = panel._axisPixels()
+    renderThread = RenderThread()
+    renderThread.start()
+    try:
+        t = np.arange(100.0)
+        renderThread.submit(panel, lambda: panel._renderFrame([('a', t, t, 'red')], None, None, (800, 200)))
+        end = time.monotonic() + 5
+        while renderThread.rendered == 0 and time.monotonic() < end:
+            time.sleep(0.01)
+    finally:
+        renderThread.stop()
+    # the figure was resized on the render thread, the panel keeps the width of the frame it shows
+    assert panel._axisPixels() == start
+    panel._pollFrame()
+    assert panel._photo.data.startswith(b'P6 800 200 255')
+    assert panel._axisPixels() == int(panel.axis.bbox.width) > start
+
+
+class _Dashboard(object):
+    addAxis = PlotDashboard.addAxis
+    addUpdate = PlotDashboard.addUpdate
+    markDirty = PlotDashboard.markDirty
+    render = PlotDashboard.render
+    refresh = PlotDashboard.refresh
+
+    def __init__(self, nCols=1):
+        """
+        Holds the attributes of a PlotDashboard in blit mode, without Tk
+        """
+        self.stats = HotPathStats()
+        self.renderMode = 'blit'
+        self.nCols = nCols
+        self.panels = []
+        self.axes = []
+        self._updates = []
+        self._dirty = True
+        self.f = Figure(figsize=(4, 6), dpi=50)
+        self.canvas = _CountingCanvas(self.f)
+        self.blitManager = BlitManager(self.canvas)
+
+
+class _DashboardPanel(object):
+    _render = PlotPanel._render
+    _recordLatency = PlotPanel._recordLatency
+
+    def __init__(self, dashboard, latency):
+        """
+        Holds the attributes of a PlotPanel added to a dashboard in blit mode, without Tk
+        """
+        self.dashboard = dashboard
+        self.axis = dashboard.addAxis()
+        self.plotter = TracePlotter(self.axis, dashboard.blitManager)
+        self.renderMode = dashboard.renderMode
+        self.decimation = None
+        self.stats = HotPathStats()
+        self.latency = latency
+        self._pendingStamp = None
+        dashboard.panels.append(self)
+
+
+class _Latency(object):
+    def __init__(self):
+        self.values = []
+
+    def add(self, value):
+        self.values.append(value)
+
+
+def test_dashboard_renders_all_the_panels_at_once():
+    dashboard = _Dashboard()
+    latency = _Latency()
+    panels = [_DashboardPanel(dashboard, latency) for k in range(3)]
+    # the subplots are stacked as they are added
+    ys = [p.axis.get_position().y0 for p in panels]
+    assert ys == sorted(ys, reverse=True)
+    t = np.arange(100.0)
+    frame = [0]
+
+    def update(panel):
+        panel._render([('a', t, np.sin(t + frame[0]), 'red')], ylim=(-1.5, 1.5), extraT=10.0,
+                      stamp=time.monotonic())
+
+    for panel in panels:
+        dashboard.addUpdate(lambda panel=panel: update(panel))
+    dashboard.refresh()
+    assert dashboard.canvas.draws == 1 and len(latency.values) == 3
+    for k in range(5):
+        frame[0] = k
+        dashboard.refresh()
+    assert dashboard.canvas.draws == 1 and dashboard.canvas.blits == 5 and len(latency.values) == 18
+    # nothing changed, nothing is drawn
+    dashboard.render()
+    assert dashboard.canvas.blits == 5
+    assert all(p._pendingStamp is None for p in panels)
+
+
+def test_dashboard_columns():
+    dashboard = _Dashboard(nCols=2)
+    axes = [dashboard.addAxis() for k in range(3)]
+    x0 = [ax.get_position().x0 for ax in axes]
+    y0 = [ax.get_position().y0 for ax in axes]
+    assert x0[0] == x0[2] < x0[1] and y0[0] == y0[1] > y0[2]
+    assert dashboard.blitManager._needsDraw
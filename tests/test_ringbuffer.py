@@ -0,0 +1,225 @@
+import threading
+
+import numpy as np
+import pytest
+
+from rtgui import DerivedRingBuffer, RateEstimator, RingBuffer, preprocessFunctions
+
+
+def _fill(store, start, n):
+    t = np.arange(start, start + n, dtype=np.float64)
+    store.extend(t, np.repeat(t[:, None], len(store.names), axis=1))
+
+
+def test_extend_wraps_and_keeps_the_newest():
+    store = RingBuffer(['a', 'b'], 100)
+    for k in range(0, 250, 30):
+        _fill(store, k, 30)
+    assert store.total == 270 and len(store) == 100
+    t, cols = store.window()
+    assert np.array_equal(t, np.arange(170, 270))
+    assert np.array_equal(cols['a'], t) and np.array_equal(cols['b'], t)
+    assert np.array_equal(store.column('a', 10), np.arange(260, 270))
+    assert np.array_equal(store.timestamps(3), [267, 268, 269])
+
+
+def test_window_is_a_view():
+    store = RingBuffer(['a'], 50)
+    _fill(store, 0, 70)
+    t, cols = store.window(40)
+    assert not t.flags.owndata and not cols['a'].flags.owndata
+    assert t.size == 40 and cols['a'][-1] == 69
+
+
+def test_extend_longer_than_capacity():
+    store = RingBuffer(['a'], 10)
+    _fill(store, 0, 35)
+    assert store.total == 35
+    assert np.array_equal(store.timestamps(), np.arange(25, 35))
+
+
+def test_append_and_dict_values():
+    store = RingBuffer(['a', 'b'], 4, dtypes=[np.float64, np.int16])
+    for k in range(6):
+        store.append(float(k), [k * 0.5, k])
+    assert np.array_equal(store.column('a'), [1.0, 1.5, 2.0, 2.5])
+    assert store.column('b').dtype == np.int16 and np.array_equal(store.column('b'), [2, 3, 4, 5])
+    store.extend([6.0, 7.0], {'a': np.array([3.0, 3.5]), 'b': np.array([6, 7])})
+    assert np.array_equal(store.column('b'), [4, 5, 6, 7])
+
+
+def test_clear_and_seq():
+    store = RingBuffer(['a'], 10)
+    seq = store.seq
+    _fill(store, 0, 5)
+    assert store.seq > seq
+    store.clear()
+    assert store.total == 0 and len(store) == 0 and store.rate == 0.0
+    _fill(store, 100, 3)
+    assert np.array_equal(store.timestamps(), [100, 101, 102])
+
+
+def test_rate_is_estimated_on_append():
+    store = RingBuffer(['a'], 1000)
+    t = np.arange(500) * 10.0
+    store.extend(t, np.zeros((500, 1)))
+    assert store.rate == pytest.approx(0.1)
+
+
+def test_external_buffer():
+    names = ['a', 'b']
+    buffer = np.zeros(RingBuffer.nbytes(names, 20), dtype=np.uint8)
+    store = RingBuffer(names, 20, buffer=buffer)
+    _fill(store, 0, 30)
+    other = RingBuffer(names, 20, buffer=buffer)
+    assert other.total == 30 and np.array_equal(other.column('b'), np.arange(10, 30))
+
+
+def test_snapshot_matches_appended():
+    store = RingBuffer(['a', 'b'], 100)
+    _fill(store, 0, 250)
+    t, cols = store.snapshot(60)
+    assert np.array_equal(t, np.arange(190, 250))
+    assert np.array_equal(cols['a'], t)
+    assert np.array_equal(cols['b'], t)
+    t, cols = store.snapshot()
+    assert np.array_equal(t, np.arange(150, 250))
+    t, cols = store.snapshot(0)
+    assert t.size == 0 and cols['a'].size == 0
+
+
+def test_since_returns_new_samples():
+    store = RingBuffer(['a'], 100)
+    _fill(store, 0, 30)
+    t, cols, total = store.since(None, copy=True)
+    assert total == 30 and np.array_equal(t, np.arange(30))
+    _fill(store, 30, 20)
+    t, cols, total = store.since(total, copy=True)
+    assert total == 50 and np.array_equal(cols['a'], np.arange(30, 50))
+    # more than capacity samples since the last read, only the ones in the store are returned
+    _fill(store, 50, 150)
+    t, cols, total = store.since(total, copy=True)
+    assert total == 200 and np.array_equal(t, np.arange(100, 200))
+
+
+def test_snapshot_is_consistent_with_a_concurrent_writer():
+    names = ['a', 'b', 'c']
+    store = RingBuffer(names, 512)
+    stop = threading.Event()
+
+    def writer():
+        k = 0
+        while not stop.is_set():
+            _fill(store, k, 37)
+            k += 37
+
+    th = threading.Thread(target=writer)
+    th.start()
+    try:
+        checked = 0
+        while checked < 2000:
+            t, cols = store.snapshot(400, names)
+            if t.size < 2:
+                continue
+            # every sample is its own timestamp, a torn read breaks the sequence or mixes columns
+            assert np.array_equal(np.diff(t), np.ones(t.size - 1))
+            for na in names:
+                assert np.array_equal(cols[na], t)
+            checked += 1
+    finally:
+        stop.set()
+        th.join()
+
+
+def test_snapshot_gives_up_when_the_writer_laps_the_reader():
+    store = RingBuffer(['a'], 16)
+    _fill(store, 0, 16)
+    # a write in progress that covers the whole store
+    store._state[3] = store.total + store.capacity
+    with pytest.raises(RuntimeError):
+        store.snapshot(8, maxRetries=3)
+
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        RingBuffer(['a'], 0)
+
+
+def test_preprocess_functions():
+    double = lambda x: 2 * x
+    assert preprocessFunctions([['a', 'b', 'c'], [double]]) == {'a': double, 'b': double, 'c': double}
+    assert preprocessFunctions([['a', 'b'], [double, abs]]) == {'a': double, 'b': abs}
+    with pytest.raises(ValueError):
+        preprocessFunctions([['a', 'b', 'c'], [double, abs]])
+
+
+def test_derived_store_applies_a_broadcast_function_to_every_column():
+    store = RingBuffer(['a', 'b', 'c'], 20)
+    derived = DerivedRingBuffer(store, preprocessFunctions([['a', 'b'], [lambda x: -x]]))
+    _fill(store, 0, 15)
+    assert derived.update() == 15
+    _fill(store, 15, 10)
+    assert derived.update() == 10 and derived.update() == 0
+    t, cols = derived.snapshot()
+    assert np.array_equal(t, np.arange(5, 25))
+    assert np.array_equal(cols['a'], -t) and np.array_equal(cols['b'], -t) and np.array_equal(cols['c'], t)
+
+
+def test_rate_estimator_averages_the_jitter():
+    rng = np.random.default_rng(3)
+    est = RateEstimator(window=200)
+    t = 0.0
+    for k in range(200):
+        # batches of 10 samples at 1 kHz, delivered with +-2 ms of jitter
+        t += 0.01
+        est.update(t + rng.uniform(-0.002, 0.002), 10)
+    assert est.rate == pytest.approx(1000.0, rel=0.03)
+
+
+def test_rate_estimator_first_estimate():
+    est = RateEstimator()
+    assert est.update(0.9, 10, tFirst=0.0) == pytest.approx(10.0)
+    assert est.update(1.9, 10) == pytest.approx(10.0)
+
+
+def test_rate_estimator_drops_and_restarts():
+    est = RateEstimator(window=100)
+    for k in range(1, 51):
+        est.update(k * 0.01, 10)
+    assert est.rate == pytest.approx(1000.0)
+    # one batch lost, the rate goes down a little instead of halving
+    est.update(0.52, 10)
+    assert 850.0 < est.rate < 1000.0
+    for k in range(53, 100):
+        est.update(k * 0.01, 10)
+    assert est.rate == pytest.approx(1000.0)
+    # the clock of the source restarted
+    est.update(0.05, 10, tFirst=0.041)
+    assert len(est._batches) == 1 and est.rate == pytest.approx(1000.0)
+
+
+def test_derived_store_reads_the_stamps_with_the_samples():
+    store = RingBuffer(['a'], 256)
+    derived = DerivedRingBuffer(store, {'a': lambda x: x})
+    stop = threading.Event()
+
+    def writer():
+        k = 0
+        while not stop.is_set():
+            t = np.arange(k, k + 37, dtype=np.float64)
+            # the receive time of each sample is its timestamp
+            store.extend(t, t[:, None], stamp=t)
+            k += 37
+
+    th = threading.Thread(target=writer)
+    th.start()
+    try:
+        for k in range(2000):
+            derived.update()
+            t, cols = derived.window()
+            assert np.array_equal(derived.stamps(), t)
+    finally:
+        stop.set()
+        th.join()
+    t, cols, total, stamp = store.since(None, copy=True, withStamps=True)
+    assert total == store.total and np.array_equal(stamp, t)
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from rtgui import FrameScheduler
+
+
+class _Root(object):
+    def __init__(self):
+        """
+        Stand-in for the Tk after loop
+        """
+        self.pending = {}
+        self._ids = 0
+
+    def after(self, ms, fn):
+        self._ids += 1
+        self.pending[self._ids] = (ms, fn)
+        return self._ids
+
+    def after_cancel(self, afterId):
+        self.pending.pop(afterId)
+
+
+def _busy(seconds, calls, name):
+    def callback():
+        calls.append(name)
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    return callback
+
+
+def _run(scheduler, duration):
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        wait = scheduler.runFrame()
+        time.sleep(max(wait, scheduler.minPeriod))
+
+
+def test_tasks_run_at_their_fps():
+    scheduler = FrameScheduler(_Root())
+    calls = []
+    scheduler.register(_busy(0, calls, 'fast'), fps=50.0, name='fast')
+    scheduler.register(_busy(0, calls, 'slow'), fps=10.0, name='slow')
+    _run(scheduler, 0.5)
+    assert 15 <= calls.count('fast') <= 27
+    assert 3 <= calls.count('slow') <= 7
+    stats = scheduler.getStats()
+    assert stats['fast']['targetFps'] == 50.0 and stats['fast']['frames'] == calls.count('fast')
+
+
+def test_budget_spreads_the_tasks_over_frames():
+    scheduler = FrameScheduler(_Root(), frameBudget=0.015)
+    calls = []
+    for name in ['a', 'b', 'c']:
+        scheduler.register(_busy(0.01, calls, name), fps=1000.0, name=name)
+    # the first frame has no draw times yet
+    scheduler.runFrame()
+    del calls[:]
+    for k in range(30):
+        scheduler.runFrame()
+    # one 10 ms task fits in each frame, the late ones go first on the next frame
+    assert len(calls) == 30
+    assert all(calls.count(name) == 10 for name in ['a', 'b', 'c'])
+    assert scheduler.getStats()['a']['skipped'] > 0
+
+
+def test_priority_goes_first():
+    scheduler = FrameScheduler(_Root(), frameBudget=0.0)
+    calls = []
+    scheduler.register(_busy(0, calls, 'low'), fps=30.0, priority=0)
+    scheduler.register(_busy(0, calls, 'high'), fps=30.0, priority=5)
+    scheduler.runFrame()
+    assert calls[0] == 'high'
+
+
+def test_register_unregister_and_fps():
+    scheduler = FrameScheduler(_Root())
+    with pytest.raises(ValueError):
+        scheduler.register(lambda: None, fps=0)
+    task = scheduler.register(lambda: None, fps=10.0)
+    scheduler.setFps(task, 40.0)
+    assert task.period == pytest.approx(0.025)
+    scheduler.unregister(task)
+    assert scheduler.runFrame() == scheduler.minPeriod
+
+
+def test_start_and_stop_use_the_after_loop():
+    root = _Root()
+    scheduler = FrameScheduler(root)
+    calls = []
+    scheduler.register(_busy(0, calls, 'a'), fps=100.0)
+    scheduler.start()
+    scheduler.start()
+    assert scheduler.isRunning and len(root.pending) == 1
+    ms, fn = root.pending.pop(scheduler._afterId)
+    fn()
+    assert calls == ['a'] and len(root.pending) == 1
+    # the next frame is scheduled when the task is due again
+    assert 0 <= list(root.pending.values())[0][0] <= 10
+    scheduler.stop()
+    assert not scheduler.isRunning and root.pending == {}
@@ -0,0 +1,70 @@
+import collections
+import queue
+import threading
+
+from rtgui import ConsoleFrame
+
+
+class _Var(object):
+    def __init__(self):
+        self.sets = 0
+        self.value = ''
+
+    def set(self, value):
+        self.sets += 1
+        self.value = value
+
+
+class _Console(object):
+    append = ConsoleFrame.append
+    clearConsole = ConsoleFrame.clearConsole
+    flush = ConsoleFrame.flush
+    _flushLoop = ConsoleFrame._flushLoop
+
+    def __init__(self, nLines=5, parseCMD=None):
+        """
+        Holds the attributes of a ConsoleFrame, without Tk
+        """
+        self.parseCMD = parseCMD
+        self.consoleVar = _Var()
+        self.consoleList = collections.deque(maxlen=max(nLines - 1, 1))
+        self._pending = queue.SimpleQueue()
+        self._period = 100
+        self.scheduled = []
+
+    def after(self, ms, fn):
+        self.scheduled.append((ms, fn))
+        return len(self.scheduled)
+
+
+def test_console_refreshes_once_per_period():
+    parsed = []
+    console = _Console(parseCMD=parsed.append)
+    threads = [threading.Thread(target=lambda k=k: [console.append('%d %d' % (k, j)) for j in range(100)])
+               for k in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    # nothing is shown until the Tk thread flushes
+    assert console.consoleVar.sets == 0
+    console._flushLoop()
+    assert console.consoleVar.sets == 1 and len(parsed) == 400
+    assert console.consoleVar.value.count('\n') == 4
+    assert console.scheduled[-1][0] == 100
+    console._flushLoop()
+    assert console.consoleVar.sets == 1
+
+
+def test_console_clear_is_queued_in_order():
+    console = _Console()
+    console.append('a')
+    console.clearConsole()
+    console.append('b')
+    console.append('c', clear_console=True)
+    console.append('d')
+    console.flush()
+    assert console.consoleVar.value == 'c\nd\n'
+    console.clearConsole()
+    console.flush()
+    assert console.consoleVar.value == '' and console.consoleVar.sets == 2